@@ -1,95 +1,43 @@
 import streamlit as st
-import pandas as pd
-from ortools.sat.python import cp_model
-import calendar
-from datetime import date, timedelta
-import json
-import hashlib
-import base64
-import urllib.parse
-import zipfile
-import io
 
 # ==========================================
 # 0. 基礎設定與共用函式 (定義在最上方)
 # ==========================================
 st.set_page_config(page_title="耕莘醫院雙軌排班系統 (v6.2)", layout="wide")
 
-def get_doctor_color(name):
-    palette = ["#FFB3BA", "#FFDFBA", "#FFFFBA", "#BAFFC9", "#BAE1FF", "#E6B3FF", "#FFB3E6", "#C9C9FF", "#FFD1DC", "#E0F7FA", "#F0F4C3", "#D7CCC8", "#F8BBD0", "#C5CAE9", "#B2DFDB"]
-    idx = int(hashlib.md5(name.encode()).hexdigest(), 16) % len(palette)
-    return palette[idx]
-
-def generate_ics_content(schedule_data, year, month):
-    ics = "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//CTH//Roster//TW\nCALSCALE:GREGORIAN\n"
-    for item in schedule_data:
-        day = item['d']
-        shift_type = item['t']
-        start_date = date(year, month, day)
-        end_date = start_date + timedelta(days=1)
-        dtstart = start_date.strftime("%Y%m%d")
-        dtend = end_date.strftime("%Y%m%d")
-        ics += f"BEGIN:VEVENT\nSUMMARY:值班: {shift_type}\nDTSTART;VALUE=DATE:{dtstart}\nDTEND;VALUE=DATE:{dtend}\nDESCRIPTION:耕莘醫院 {shift_type}值班\nEND:VEVENT\n"
-    ics += "END:VCALENDAR"
-    return ics
-
+# 醫師個人班表 (魔術連結) 走快速路徑：在載入求解器 / pandas 之前就處理完並結束
 query_params = st.query_params
 if "payload" in query_params:
-    try:
-        payload = query_params["payload"]
-        json_str = base64.b64decode(payload).decode('utf-8')
-        data = json.loads(json_str)
-        
-        doc_name = data['n']
-        year = data['y']
-        month = data['m']
-        shifts = data['s'] # list of {'d': day, 't': type}
-
-        st.title(f"👋 您好，{doc_name}")
-        st.info(f"這是您 {year} 年 {month} 月的專屬值班表")
-        
-        df_show = pd.DataFrame(shifts)
-        if not df_show.empty:
-            df_show['日期'] = df_show['d'].apply(lambda x: f"{month}/{x}")
-            df_show['班別'] = df_show['t']
-            st.table(df_show[['日期', '班別']])
-            
-            ics_content = generate_ics_content(shifts, year, month)
-            st.download_button(
-                label="📅 加入手機行事曆 (下載 .ics)",
-                data=ics_content,
-                file_name=f"{doc_name}_{year}_{month}_roster.ics",
-                mime="text/calendar",
-                type="primary",
-                use_container_width=True
-            )
-            st.success("💡 說明：下載後請直接開啟檔案，即可將班表匯入手機行事曆。")
-        else:
-            st.success("🎉 這個月沒有值班！")
-
-    except Exception as e:
-        st.error("連結無效或已過期。")
-    
+    from roster.personal import render_doctor_view
+    render_doctor_view(query_params["payload"])
     st.stop()
 
+import pandas as pd
+import calendar
+import copy
+import json
+import os
+
+from roster.config import DEFAULT_CONFIG, parse_staff, build_problem
+from roster.cache import DEFAULT_CACHE_DIR
+from roster.diagnostics import Trace, span, objective_gap
+from roster.jobs import JobQueue
+from roster.history import HistoryStore, month_index, month_of
+from roster.horizon import apply_carry_over, publish_record, month_problems, missing_prefs
+from roster.repair import repair_plan
+from roster.whatif import LeaveOracle
+from roster.swaps import SwapValidator
+from roster.feasibility import precheck
+from roster.solver import is_solved, TIER_LABELS
+from ortools.sat.python import cp_model
+from roster.matrix import roster_matrix
+from roster.views import calculate_stats, get_html_calendar, generate_excel_calendar_df, generate_magic_links, generate_distribution_zip
+
 st.title("🏥 耕莘醫院婦產科雙軌排班系統 (v6.2)")
 st.caption("修復版：預設網址更新 | 功能：魔術連結分發 + 點數制 + R救援")
 
 # --- Session State 初始化 ---
-default_state = {
-    "year": 2025,
-    "month": 12,
-    "vs_list": "張醫師(VS), 王醫師(VS)", 
-    "r_list": "洋洋(R3), 蹦蹦(R2)",
-    "pgy_list": "小明(PGY), 小華(PGY), 小強(PGY)",
-    "int_list": "菜鳥A(Int), 菜鳥B(Int)",
-    "vs_leaves": {}, "r_leaves": {}, "pgy_leaves": {}, "int_leaves": {},
-    "vs_wishes": {},  "vs_nogo": {},
-    "r_wishes": {},   "r_nogo": {},
-    "pgy_wishes": {}, "pgy_nogo": {},
-    "int_wishes": {}, "int_nogo": {},
-    "holidays": []
-}
+default_state = copy.deepcopy(DEFAULT_CONFIG)
 
 for key, val in default_state.items():
     if key not in st.session_state:
@@ -99,16 +47,20 @@ st.sidebar.header("📂 設定檔存取")
 def get_current_config():
     return {k: st.session_state[k] for k in default_state.keys()}
 
-config_json = json.dumps(get_current_config(), ensure_ascii=False, indent=2)
-st.sidebar.download_button("💾 下載設定 (JSON)", config_json, "roster_config.json", "application/json")
+# 設定檔只在按下下載時才序列化；偏好表格在 fragment 內「就地」更新同一個 dict，這裡的快照不會過期
+config_snapshot = get_current_config()
+st.sidebar.download_button("💾 下載設定 (JSON)", lambda: json.dumps(config_snapshot, ensure_ascii=False, indent=2), "roster_config.json", "application/json")
 
 uploaded_file = st.sidebar.file_uploader("📂 讀取設定 (JSON)", type=["json"])
-if uploaded_file is not None:
+if uploaded_file is not None and st.session_state.get("loaded_config") != uploaded_file.file_id:
+    # 同一個檔案只套用一次，之後的編輯不會被檔案內容蓋回去
     try:
         data = json.load(uploaded_file)
         for key in default_state.keys():
             if key in data:
                 st.session_state[key] = data[key]
+        st.session_state["loaded_config"] = uploaded_file.file_id
+        st.session_state["pref_rev"] = st.session_state.get("pref_rev", 0) + 1
         st.sidebar.success("讀取成功！")
     except Exception as e:
         st.sidebar.error(f"讀取失敗: {e}")
@@ -130,9 +82,40 @@ holidays = st.sidebar.multiselect(
 )
 st.session_state["holidays"] = holidays
 
+st.sidebar.markdown("---")
+st.sidebar.header("📌 跨月接續")
+carry_file = st.sidebar.file_uploader("上月已公告班表 (JSON)", type=["json"], help="上月最後幾天的班 (不連值、間隔、R 大班前後) 與累計的平日 / 假日 / 點數餘額會帶入本月")
+carry_record = None
+if carry_file is not None:
+    try:
+        carry_record = json.loads(carry_file.getvalue())
+        st.sidebar.caption(f"接續 {carry_record['year']}/{carry_record['month']} 的已公告班表")
+    except Exception as e:
+        st.sidebar.error(f"讀取失敗: {e}")
+num_months = st.sidebar.number_input("連續排班月數", min_value=1, max_value=3, value=1, help="滾動式逐月排班 (例如一季)：前一個月的結果自動成為下個月的接續狀態；第 2 個月起沿用名單，請假 / 意願 / 國定假日取自設定檔的 next_months")
+if num_months > 1 and len(st.session_state["next_months"] or []) < num_months - 1:
+    st.sidebar.warning(f"設定檔的 next_months 只有 {len(st.session_state['next_months'] or [])} 個月的請假 / 意願 / 國定假日：之後的月份不會避開任何請假，結果僅供參考，不可公告")
+
+st.sidebar.markdown("---")
+st.sidebar.header("📚 歷史班表")
+department = st.sidebar.text_input("科別", value="婦產科", help="已公告班表以科別 + 月份存入本機歷史紀錄")
+use_history = st.sidebar.checkbox("以歷史累計的公平性作為偏移", value=False, help="過去幾個月各人平日 / 假日 / 點數與同組平均的累計差額，會帶入本月的公平性與點數計算 (取代上月班表中的餘額)")
+history_months = st.sidebar.number_input("累計月數", min_value=1, max_value=36, value=12, disabled=not use_history)
+
 st.sidebar.markdown("---")
 st.sidebar.header("🔢 運算設定")
+# 同一台主機上所有使用者共用的背景排班工作佇列 (同時運算的行程數有上限，其餘排隊)；執行緒預設平分 CPU
+JOB_WORKERS = int(os.environ.get("ROSTER_JOB_WORKERS", 2))
+DEFAULT_STAGE_LIMIT = 300
 num_solutions = st.sidebar.slider("產生方案數量", min_value=1, max_value=5, value=1)
+use_pool = st.sidebar.checkbox("⚡ 平行方案池 (多方案一次求解)", value=False, help="以多個平行 seed 同時搜尋並去除重複方案；方案 2 起與最佳解可差 100 分以內。需要多核心才會比逐一求解快，預設關閉")
+min_distance = st.sidebar.number_input("方案最少相異天數", min_value=1, max_value=15, value=3)
+time_limit = st.sidebar.number_input("⏱ 每階段運算時間上限 (秒，0 = 不限)", min_value=0, max_value=600, value=60, help="時間到即採用目前找到的最佳解，避免困難案例卡住共用主機")
+relative_gap = st.sidebar.number_input("可接受的最佳差距 (%)", min_value=0.0, max_value=50.0, value=0.0, step=0.5, help="目前解與理論最佳的差距小於此值即提前採用 (足夠好就停)")
+num_workers = st.sidebar.number_input("運算執行緒數", min_value=1, max_value=64, value=min(8, max(1, (os.cpu_count() or 1) // JOB_WORKERS)))
+lexicographic = st.sidebar.checkbox("🪜 分層最佳化", value=False, help="依優先順序逐層求解 (上限 > 支援 > No-Go > 公平性 / 點數 > 想值班)，每層的最佳值固定後再排下一層；運算時間依比例分給各層。平行方案池的大班仍以加權目標搜尋")
+solver_options = {"num_workers": num_workers, "time_limit": time_limit or None, "relative_gap": relative_gap / 100 or None}
+if lexicographic: solver_options["lexicographic"] = True
 
 base_app_url = st.sidebar.text_input(
     "🔗 App 網址 (用於連結)", 
@@ -143,43 +126,57 @@ st.subheader("1. 人員與限制設定")
 tab1, tab2 = st.tabs(["🔴 大班 (產房)", "🔵 小班 (一般)"])
 with tab1:
     c1, c2 = st.columns(2)
-    vs_staff = [x.strip() for x in st.text_area("VS 主治醫師名單", key="vs_list").split(",") if x.strip()]
-    r_staff = [x.strip() for x in st.text_area("R 住院醫師名單", key="r_list").split(",") if x.strip()]
+    vs_staff = parse_staff(st.text_area("VS 主治醫師名單", key="vs_list"))
+    r_staff = parse_staff(st.text_area("R 住院醫師名單", key="r_list"))
 with tab2:
     c3, c4 = st.columns(2)
-    pgy_staff = [x.strip() for x in st.text_area("PGY 名單", key="pgy_list").split(",") if x.strip()]
-    int_staff = [x.strip() for x in st.text_area("Intern 實習醫師名單", key="int_list").split(",") if x.strip()]
+    pgy_staff = parse_staff(st.text_area("PGY 名單", key="pgy_list"))
+    int_staff = parse_staff(st.text_area("Intern 實習醫師名單", key="int_list"))
+
+WEEKDAY_NAMES = "一二三四五六日"
 
 def update_pref(key, staff, label, help_t):
-    prefs = st.session_state.get(key, {})
-    new_prefs = {}
+    # 醫師 x 日期的勾選表格：每個類別一個 data_editor (取代每位醫師一個 multiselect)
     st.markdown(f"**{label}**")
     if help_t: st.caption(help_t)
-    for doc in staff:
-        default = [d for d in prefs.get(doc, []) if d in dates]
-        selection = st.multiselect(doc, dates, default=default, key=f"{key}_{doc}_w")
-        new_prefs[doc] = selection
-    st.session_state[key] = new_prefs
-
-with st.expander("⛔️ 請假/未到職設定 (絕對排除)", expanded=True):
-    col_l, col_r = st.columns(2)
-    with col_l:
-        update_pref("vs_leaves", vs_staff, "VS 請假", "")
-        update_pref("r_leaves", r_staff, "R 請假", "")
-    with col_r:
-        update_pref("pgy_leaves", pgy_staff, "PGY 請假", "")
-        update_pref("int_leaves", int_staff, "Int 請假", "")
-
-st.markdown("#### 排班意願 (軟限制)")
-c1, c2 = st.columns(2)
-with c1:
+    if not staff: return
+    # 表格以「底稿」為輸入、編輯紀錄由 data_editor 保存；名單、月份變動或讀取設定檔時才換新底稿
+    base_id = f"{key}_{st.session_state.get('pref_rev', 0)}_{year}_{month}_{abs(hash(tuple(staff)))}"
+    bases = st.session_state.setdefault("pref_bases", {})
+    if bases.get(key, (None,))[0] != base_id:
+        prefs = st.session_state.get(key, {})
+        bases[key] = (base_id, pd.DataFrame([[d in prefs.get(doc, []) for d in dates] for doc in staff], index=staff, columns=[str(d) for d in dates]))
+    weekday = {d: calendar.weekday(year, month, d) for d in dates}
+    columns = {str(d): st.column_config.CheckboxColumn(f"{d}{'*' if weekday[d] >= 5 else ''}", help=f"{month}/{d} (週{WEEKDAY_NAMES[weekday[d]]})", width="small") for d in dates}
+    edited = st.data_editor(bases[key][1], column_config=columns, use_container_width=True, key=f"pe_{base_id}")
+    # 就地更新，側邊欄「下載設定」的快照也會看到
+    prefs = st.session_state.setdefault(key, {})
+    prefs.clear()
+    prefs.update({doc: [d for d, on in zip(dates, row) if on] for doc, row in zip(staff, edited.to_numpy())})
+
+# 各區塊是獨立的 fragment：勾選請假只重跑請假表格，不會重建意願表格、排班結果與日曆
+@st.fragment
+def leave_editors():
+    with st.expander("⛔️ 請假/未到職設定 (絕對排除)", expanded=True):
+        col_l, col_r = st.columns(2)
+        with col_l:
+            update_pref("vs_leaves", vs_staff, "VS 請假", "")
+            update_pref("r_leaves", r_staff, "R 請假", "")
+        with col_r:
+            update_pref("pgy_leaves", pgy_staff, "PGY 請假", "")
+            update_pref("int_leaves", int_staff, "Int 請假", "")
+
+@st.fragment
+def big_wish_editors():
     with st.expander("🔴 大班意願", expanded=False):
         update_pref("vs_wishes", vs_staff, "VS 指定值班", "優先")
         update_pref("vs_nogo", vs_staff, "VS 不想值", "避開")
         st.markdown("---")
         update_pref("r_nogo", r_staff, "R 不想值", "避開")
         update_pref("r_wishes", r_staff, "R 想值", "加分")
-with c2:
+
+@st.fragment
+def small_wish_editors():
     with st.expander("🔵 小班意願", expanded=False):
         update_pref("pgy_nogo", pgy_staff, "PGY 不想值", "避開")
         update_pref("pgy_wishes", pgy_staff, "PGY 想值", "加分")
@@ -187,345 +184,369 @@ with c2:
         update_pref("int_nogo", int_staff, "Int 不想值", "避開")
         update_pref("int_wishes", int_staff, "Int 想值", "加分")
 
+st.caption("表格中勾選日期即可 (* 為週末)；每個表格獨立更新，不會重跑整頁。")
+leave_editors()
+st.markdown("#### 排班意願 (軟限制)")
+c1, c2 = st.columns(2)
+with c1: big_wish_editors()
+with c2: small_wish_editors()
+
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(max_workers=JOB_WORKERS)
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+def history_balances():
+    return get_history_store().balances(department, year, month, history_months) if use_history else None
+
+def current_problem():
+    problem = build_problem(get_current_config())
+    if carry_record: problem = apply_carry_over(problem, carry_record)
+    balances = history_balances()
+    return problem if balances is None else dict(problem, balances=balances)
+
+def plan_view(key, problem, b_data, s_data, trace=None):
+    # 矩陣、統計、日曆、連結與匯出檔只在方案第一次顯示時計算，之後的 rerun 直接取用 session state
+    views = st.session_state.setdefault("plan_views", {})
+    view_key = (key, base_app_url)
+    if view_key in views: return views[view_key]
+    p = problem
+    year, month = p["year"], p["month"]
+    with span(trace, "roster_matrix", plan=key):
+        m_big = roster_matrix(b_data["pattern"], p["vs_staff"]+p["r_staff"], p["dates"], year, month, p["holidays"], "大班")
+        m_small = roster_matrix(s_data["pattern"], p["pgy_staff"]+p["int_staff"]+p["r_staff"], p["dates"], year, month, p["holidays"], "小班")
+    view = {"m_big": m_big, "m_small": m_small}
+    with span(trace, "calculate_stats", plan=key, stage="big"): view["stats_big"] = calculate_stats(m_big)
+    with span(trace, "calculate_stats", plan=key, stage="small"): view["stats_small"] = calculate_stats(m_small)
+    with span(trace, "get_html_calendar", plan=key): view["calendar"] = get_html_calendar(m_big, m_small)
+    with span(trace, "generate_magic_link", plan=key): view["links"] = generate_magic_links(base_app_url, m_big, m_small)
+    with span(trace, "generate_distribution_zip", plan=key): view["zip"] = generate_distribution_zip(base_app_url, [(f"方案 {key}", m_big, m_small)])
+    with span(trace, "generate_excel_calendar_df", plan=key):
+        view["csv"] = generate_excel_calendar_df(m_big, m_small).to_csv(index=False, header=False).encode('utf-8-sig')
+    view["record"] = json.dumps(publish_record(problem, b_data, s_data), ensure_ascii=False)
+    views[view_key] = view
+    return view
+
+# 手動換班：不重新求解，只以 roster.swaps 檢查規則 (每次換班只重算受影響的部分)，立即顯示違規與統計
+@st.fragment
+def swap_editor(key, problem, view):
+    with st.expander("✋ 手動換班檢查"):
+        swaps = st.session_state.setdefault("swaps", {})
+        if key not in swaps or st.button("↩️ 還原為原方案", key=f"swap_reset_{key}"):
+            swaps[key] = {"validator": SwapValidator(problem, view["m_big"], view["m_small"]), "log": [], "delta": None}
+        state = swaps[key]
+        v = state["validator"]
+        # 選項只用日期 (換班後值班者會變，選項若含人名會讓已選的日期失效)
+        label = lambda d: v.label[d]
+        c1, c2, c3, c4 = st.columns([1, 2, 2, 1])
+        stage = c1.radio("班別", ["big", "small"], format_func=lambda s: "大班" if s == "big" else "小班", key=f"swap_stage_{key}")
+        d1 = c2.selectbox("日期 A", v.days, format_func=label, key=f"swap_a_{key}")
+        d2 = c3.selectbox("日期 B", v.days, format_func=label, key=f"swap_b_{key}")
+        if c4.button("⇄ 互換", key=f"swap_go_{key}", disabled=d1 == d2):
+            state["log"].append(f"{'大班' if stage == 'big' else '小班'} {label(d1)} {v.who[stage][d1]} ⇄ {label(d2)} {v.who[stage][d2]}")
+            state["delta"] = v.swap(stage, d1, d2)
+        c2, c3, c4 = st.columns([2, 2, 1])
+        day = c2.selectbox("日期", v.days, format_func=label, key=f"swap_day_{key}")
+        doc = c3.selectbox("改由", v.staff[stage], key=f"swap_doc_{key}")
+        if c4.button("✏️ 指定", key=f"swap_set_{key}"):
+            state["log"].append(f"{'大班' if stage == 'big' else '小班'} {label(day)} {v.who[stage][day]} → {doc}")
+            state["delta"] = v.assign(stage, day, doc)
+        st.caption(f"{'大班' if stage == 'big' else '小班'} 目前：{v.label[d1]} {v.who[stage][d1] or '—'} / {v.label[d2]} {v.who[stage][d2] or '—'}")
+        if state["log"]: st.caption("已異動：" + "；".join(state["log"]))
+        delta = state["delta"]
+        if delta:
+            for x in delta["added"]: st.write(f"- ➕ {x['message']}")
+            for x in delta["removed"]: st.write(f"- ✅ 解除：{x['message']}")
+        hard = v.violations(hard=True)
+        if hard: st.error("違反硬規則：\n" + "\n".join(f"- {x['message']}" for x in hard))
+        elif state["log"]: st.success("✅ 沒有違反硬規則")
+        report = [("大班", s) for s in v.report("big")] + [("小班", s) for s in v.report("small")]
+        if report: st.markdown("**犧牲報告**\n" + "\n".join(f"- [{name}] {s}" for name, s in report))
+        c1, c2 = st.columns(2)
+        c1.dataframe(v.stats("big"), use_container_width=True)
+        c2.dataframe(v.stats("small"), use_container_width=True)
+
+def render_plan(key, problem, b_data, s_data, trace=None):
+    year, month = problem["year"], problem["month"]
+    view = plan_view(key, problem, b_data, s_data, trace)
+    draft = bool(problem.get("prefs_missing"))
+    if draft: st.warning(f"⚠️ {year}/{month} 沒有請假 / 意願 / No-Go / 國定假日設定 (設定檔的 next_months)，班表未避開任何請假，僅供參考，不可公告。")
+    sac_big = b_data["report"]
+    sac_small = s_data["report"]
+    
+    if sac_big or sac_small:
+        with st.expander("⚠️ 犧牲報告", expanded=True):
+            if sac_big: st.write("**[大班]**"); [st.write(f"- 🔴 {s}") for s in sac_big]
+            if sac_small: st.write("**[小班]**"); [st.write(f"- 🔵 {s}") for s in sac_small]
+    else:
+        st.info("✨ 完美方案")
 
-def is_holiday(d, custom_holidays):
-    return (date(year, month, d).weekday() >= 5) or (d in custom_holidays)
-
-def add_fairness_objective(model, shifts, staff_list, days, custom_holidays, obj_terms, weight=500):
-    if not staff_list: return
-    weekend_days = [d for d in days if is_holiday(d, custom_holidays)]
-    weekday_days = [d for d in days if not is_holiday(d, custom_holidays)]
-    avg_wd = len(weekday_days) // len(staff_list)
-    avg_we = len(weekend_days) // len(staff_list)
-    for doc in staff_list:
-        wd_count = model.NewIntVar(0, 31, f"wd_cnt_{doc}")
-        model.Add(wd_count == sum(shifts[(doc, d)] for d in weekday_days))
-        dev_wd = model.NewIntVar(0, 31, f"dev_wd_{doc}")
-        model.Add(dev_wd >= wd_count - avg_wd); model.Add(dev_wd >= avg_wd - wd_count)
-        obj_terms.append(dev_wd * -weight)
-        we_count = model.NewIntVar(0, 31, f"we_cnt_{doc}")
-        model.Add(we_count == sum(shifts[(doc, d)] for d in weekend_days))
-        dev_we = model.NewIntVar(0, 31, f"dev_we_{doc}")
-        model.Add(dev_we >= we_count - avg_we); model.Add(dev_we >= avg_we - we_count)
-        obj_terms.append(dev_we * -weight)
-
-def add_point_system_constraint(model, shifts, staff_list, days, custom_holidays, obj_terms, sacrifices, limit=8, weight=1000):
-    weekend_days = [d for d in days if is_holiday(d, custom_holidays)]
-    weekday_days = [d for d in days if not is_holiday(d, custom_holidays)]
-    for doc in staff_list:
-        total_points = model.NewIntVar(0, 100, f"pts_{doc}")
-        model.Add(total_points == sum(shifts[(doc, d)] for d in weekday_days) * 1 + sum(shifts[(doc, d)] for d in weekend_days) * 2)
-        slack = model.NewIntVar(0, 50, f"slack_pts_{doc}")
-        model.Add(total_points <= limit + slack)
-        obj_terms.append(slack * -weight)
-        sacrifices.append((slack, f"{doc} 點數超標 (>{limit}點)"))
-
-def add_spacing_preference(model, shifts, staff_list, days, obj_terms, weight=100):
-    for doc in staff_list:
-        for d in range(1, len(days) - 1):
-            q2_violation = model.NewBoolVar(f"q2_{doc}_{d}")
-            model.Add(shifts[(doc, d)] + shifts[(doc, d+2)] <= 1 + q2_violation)
-            obj_terms.append(q2_violation * -weight)
-
-def calculate_stats(df, custom_holidays):
-    if df.empty: return pd.DataFrame()
-    df['Type'] = df['日期'].apply(lambda x: '假日' if is_holiday(int(x.split('/')[1]), custom_holidays) else '平日')
-    stats = df.groupby('醫師')['Type'].value_counts().unstack(fill_value=0)
-    if '平日' not in stats.columns: stats['平日'] = 0
-    if '假日' not in stats.columns: stats['假日'] = 0
-    stats['總班數'] = stats['平日'] + stats['假日']
-    stats['總點數'] = stats['平日'] * 1 + stats['假日'] * 2
-    return stats[['總班數', '總點數', '平日', '假日']].sort_values(by='總點數', ascending=False)
-
-def get_html_calendar(df_big, df_small, custom_holidays):
-    cal = calendar.monthcalendar(year, month)
-    map_big = {int(r["日期"].split("/")[1]): r["醫師"] for _, r in df_big.iterrows()}
-    map_small = {int(r["日期"].split("/")[1]): r["醫師"] for _, r in df_small.iterrows()}
-    html = """<style>.cal-table {width:100%; border-collapse:collapse; table-layout:fixed;}.cal-table td {height:120px; border:1px solid #ddd; vertical-align:top; padding:4px; background:#fff;}.cal-table th {background:#f0f2f6; border:1px solid #ddd; padding:5px;}.day-num {font-size:12px; color:#666; text-align:right; margin-bottom:5px;}.badge {padding:4px 6px; border-radius:6px; font-size:13px; margin-bottom:4px; display:block; font-weight:bold; color: #333; text-shadow: 0 0 2px #fff; border: 1px solid rgba(0,0,0,0.1);}.weekend {background-color:#fafafa !important;}.holiday {background-color:#ffebee !important;}.shift-label {font-size: 10px; color: #666; margin-right: 3px;}</style><table class="cal-table"><thead><tr><th>Mon</th><th>Tue</th><th>Wed</th><th>Thu</th><th>Fri</th><th style="color:red">Sat</th><th style="color:red">Sun</th></tr></thead><tbody>"""
-    for week in cal:
-        html += "<tr>"
-        for i, day in enumerate(week):
-            cls = ""
-            if day != 0:
-                if is_holiday(day, custom_holidays): cls = "holiday" if day in custom_holidays else "weekend"
-            if day == 0: html += f'<td class="empty"></td>'
-            else:
-                b_doc = map_big.get(day, ""); s_doc = map_small.get(day, "")
-                html += f'<td class="{cls}"><div class="day-num">{day}</div>'
-                if b_doc: html += f'<div class="badge" style="background-color:{get_doctor_color(b_doc)};"><span class="shift-label">產:</span>{b_doc}</div>'
-                if s_doc: html += f'<div class="badge" style="background-color:{get_doctor_color(s_doc)};"><span class="shift-label">小:</span>{s_doc}</div>'
-                html += "</td>"
-        html += "</tr>"
-    html += "</tbody></table>"
-    return html
-
-def get_report(solver, sacrifices):
-    report = []
-    seen = set()
-    for var, msg in sacrifices:
-        if solver.Value(var) > 0:
-            if msg not in seen:
-                report.append(msg)
-                seen.add(msg)
-    return report
-
-def generate_df(solver, shifts, staff, days, name):
-    res = []
-    for d in days:
-        for doc in staff:
-            if solver.Value(shifts[(doc, d)]) == 1:
-                w = date(year, month, d).strftime("%a")
-                res.append({"日期": f"{month}/{d}", "星期": w, "班別": name, "醫師": doc})
-    return pd.DataFrame(res)
-
-def generate_excel_calendar_df(df_big, df_small):
-    map_big = {int(r["日期"].split("/")[1]): r["醫師"] for _, r in df_big.iterrows()}
-    map_small = {int(r["日期"].split("/")[1]): r["醫師"] for _, r in df_small.iterrows()}
-    cal = calendar.monthcalendar(year, month)
-    csv_rows = []
-    headers = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
-    csv_rows.append(headers)
-    for week in cal:
-        row_date = []; row_big = []; row_small = []
-        for day in week:
-            if day == 0:
-                row_date.append(""); row_big.append(""); row_small.append("")
-            else:
-                row_date.append(f"{month}/{day}")
-                row_big.append(f"[產] {map_big.get(day, '')}")
-                row_small.append(f"[小] {map_small.get(day, '')}")
-        csv_rows.append(row_date); csv_rows.append(row_big); csv_rows.append(row_small)
-        csv_rows.append([""] * 7)
-    return pd.DataFrame(csv_rows)
-
-def generate_magic_link(base_url, doctor_name, df_big, df_small, year, month):
-    full_df = pd.concat([df_big, df_small])
-    doc_shifts = full_df[full_df['醫師'] == doctor_name]
-    shift_data = []
-    for _, row in doc_shifts.iterrows():
-        day = int(row['日期'].split('/')[1])
-        shift_data.append({'d': day, 't': row['班別']})
-    payload = {'n': doctor_name, 'y': year, 'm': month, 's': shift_data}
-    json_str = json.dumps(payload)
-    b64_str = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-    if base_url.endswith('/'): base_url = base_url[:-1]
-    return f"{base_url}/?payload={b64_str}"
-
-def solve_big_shift(vs_staff, r_staff, days, vs_leaves, r_leaves, vs_wishes, vs_nogo, r_nogo, r_wishes, custom_holidays, forbidden_patterns=None):
-    model = cp_model.CpModel()
-    all_staff = vs_staff + r_staff
-    shifts = {}
-    obj_terms = []
-    sacrifices = []
-    for doc in all_staff:
-        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_big_{doc}_{d}")
-    for d in days: model.Add(sum(shifts[(doc, d)] for doc in all_staff) == 1)
-    for doc in all_staff:
-        for d in range(1, len(days)): model.Add(shifts[(doc, d)] + shifts[(doc, d+1)] <= 1)
-    for doc, dates_off in vs_leaves.items():
-        if doc in vs_staff:
-            for d in dates_off: model.Add(shifts[(doc, d)] == 0)
-    for doc, dates_off in r_leaves.items():
-        if doc in r_staff:
-            for d in dates_off: model.Add(shifts[(doc, d)] == 0)
-    if forbidden_patterns:
-        for pattern in forbidden_patterns: model.Add(sum([shifts[(doc, d)] for doc, d in pattern]) <= len(pattern) - 3)
-    for doc, dates_on in vs_wishes.items():
-        if doc in vs_staff:
-            for d in dates_on: model.Add(shifts[(doc, d)] == 1) 
-    add_fairness_objective(model, shifts, r_staff, days, custom_holidays, obj_terms, weight=2000)
-    add_point_system_constraint(model, shifts, r_staff, days, custom_holidays, obj_terms, sacrifices, limit=8, weight=200)
-    add_spacing_preference(model, shifts, r_staff, days, obj_terms, weight=50)
-    for doc, dates_off in r_nogo.items():
-        if doc in r_staff:
-            for d in dates_off: obj_terms.append(shifts[(doc, d)] * -5000); sacrifices.append((shifts[(doc, d)], f"{doc} (R) 排入 No-Go ({month}/{d})"))
-    for doc, dates_off in vs_nogo.items():
-        if doc in vs_staff:
-            for d in dates_off: obj_terms.append(shifts[(doc, d)] * -5000); sacrifices.append((shifts[(doc, d)], f"{doc} (VS) 排入 No-Go ({month}/{d})"))
-    for doc in vs_staff:
-        wished_days = vs_wishes.get(doc, [])
-        for d in days:
-            if d not in wished_days: obj_terms.append(shifts[(doc, d)] * -5000); sacrifices.append((shifts[(doc, d)], f"{doc} (VS) 支援 ({month}/{d})"))
-    for doc, dates_on in r_wishes.items():
-        if doc in r_staff:
-            for d in dates_on: obj_terms.append(shifts[(doc, d)] * 10)
-    model.Maximize(sum(obj_terms))
-    solver = cp_model.CpSolver()
-    solver.parameters.random_seed = len(forbidden_patterns) if forbidden_patterns else 0
-    status = solver.Solve(model)
-    result_pattern = []
-    r_schedule_map = {r: [] for r in r_staff}
-    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-        for doc in all_staff:
-            for d in days:
-                if solver.Value(shifts[(doc, d)]) == 1:
-                    result_pattern.append((doc, d))
-                    if doc in r_staff: r_schedule_map[doc].append(d)
-    return solver, status, shifts, sacrifices, result_pattern, r_schedule_map
-
-def solve_small_shift(pgy_staff, int_staff, r_staff, days, pgy_leaves, int_leaves, pgy_nogo, pgy_wishes, int_nogo, int_wishes, r_nogo, r_schedule_map, custom_holidays, forbidden_patterns=None):
-    model = cp_model.CpModel()
-    shifts = {}
-    obj_terms = []
-    sacrifices = []
-    for doc in pgy_staff + int_staff:
-        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_sml_{doc}_{d}")
-    for doc in r_staff:
-        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_sml_Rsupport_{doc}_{d}")
-    all_small_candidates = pgy_staff + int_staff + r_staff
-    for d in days: model.Add(sum(shifts[(doc, d)] for doc in all_small_candidates) == 1)
-    for doc in pgy_staff + int_staff:
-        for d in range(1, len(days)): model.Add(shifts[(doc, d)] + shifts[(doc, d+1)] <= 1)
-    for doc in r_staff:
-        big_shift_days = r_schedule_map.get(doc, [])
-        r_nogo_days = r_nogo.get(doc, [])
-        for d in days:
-            if d in big_shift_days: model.Add(shifts[(doc, d)] == 0)
-            is_too_close = False
-            for b_day in big_shift_days:
-                if abs(b_day - d) <= 2: is_too_close = True; break
-            if is_too_close: model.Add(shifts[(doc, d)] == 0)
-            if d in r_nogo_days: model.Add(shifts[(doc, d)] == 0)
-            if d < len(days): model.Add(shifts[(doc, d)] + shifts[(doc, d+1)] <= 1)
-    for doc, dates_off in pgy_leaves.items():
-        if doc in pgy_staff:
-            for d in dates_off: model.Add(shifts[(doc, d)] == 0)
-    for doc, dates_off in int_leaves.items():
-        if doc in int_staff:
-            for d in dates_off: model.Add(shifts[(doc, d)] == 0)
-    if forbidden_patterns:
-        for pattern in forbidden_patterns:
-            relevant = []
-            for doc, d in pattern:
-                if (doc, d) in shifts: relevant.append(shifts[(doc, d)])
-            if relevant: model.Add(sum(relevant) <= len(relevant) - 3)
-    weekend_days = [d for d in days if is_holiday(d, custom_holidays)]
-    weekday_days = [d for d in days if not is_holiday(d, custom_holidays)]
-    month_weeks = calendar.monthcalendar(year, month)
-    W_LIMIT_BREAK = 1000000; W_FAIRNESS = 500; W_NOGO = 5000; W_WISH = 10
+    c1, c2 = st.columns(2)
+    with c1: 
+        st.markdown("### 大班統計")
+        st.dataframe(view["stats_big"], use_container_width=True)
+    with c2: 
+        st.markdown("### 小班統計")
+        st.dataframe(view["stats_small"], use_container_width=True)
+
+    st.markdown(view["calendar"], unsafe_allow_html=True)
+    swap_editor(key, problem, view)
     
-    for doc in pgy_staff + int_staff:
-        limit_weight = W_LIMIT_BREAK
-        for week in month_weeks:
-            valid_days = [d for d in week if d != 0]
-            if valid_days:
-                count = sum(shifts[(doc, d)] for d in valid_days)
-                slack = model.NewIntVar(0, 7, f"slk_wk_{doc}_{week[0]}")
-                model.Add(count <= 2 + slack)
-                obj_terms.append(slack * -limit_weight); sacrifices.append((slack, f"{doc} 單週超過 2 班"))
-        wd_cnt = sum(shifts[(doc, d)] for d in weekday_days)
-        slack_wd = model.NewIntVar(0, 31, f"slk_wd_{doc}")
-        model.Add(wd_cnt <= 6 + slack_wd)
-        obj_terms.append(slack_wd * -limit_weight); sacrifices.append((slack_wd, f"{doc} 平日超過 6 班"))
-        we_cnt = sum(shifts[(doc, d)] for d in weekend_days)
-        slack_we = model.NewIntVar(0, 31, f"slk_we_{doc}")
-        model.Add(we_cnt <= 2 + slack_we)
-        obj_terms.append(slack_we * -limit_weight); sacrifices.append((slack_we, f"{doc} 假日超過 2 班"))
-    add_point_system_constraint(model, shifts, pgy_staff + int_staff, days, custom_holidays, obj_terms, sacrifices, limit=10, weight=1000)
-    for doc in r_staff:
-        for d in days: obj_terms.append(shifts[(doc, d)] * -50000); sacrifices.append((shifts[(doc, d)], f"{doc} (R) 支援小班 ({month}/{d})"))
-    add_fairness_objective(model, shifts, pgy_staff + int_staff, days, custom_holidays, obj_terms, weight=W_FAIRNESS)
-    for doc in pgy_staff + int_staff:
-        nogo_list = pgy_nogo.get(doc, []) if doc in pgy_staff else int_nogo.get(doc, [])
-        wish_list = pgy_wishes.get(doc, []) if doc in pgy_staff else int_wishes.get(doc, [])
-        for d in days:
-            if d in nogo_list: obj_terms.append(shifts[(doc, d)] * -W_NOGO); sacrifices.append((shifts[(doc, d)], f"{doc} 排入不想值的班 ({month}/{d})"))
-            if d in wish_list: obj_terms.append(shifts[(doc, d)] * W_WISH)
-    model.Maximize(sum(obj_terms))
-    solver = cp_model.CpSolver()
-    solver.parameters.random_seed = len(forbidden_patterns) if forbidden_patterns else 0
-    status = solver.Solve(model)
-    result_pattern = []
-    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-        for doc in all_small_candidates:
-            for d in days:
-                if solver.Value(shifts[(doc, d)]) == 1: result_pattern.append((doc, d))
-    return solver, status, shifts, sacrifices, result_pattern
+    st.markdown("#### 🔗 分發連結")
+    with st.expander("點擊展開所有醫師連結"):
+        for doc, link in view["links"].items():
+            st.text_input(f"{doc}", value=link, key=f"link_{key}_{doc}")
+    st.download_button("📦 下載全部醫師行事曆 + 連結清單 (ZIP)", view["zip"], f"roster_{year}_{month}_plan_{key}.zip", "application/zip", key=f"zip_{key}")
+    st.download_button(f"📥 下載 Excel 日曆格式 (CSV)", view["csv"], f"roster_cal_{key}.csv", "text/csv", key=f"dl_{key}")
+    st.download_button("📌 下載已公告班表 (下個月跨月接續用)", view["record"], f"roster_published_{year}_{month}.json", "application/json", key=f"pub_{key}", disabled=draft)
+    if st.button(f"📚 公告並存入歷史紀錄 ({department} {year}/{month})", key=f"hist_{key}", disabled=draft):
+        get_history_store().publish(department, json.loads(view["record"]))
+        st.success(f"已存入 {department} {year}/{month} 的歷史紀錄 (同月份重新公告會覆蓋)")
+    return view["m_big"], view["m_small"]
+
+def render_diagnostics(trace, key="diag"):
+    with st.expander("🩺 效能診斷"):
+        st.caption("各階段耗時與 CP-SAT 求解統計 (衝突數、分支數、上界與差距)，可匯出 JSON 供離線分析。")
+        totals = pd.DataFrame(trace.totals())
+        if not totals.empty:
+            st.markdown("**各階段耗時**")
+            st.dataframe(totals.rename(columns={"name": "階段", "count": "次數", "total": "總耗時 (秒)"}), use_container_width=True, hide_index=True)
+        solves = pd.DataFrame(trace.solves)
+        if not solves.empty:
+            st.markdown("**CP-SAT 求解統計**")
+            solves["gap"] = solves["gap"].map(lambda g: None if g is None or pd.isna(g) else f"{g:.2%}")
+            st.dataframe(solves, use_container_width=True, hide_index=True)
+        st.download_button("📥 匯出診斷紀錄 (JSON)", trace.to_json(), f"roster_diagnostics_{year}_{month}.json", "application/json", key=f"dl_{key}")
+
+def render_infeasible(title, diagnosis):
+    st.error(f"{title}無法找出可行解！")
+    if diagnosis["issues"]:
+        st.markdown("**以下請假 / 指定值班一定排不出來 (不必求解即可確定)：**\n" + "\n".join(f"- {x['message']}" for x in diagnosis["issues"]))
+    elif diagnosis["conflicts"]:
+        st.markdown("**以下限制互相衝突，至少放寬其中一項即可排出：**\n" + "\n".join(f"- {x}" for x in diagnosis["conflicts"]))
+    else:
+        st.caption("診斷時間內未找出衝突的限制，請嘗試減少「絕對請假」的日期。")
 
 st.markdown("---")
 st.caption(f"目前設定將產生 {num_solutions} 組方案供您選擇")
 
+def results_from_job(output, job):
+    # 背景工作的求解輸出 -> 排班結果 (存在 session state)：{"notes", "failed" (標題, 診斷), "error", "success", "warning",
+    # "plans": [(key, 分頁名稱, ZIP 資料夾名稱, problem, big, small)], "bundle": (按鈕文字, 檔名, key), "trace"}
+    year, month = job["year"], job["month"]
+    results = {"notes": [], "failed": None, "error": None, "plans": [], "bundle": None, "trace": output["trace"]}
+    diagnosis = output["diagnosis"]
+    if output["kind"] == "rolling":
+        solved = [r for r in output["months"] if "record" in r]
+        if diagnosis:
+            failed = output["months"][-1]["problem"]
+            results["failed"] = (f"{failed['year']}/{failed['month']} ", diagnosis)
+        if solved:
+            results["success"] = f"✅ 成功排出 {len(solved)} 個月 (共 {sum(len(r['problem']['dates']) for r in solved)} 天)，耗時 {sum(r['time'] for r in solved):.1f}s"
+            results["plans"] = [(f"m{i + 1}", f"{r['problem']['year']}/{r['problem']['month']}" + (" ⚠️ 未含請假" if r["problem"].get("prefs_missing") else ""), f"{r['problem']['year']}年{r['problem']['month']}月", r["problem"], r["big"], r["small"]) for i, r in enumerate(solved)]
+            missing = missing_prefs([r["problem"] for r in solved])
+            if missing: results["notes"].append("⚠️ " + "、".join(f"{y}/{m}" for y, m in missing) + " 沒有請假 / 意願 / 國定假日設定，僅供參考")
+            results["bundle"] = (f"📦 下載全部 {len(solved)} 個月的行事曆 + 連結清單 (ZIP)", f"roster_{year}_{month}_{len(solved)}months.zip", "zip_months")
+        return results
+    timing, big_solutions, small_solutions = output["timing"], output["big"], output["small"]
+    if timing.get("cache_hits"): results["notes"].append(f"⚡ 已從快取取得 {timing['cache_hits']} 個結果")
+    if "build" in timing: results["notes"].append(f"⏱ 建模 {timing['build']:.2f}s · 搜尋 {timing['search']:.2f}s")
+    for stage, solutions in (("大班", big_solutions), ("小班", small_solutions)):
+        if solutions and solutions[0].get("stages"):
+            results["notes"].append(f"🪜 {stage}分層：" + " · ".join(f"{TIER_LABELS[t['tier']]} {t['time']:.2f}s" for t in solutions[0]["stages"]))
+    if diagnosis:
+        results["failed"] = ("", diagnosis)
+    else:
+        n_plans = min(len(big_solutions), len(small_solutions))
+        results["success"] = f"✅ 成功生成 {n_plans} 組方案！"
+        results["warning"] = any(r["status"] != cp_model.OPTIMAL for r in big_solutions + small_solutions)
+        results["plans"] = [(i + 1, f"方案 {i+1}", f"方案 {i+1}", job["problem"], big_solutions[i], small_solutions[i]) for i in range(n_plans)]
+        if n_plans > 1: results["bundle"] = (f"📦 下載全部 {n_plans} 組方案的行事曆 + 連結清單 (ZIP)", f"roster_{year}_{month}_all_plans.zip", "zip_all")
+        st.session_state["last_solve"] = {"problem": job["problem"], "big": big_solutions, "small": small_solutions}
+    return results
+
+def show_results(results):
+    st.session_state["results"] = results
+    st.session_state["plan_views"] = {}
+    st.session_state.pop("repair", None)
+    st.session_state.pop("oracles", None); st.session_state.pop("oracle_results", None); st.session_state.pop("swaps", None)
+
+# 求解在背景行程執行 (roster.jobs)：按下按鈕只送出工作，頁面輪詢進度，可隨時取消；
+# 分頁關閉後不再輪詢，工作會被自動取消
 if st.button("🚀 開始排班", type="primary"):
     if not (vs_staff and r_staff and pgy_staff and int_staff):
         st.error("錯誤：醫師名單不能為空！")
+    elif st.session_state.get("job"):
+        st.warning("上一個排班工作還在進行中，請等候完成或先取消。")
     else:
-        big_solutions = []
-        small_solutions = []
-        forbidden_big = []
-        forbidden_small = []
-        progress = st.empty()
-        
-        for i in range(num_solutions):
-            progress.text(f"運算中... ({i+1}/{num_solutions})")
-            
-            b_sol, b_stat, b_shifts, b_sac, b_pat, r_schedule_map = solve_big_shift(
-                vs_staff, r_staff, dates, 
-                st.session_state.vs_leaves, st.session_state.r_leaves,
-                st.session_state.vs_wishes, st.session_state.vs_nogo, 
-                st.session_state.r_nogo, st.session_state.r_wishes,
-                st.session_state.holidays, forbidden_patterns=forbidden_big
-            )
-            
-            s_sol, s_stat, s_shifts, s_sac, s_pat = solve_small_shift(
-                pgy_staff, int_staff, r_staff, dates, 
-                st.session_state.pgy_leaves, st.session_state.int_leaves,
-                st.session_state.pgy_nogo, st.session_state.pgy_wishes, 
-                st.session_state.int_nogo, st.session_state.int_wishes,
-                st.session_state.r_nogo, r_schedule_map, 
-                st.session_state.holidays, forbidden_patterns=forbidden_small
-            )
-
-            if b_stat in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-                big_solutions.append((b_sol, b_shifts, b_sac))
-                forbidden_big.append(b_pat)
-            
-            if s_stat in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
-                small_solutions.append((s_sol, s_shifts, s_sac))
-                forbidden_small.append(s_pat)
-
-        progress.empty()
-        
-        if not big_solutions or not small_solutions:
-            st.error("無法找出可行解！請嘗試減少「絕對請假」的日期。")
+        trace = Trace(year=year, month=month, num_solutions=num_solutions, pool=use_pool, options=solver_options, months=num_months)
+        try:
+            with span(trace, "build_problem"): problem = current_problem()
+        except ValueError as e:
+            st.error(f"跨月接續失敗：{e}"); st.stop()
+        # 建模前先預檢：某天沒人可值、指定值班與不可連值衝突等，直接指出原因而不求解
+        with span(trace, "precheck"): issues = precheck(problem)
+        if issues:
+            show_results({"notes": [], "failed": ("", {"issues": issues, "conflicts": []}), "error": None, "plans": [], "bundle": None, "trace": trace})
         else:
-            st.success(f"✅ 成功生成 {min(len(big_solutions), len(small_solutions))} 組方案！")
-            
-            tabs = st.tabs([f"方案 {i+1}" for i in range(min(len(big_solutions), len(small_solutions)))])
-            
-            for i, tab in enumerate(tabs):
-                with tab:
-                    b_data = big_solutions[i]
-                    s_data = small_solutions[i]
-                    
-                    df_big = generate_df(b_data[0], b_data[1], vs_staff+r_staff, dates, "大班")
-                    df_small = generate_df(s_data[0], s_data[1], pgy_staff+int_staff+r_staff, dates, "小班")
-                    sac_big = get_report(b_data[0], b_data[2])
-                    sac_small = get_report(s_data[0], s_data[2])
-                    
-                    if sac_big or sac_small:
-                        with st.expander("⚠️ 犧牲報告", expanded=True):
-                            if sac_big: st.write("**[大班]**"); [st.write(f"- 🔴 {s}") for s in sac_big]
-                            if sac_small: st.write("**[小班]**"); [st.write(f"- 🔵 {s}") for s in sac_small]
-                    else:
-                        st.info("✨ 完美方案")
-
-                    c1, c2 = st.columns(2)
-                    with c1: 
-                        st.markdown("### 大班統計")
-                        st.dataframe(calculate_stats(df_big, st.session_state.holidays), use_container_width=True)
-                    with c2: 
-                        st.markdown("### 小班統計")
-                        st.dataframe(calculate_stats(df_small, st.session_state.holidays), use_container_width=True)
-
-                    st.markdown(get_html_calendar(df_big, df_small, st.session_state.holidays), unsafe_allow_html=True)
-                    
-                    st.markdown("#### 🔗 分發連結")
-                    all_docs = pd.concat([df_big['醫師'], df_small['醫師']]).unique()
-                    with st.expander("點擊展開所有醫師連結"):
-                        for doc in all_docs:
-                            link = generate_magic_link(base_app_url, doc, df_big, df_small, year, month)
-                            st.text_input(f"{doc}", value=link, key=f"link_{i}_{doc}")
-
-                    excel_df = generate_excel_calendar_df(df_big, df_small)
-                    csv = excel_df.to_csv(index=False, header=False).encode('utf-8-sig')
-                    st.download_button(f"📥 下載 Excel 日曆格式 (CSV)", csv, f"roster_cal_{i+1}.csv", "text/csv", key=f"dl_{i}")
+            spec = {"options": solver_options, "cache_dir": DEFAULT_CACHE_DIR, "trace": trace}
+            if num_months > 1:
+                # 滾動式多月：每月一組方案，前一個月的結果即為下個月的接續狀態
+                problems, record = month_problems(get_current_config(), num_months), carry_record
+                balances = history_balances()
+                if balances is not None:
+                    if record: record = dict(record, balances=balances)
+                    else: problems[0] = dict(problems[0], balances=balances)
+                spec.update(kind="rolling", problems=problems, record=record)
+            else:
+                spec.update(kind="plans", problem=problem, num_solutions=num_solutions, pool=use_pool, min_distance=min_distance)
+            # 每個工作的時間上限：每階段上限 x 階段數，再加上建模與排隊以外的餘裕
+            stages = 2 * (num_months if num_months > 1 else num_solutions)
+            job_id = get_job_queue().submit(spec, timeout=(time_limit or DEFAULT_STAGE_LIMIT) * stages + 30)
+            st.session_state["job"] = {"id": job_id, "year": year, "month": month, "problem": problem}
+
+@st.fragment(run_every=1.0)
+def job_monitor():
+    job = st.session_state.get("job")
+    if not job: return
+    jobs = get_job_queue()
+    status = jobs.status(job["id"])
+    if status is not None and status["state"] in ("queued", "running"):
+        if status["state"] == "queued": st.info(f"⏳ 排隊中 (前面還有 {status['position']} 個工作)，目前主機上有 {jobs.running()} 個排班正在運算")
+        else: st.info(f"{status['progress']} ⏱ {status['elapsed']:.0f}s")
+        info = status["live"]
+        if info:
+            # 每找到更好的解就更新：目標值、與上界的差距、目前犧牲報告
+            gap = objective_gap(info["objective"], info["bound"]) * 100
+            tier = f" · {TIER_LABELS[info['tier']]}" if info.get("tier") else ""
+            where = f"第 {info['month']+1} 個月" if "month" in info else f"方案 {info['plan']+1}"
+            lines = [f"**{where} · {'大班' if info['stage'] == 'big' else '小班'}{tier}** ⏱ {info['wall_time']:.1f}s | 目標值 {info['objective']:,.0f} | 差距 {gap:.1f}% | 犧牲 {len(info['report'])} 項"]
+            lines += [f"- {s}" for s in info["report"][:5]]
+            st.markdown("\n".join(lines))
+        # 足夠好就停：目前的求解立即採用目前解，其餘階段採用第一個找到的解 (不寫入快取)
+        if status["accepted"]: st.caption("✅ 已採用目前解，正在完成其餘步驟...")
+        c1, c2 = st.columns(2)
+        if c1.button("✅ 採用目前解", key="accept_job", disabled=status["accepted"] or not info): jobs.accept(job["id"]); return
+        if c2.button("⏹ 取消排班", key="cancel_job"): jobs.cancel(job["id"])
+        else: return
+        status = jobs.status(job["id"])
+    del st.session_state["job"]
+    state = status["state"] if status else "expired"
+    if state == "done":
+        show_results(results_from_job(status["result"], job))
+    else:
+        messages = {"cancelled": "已取消排班。", "timeout": "⏱ 排班超過時間上限，已終止。請調整「每階段運算時間上限」或減少方案數後重試。",
+                    "failed": f"排班失敗：{status and status['error']}", "expired": "排班工作已失效，請重新排班。"}
+        show_results({"notes": [], "failed": None, "error": messages[state], "plans": [], "bundle": None, "trace": Trace()})
+    st.rerun()
+
+if st.session_state.get("job"): job_monitor()
+
+# 結果區也是獨立的 fragment：之後的任何操作都直接顯示上次的結果，不重新求解 / 計算
+@st.fragment
+def render_results():
+    results = st.session_state.get("results")
+    if not results: return
+    trace = results["trace"]
+    for note in results["notes"]: st.caption(note)
+    if results["error"]: st.error(results["error"])
+    if results["failed"]: render_infeasible(*results["failed"])
+    if results["plans"]:
+        st.success(results["success"])
+        if results.get("warning"): st.warning("⏱ 部分方案在時間上限 / 可接受差距內或手動「採用目前解」提前採用，未證明為最佳解。")
+        tabs = st.tabs([label for _, label, *_ in results["plans"]])
+        rendered = []
+        for tab, (key, _, folder, problem, big, small) in zip(tabs, results["plans"]):
+            with tab:
+                rendered.append((folder,) + render_plan(key, problem, big, small, trace))
+        if results["bundle"]:
+            label, file_name, key = results["bundle"]
+            views = st.session_state.setdefault("plan_views", {})
+            if (key, base_app_url) not in views:
+                with span(trace, "generate_distribution_zip", plan="all"):
+                    views[(key, base_app_url)] = generate_distribution_zip(base_app_url, rendered)
+            st.download_button(label, views[(key, base_app_url)], file_name, "application/zip", key=key)
+    render_diagnostics(trace)
+
+render_results()
+
+# --- 歷史統計：過去 12 個月各醫師的班數與點數 ---
+with st.expander("📚 歷史統計"):
+    store = get_history_store()
+    published = store.months(department)
+    if not published:
+        st.caption(f"{department} 尚無已存入的班表。排班後按「📚 公告並存入歷史紀錄」即可累積。")
+    else:
+        end = published[-1]
+        start = month_of(month_index(*end) - 11)
+        st.caption(f"{department} 已存入 {len(published)} 個月 ({published[0][0]}/{published[0][1]} ~ {end[0]}/{end[1]})；以下為最近 12 個月 ({start[0]}/{start[1]} 起)")
+        totals = pd.DataFrame(store.doctor_totals(department, start, end))
+        totals["shift"] = totals["shift"].map({"big": "大班", "small": "小班"})
+        st.dataframe(totals.rename(columns={"doctor": "醫師", "shift": "班別", "role": "職級", "wd": "平日", "we": "假日", "pts": "點數", "months": "月數"}), use_container_width=True, hide_index=True)
+        balances = store.balances(department, *month_of(month_index(*end) + 1), 12)
+        if balances:
+            st.markdown("**累計公平性餘額** (高於同組平均為正，下個月排班可作為偏移)")
+            st.dataframe(pd.DataFrame.from_dict(balances, orient="index").rename(columns={"wd": "平日", "we": "假日", "pts": "點數"}), use_container_width=True)
+
+# --- 局部修補：公告後臨時請假 / 意願異動 ---
+last_solve = st.session_state.get("last_solve")
+if last_solve:
+    with st.expander("🩹 局部修補 (已公告班表臨時異動)"):
+        st.caption("修改上方請假 / 意願後，以已公告的方案為起點，只重排受影響的日期與醫師，其餘班表維持不變。")
+        n_plans = min(len(last_solve["big"]), len(last_solve["small"]))
+        pick = st.selectbox("已公告方案", range(n_plans), format_func=lambda i: f"方案 {i+1}")
+        if st.button("🩹 局部修補"):
+            try:
+                problem = current_problem()
+            except ValueError as e:
+                st.error(f"跨月接續失敗：{e}"); st.stop()
+            with st.spinner("修補中..."):
+                new_big, new_small = repair_plan(last_solve["problem"], problem, last_solve["big"][pick], last_solve["small"][pick], options=solver_options)
+            st.session_state["repair"] = {"key": f"repair_{pick + 1}", "problem": problem, "big": new_big, "small": new_small}
+            st.session_state.get("plan_views", {}).pop((f"repair_{pick + 1}", base_app_url), None)
+        repair = st.session_state.get("repair")
+        if repair:
+            new_big, new_small = repair["big"], repair["small"]
+            if new_small is None or not is_solved(new_small):
+                st.error("局部修補無解！請改用「🚀 開始排班」重新排班。")
+            else:
+                r_month = repair["problem"]["month"]
+                changes = [{"班別": "大班", "日期": f"{r_month}/{d}", "原醫師": o, "新醫師": n} for d, o, n in new_big["changes"]]
+                changes += [{"班別": "小班", "日期": f"{r_month}/{d}", "原醫師": o, "新醫師": n} for d, o, n in new_small["changes"]]
+                st.success(f"✅ 修補完成，共異動 {len(changes)} 班 · 目標值 大班 {new_big['objective']:,.0f} / 小班 {new_small['objective']:,.0f} (不含異動扣分)")
+                if changes: st.table(pd.DataFrame(changes))
+                render_plan(repair["key"], repair["problem"], new_big, new_small)
+
+    # --- 請假試算：不修改設定、不重新排班，直接回答「這天能不能准假」 ---
+    with st.expander("🗓 請假試算 (已公告班表)"):
+        st.caption("試算在已公告的方案上再准假是否可行、需要異動哪些班，以及目標值的變化；每個日期各自試算，也可勾選一起准假。")
+        n_plans = min(len(last_solve["big"]), len(last_solve["small"]))
+        solved = last_solve["problem"]
+        s_month = solved["month"]
+        c1, c2, c3 = st.columns(3)
+        pick = c1.selectbox("已公告方案", range(n_plans), format_func=lambda i: f"方案 {i+1}", key="oracle_plan")
+        doctor = c2.selectbox("醫師", solved["vs_staff"] + solved["r_staff"] + solved["pgy_staff"] + solved["int_staff"], key="oracle_doctor")
+        from_day = c3.number_input("可調整的第一天 (之前的班已值完)", min_value=1, max_value=max(solved["dates"]), value=1, key="oracle_from")
+        days = st.multiselect("請假日期", solved["dates"], format_func=lambda d: f"{s_month}/{d}", key="oracle_days")
+        together = st.checkbox("所有日期一起准假", value=False, key="oracle_together")
+        if st.button("🗓 試算", disabled=not days):
+            # 同一方案、同一起始日共用常駐模型與結果快取
+            oracles = st.session_state.setdefault("oracles", {})
+            key = (id(last_solve), pick, from_day)
+            if key not in oracles:
+                oracles[key] = LeaveOracle(solved, last_solve["big"][pick], last_solve["small"][pick], from_day=from_day, num_workers=num_workers)
+            requests = [(doctor, days)] if together else [(doctor, d) for d in days]
+            with st.spinner("試算中..."):
+                st.session_state["oracle_results"] = oracles[key].check(requests)
+        rows = []
+        for r in st.session_state.get("oracle_results", []):
+            verdict = {True: "✅ 可准假", False: "❌ 不可行", None: "⏱ 時間內無法判斷"}[r["feasible"]]
+            changes = [f"{'大班' if stage == 'big' else '小班'} {s_month}/{d} {o} → {n}" for stage, diff in r["changes"].items() for d, o, n in diff]
+            rows.append({"請假": "、".join(f"{doc} {s_month}/{d}" for doc, d in r["request"]), "結果": verdict,
+                         "目標值變化": sum(v for v in r["delta"].values() if v is not None), "需異動": "；".join(changes) or (r["error"] or "不需異動"),
+                         "耗時 (秒)": round(r["time"], 3), "快取": "✓" if r["cached"] else ""})
+        if rows: st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
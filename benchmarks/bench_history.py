@@ -0,0 +1,72 @@
+import argparse
+import calendar
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roster.history import HistoryStore
+
+# ==========================================
+# 歷史班表查詢基準：多科別 x 多年份的已公告班表，量測寫入與彙總查詢時間
+# python benchmarks/bench_history.py [--departments 40] [--years 10] [-o history.json]
+# ==========================================
+STAFF = {"vs_staff": 2, "r_staff": 4, "pgy_staff": 6, "int_staff": 4}
+
+def synthetic_record(year, month, rng):
+    # 每天大班、小班各一人 (不檢查規則，只需要資料量與分布)
+    dates = list(range(1, calendar.monthrange(year, month)[1] + 1))
+    record = {"year": year, "month": month, "dates": dates, "holidays": rng.sample(dates, 1)}
+    for key, n in STAFF.items(): record[key] = [f"{key.split('_')[0].upper()}{i}" for i in range(n)]
+    big = record["vs_staff"] + record["r_staff"]
+    small = record["pgy_staff"] + record["int_staff"] + record["r_staff"][:1]
+    record["big"] = [[rng.choice(big), d] for d in dates]
+    record["small"] = [[rng.choice(small), d] for d in dates]
+    return record
+
+def timed(fn, runs):
+    t0 = time.perf_counter()
+    for _ in range(runs): out = fn()
+    return (time.perf_counter() - t0) / runs * 1000, out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="歷史班表 (SQLite) 寫入與彙總查詢基準")
+    parser.add_argument("--departments", type=int, default=40)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("-n", "--runs", type=int, default=20, help="每個查詢的重複次數 (取平均)")
+    parser.add_argument("-o", "--output", default=None, help="結果輸出檔 (JSON)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.sqlite"))
+        t0 = time.perf_counter()
+        for dep in range(args.departments):
+            for i in range(args.years * 12):
+                store.publish(f"D{dep:02d}", synthetic_record(2000 + i // 12, i % 12 + 1, rng))
+        load = time.perf_counter() - t0
+        rows = store.conn.execute("SELECT COUNT(*) FROM shifts").fetchone()[0]
+        last = 2000 + args.years - 1
+        queries = {
+            "totals_r_12m": lambda: store.doctor_totals("D00", (last, 1), (last, 12), role="r"),
+            "totals_all_years": lambda: store.doctor_totals("D00"),
+            "balances_12m": lambda: store.balances("D00", last + 1, 1, 12),
+            "balances_all_years": lambda: store.balances("D00", last + 1, 1, args.years * 12),
+        }
+        results = {"departments": args.departments, "months": args.years * 12, "shift_rows": rows, "load_s": round(load, 2)}
+        for name, fn in queries.items():
+            ms, _ = timed(fn, args.runs)
+            results[f"{name}_ms"] = round(ms, 2)
+        store.close()
+    print(f"{rows} 筆班 ({args.departments} 科 x {args.years * 12} 個月)，寫入 {load:.1f}s")
+    for name in queries: print(f"{name:>20}: {results[f'{name}_ms']:.2f} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roster.config import big_shift_args, small_shift_args
+from roster.solver import solve_big_shift, solve_small_shift
+from roster.synthetic import synthetic_problem
+
+# ==========================================
+# 排班求解基準測試：合成設定 x 參數掃描 -> 機器可讀結果
+# python benchmarks/bench_solver.py [--quick] [-o bench_results.json] [--baseline old.json]
+# ==========================================
+BASE = {"n_vs": 2, "n_r": 4, "n_pgy": 6, "n_int": 4, "days": 31, "leave_density": 0.05, "nogo_density": 0.05, "n_holidays": 1}
+
+# 一次只改變一個參數，得到各維度的 scaling curve
+SWEEPS = {
+    "staff": [{"n_vs": 2 * k, "n_r": 4 * k, "n_pgy": 6 * k, "n_int": 4 * k} for k in (1, 2, 4, 8)],
+    "leave_density": [{"leave_density": x} for x in (0.0, 0.05, 0.1, 0.2, 0.3)],
+    "nogo_density": [{"nogo_density": x} for x in (0.0, 0.05, 0.1, 0.2, 0.3)],
+    "n_holidays": [{"n_holidays": x} for x in (0, 2, 4, 8)],
+    "days": [{"days": x} for x in (28, 30, 31, 60, 90)],
+    # 沒有任何請假 / 意願：同組醫師完全可互換 (對稱性最高)
+    "no_prefs": [{"leave_density": 0.0, "nogo_density": 0.0, "wish_density": 0.0, "n_vs": 2 * k, "n_r": 4 * k, "n_pgy": 6 * k, "n_int": 4 * k} for k in (1, 2, 4)],
+}
+QUICK_SWEEPS = {
+    "staff": [{"n_vs": 2 * k, "n_r": 4 * k, "n_pgy": 6 * k, "n_int": 4 * k} for k in (1, 2)],
+    "leave_density": [{"leave_density": x} for x in (0.0, 0.2)],
+    "days": [{"days": x} for x in (31, 60)],
+}
+
+def _maxrss_mb():
+    # Linux 回傳 KB，macOS 回傳 bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+def run_case(case, time_limit, num_workers, symmetry_breaking=False):
+    # 在獨立子行程執行，peak RSS 才不會被前一個案例影響
+    problem = synthetic_problem(**case["params"], seed=case["seed"])
+    options = {"time_limit": time_limit, "num_workers": num_workers, "symmetry_breaking": symmetry_breaking}
+    rss_before = _maxrss_mb()
+    tracemalloc.start()
+    result = dict(case)
+    for stage in ("big", "small"):
+        timings = {}
+        t0 = time.perf_counter()
+        if stage == "big":
+            solver, status, _, _, pattern, r_schedule_map = solve_big_shift(**big_shift_args(problem), **options, timings=timings)
+        else:
+            solver, status, _, _, pattern = solve_small_shift(**small_shift_args(problem, r_schedule_map), **options, timings=timings)
+        ok = bool(pattern)
+        result[stage] = {
+            "status": solver.StatusName(status),
+            "objective": solver.ObjectiveValue() if ok else None,
+            "bound": solver.BestObjectiveBound() if ok else None,
+            "build_time": round(timings["build"], 4),
+            "solve_time": round(timings["search"], 4),
+            "total_time": round(time.perf_counter() - t0, 4),
+            "conflicts": solver.NumConflicts(),
+            "branches": solver.NumBranches(),
+        }
+    result["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+    tracemalloc.stop()
+    result["peak_rss_mb"] = round(_maxrss_mb(), 1)
+    result["rss_growth_mb"] = round(_maxrss_mb() - rss_before, 1)
+    return result
+
+def build_cases(sweeps, seeds):
+    cases = []
+    for sweep, variants in sweeps.items():
+        for variant in variants:
+            for seed in range(seeds):
+                cases.append({"sweep": sweep, "params": dict(BASE, **variant), "seed": seed})
+    return cases
+
+def case_key(r):
+    return (json.dumps(r["params"], sort_keys=True), r["seed"])
+
+def compare(results, baseline_path, tolerance):
+    # 與先前的結果比較：時間變慢超過 tolerance 倍或目標值變差即列為回歸
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get(case_key(r))
+        if old is None: continue
+        for stage in ("big", "small"):
+            new_s, old_s = r[stage], old[stage]
+            if new_s["total_time"] > max(old_s["total_time"] * tolerance, old_s["total_time"] + 0.05):
+                regressions.append(f"{r['sweep']} {r['params']} seed={r['seed']} [{stage}] 時間 {old_s['total_time']}s -> {new_s['total_time']}s")
+            if old_s["objective"] is not None and (new_s["objective"] is None or new_s["objective"] < old_s["objective"]):
+                regressions.append(f"{r['sweep']} {r['params']} seed={r['seed']} [{stage}] 目標值 {old_s['objective']} -> {new_s['objective']}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排班求解基準測試 (合成設定的 scaling curve)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="結果輸出檔 (JSON)")
+    parser.add_argument("--quick", action="store_true", help="只跑小型掃描 (CI / 快速檢查)")
+    parser.add_argument("--sweep", action="append", choices=sorted(SWEEPS), help="只跑指定的掃描維度 (可重複)")
+    parser.add_argument("--seeds", type=int, default=2, help="每個設定的隨機種子數")
+    parser.add_argument("--time-limit", type=float, default=30.0, help="每階段求解時間上限 (秒)")
+    parser.add_argument("--workers", type=int, default=8, help="CP-SAT 執行緒數 (固定以利比較)")
+    parser.add_argument("--symmetry-breaking", action="store_true", help="加入同組醫師的對稱性破除限制 (與不加的結果比較)")
+    parser.add_argument("--baseline", help="與先前的結果檔比較並回報回歸")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="時間回歸門檻 (倍數，預設 1.5)")
+    args = parser.parse_args(argv)
+
+    sweeps = QUICK_SWEEPS if args.quick else SWEEPS
+    if args.sweep: sweeps = {k: SWEEPS[k] for k in args.sweep}
+    cases = build_cases(sweeps, args.seeds)
+
+    results = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as ex:
+        for r in ex.map(run_case, cases, [args.time_limit] * len(cases), [args.workers] * len(cases), [args.symmetry_breaking] * len(cases)):
+            results.append(r)
+            print(f"[{r['sweep']}] {r['params']} seed={r['seed']}: "
+                  f"big {r['big']['status']} {r['big']['build_time']:.3f}+{r['big']['solve_time']:.3f}s | "
+                  f"small {r['small']['status']} {r['small']['build_time']:.3f}+{r['small']['solve_time']:.3f}s | "
+                  f"peak {r['peak_rss_mb']}MB")
+
+    meta = {
+        "python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+        "time_limit": args.time_limit, "workers": args.workers, "symmetry_breaking": args.symmetry_breaking, "wall_time": round(time.perf_counter() - t0, 2),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {args.output} ({len(results)} 個案例, {meta['wall_time']}s)")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for msg in regressions: print(f"⚠️ 回歸: {msg}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
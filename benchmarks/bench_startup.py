@@ -0,0 +1,59 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# ==========================================
+# 啟動時間量測：醫師連結 (快速路徑) vs 管理介面，每次都在全新的行程 (冷啟動)
+# python benchmarks/bench_startup.py [-n 5] [-o startup.json]
+# ==========================================
+HEAVY_MODULES = ["ortools", "pandas", "numpy", "pyarrow"]
+
+def run_child(path, payload):
+    # 子行程：以 AppTest 執行一次 app.py，回報腳本執行時間與已載入的大型模組
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t1 = time.perf_counter()
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    if path == "doctor": at.query_params["payload"] = payload
+    at.run()
+    t2 = time.perf_counter()
+    loaded = [m for m in HEAVY_MODULES if m in sys.modules]
+    print(json.dumps({"streamlit_import": t1 - t0, "script_run": t2 - t1, "loaded": loaded, "ok": not at.exception}))
+
+def measure(path, payload, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", path, "--payload", payload], capture_output=True, text=True, cwd=ROOT, check=True).stdout
+        wall = time.perf_counter() - t0
+        samples.append(dict(json.loads(out.strip().splitlines()[-1]), process=wall))
+    summary = {k: round(statistics.median(s[k] for s in samples), 3) for k in ("process", "streamlit_import", "script_run")}
+    return dict(summary, loaded=samples[-1]["loaded"], ok=all(s["ok"] for s in samples), runs=runs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測醫師連結與管理介面的冷啟動時間")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="每條路徑的重複次數 (取中位數)")
+    parser.add_argument("-o", "--output", default=None, help="結果輸出檔 (JSON)")
+    parser.add_argument("--child", choices=["doctor", "admin"], help=argparse.SUPPRESS)
+    parser.add_argument("--payload", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child: return run_child(args.child, args.payload)
+
+    from roster.links import encode_payload
+    payload = encode_payload("洋洋(R3)", 2025, 12, [{'d': d, 't': '大班'} for d in (3, 9, 15, 22, 28)] + [{'d': d, 't': '小班'} for d in (1, 12)])
+    results = {path: measure(path, payload, args.runs) for path in ("doctor", "admin")}
+    for path, r in results.items():
+        print(f"{path:>6}: 行程 {r['process']:.2f}s | 腳本 {r['script_run']:.2f}s | 載入 {', '.join(r['loaded']) or '-'}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
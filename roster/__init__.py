@@ -0,0 +1 @@
+# 耕莘醫院雙軌排班系統：與 Streamlit 無關的排班核心 (模型、求解、輸出)
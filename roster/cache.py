@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from .solver import is_optimal
+
+# ==========================================
+# 求解快取：以正規化後輸入的雜湊為 key，存放精簡結果 (磁碟 + LRU)
+# ==========================================
+# 模型有改動 (限制 / 權重) 或寫入條件改變時請遞增，舊快取自動失效
+CACHE_VERSION = 5
+DEFAULT_CACHE_DIR = os.environ.get("ROSTER_CACHE_DIR", ".roster_cache")
+
+def normalize(value):
+    # dict 依 key 排序並略過空值 (例如 {doc: []} 與沒有設定相同)；
+    # list 視為集合 (名單、日期、forbidden pattern) 排序去重；tuple 視為有序紀錄 (doc, d)
+    if isinstance(value, dict):
+        items = {str(k): normalize(v) for k, v in value.items()}
+        return {k: v for k, v in sorted(items.items()) if v not in ([], {}, None)}
+    if isinstance(value, (list, set, frozenset)):
+        items = [normalize(v) for v in value]
+        unique = {json.dumps(v, sort_keys=True, ensure_ascii=False): v for v in items}
+        return [unique[k] for k in sorted(unique)]
+    if isinstance(value, tuple):
+        return [normalize(v) for v in value]
+    return value
+
+def cache_key(stage, inputs):
+    payload = {"v": CACHE_VERSION, "stage": stage, "inputs": normalize(inputs)}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _restore(result):
+    # JSON 沒有 tuple，還原 pattern 為 (doc, d)
+    result["pattern"] = [tuple(x) for x in result["pattern"]]
+    result["cached"] = True
+    return result
+
+class SolveCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=512):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # LRU：以 mtime 記錄最後使用時間
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp, self._path(key))
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"): continue
+            path = os.path.join(self.directory, name)
+            try: entries.append((os.path.getmtime(path), path))
+            except OSError: pass
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_entries)]:
+            try: os.remove(path)
+            except OSError: pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"): os.remove(os.path.join(self.directory, name))
+
+def cached(cache, stage, inputs, compute, stats=None):
+    # compute() 回傳精簡結果 (dict) 或其 list；只有證明為最佳 (OPTIMAL，含達到可接受差距) 且不是使用者提前採用 (accepted)
+    # 的結果才寫入快取：時間上限內只找到可行解 (FEASIBLE) 的結果下次重新求解，不會被當成最終結果
+    if cache is None: return compute()
+    key = cache_key(stage, inputs)
+    hit = cache.get(key)
+    if hit is not None:
+        if stats is not None: stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+        return [_restore(r) for r in hit] if isinstance(hit, list) else _restore(hit)
+    value = compute()
+    results = value if isinstance(value, list) else [value]
+    if results and all(is_optimal(r) and not r.get("accepted") for r in results):
+        cache.put(key, value)
+    return value
@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from .cache import SolveCache
+from .config import load_config, build_problem
+from .diagnostics import Trace
+from .feasibility import precheck, diagnose
+from .pipeline import solve_plans
+from .solver import TIERS
+from .matrix import roster_matrix
+from .views import generate_df
+
+# ==========================================
+# 批次排班：python -m roster.cli <設定檔目錄> -o <輸出目錄>
+# ==========================================
+def solve_config_file(path, num_solutions=1, pool=False, min_distance=3, cache_dir=None, options=None):
+    t0 = time.perf_counter()
+    trace = Trace(config=str(path), num_solutions=num_solutions, pool=pool, options=options)
+    with trace.span("build_problem"): problem = build_problem(load_config(path))
+    p = problem
+    cache = SolveCache(cache_dir) if cache_dir else None
+    with trace.span("precheck"): issues = precheck(problem)
+    if issues:
+        big_solutions, small_solutions, timing = [], [], {}
+    else:
+        with trace.span("solve_plans"):
+            big_solutions, small_solutions, timing = solve_plans(problem, num_solutions, pool=pool, min_distance=min_distance, cache=cache, options=options, trace=trace)
+    plans = []
+    for i, (big, small) in enumerate(zip(big_solutions, small_solutions)):
+        with trace.span("generate_df", plan=i + 1):
+            df_big = generate_df(roster_matrix(big["pattern"], p["vs_staff"] + p["r_staff"], p["dates"], p["year"], p["month"], p["holidays"], "大班"))
+            df_small = generate_df(roster_matrix(small["pattern"], p["pgy_staff"] + p["int_staff"] + p["r_staff"], p["dates"], p["year"], p["month"], p["holidays"], "小班"))
+        plans.append({
+            "big": df_big.to_dict("records"),
+            "small": df_small.to_dict("records"),
+            "sacrifices": {"big": big["report"], "small": small["report"]},
+        })
+    # 不可行：預檢結果或最小衝突集合 (互相衝突的請假 / 指定值班)
+    diagnosis = None
+    if not plans:
+        with trace.span("diagnose"): diagnosis = {"stage": "big", "issues": issues, "conflicts": []} if issues else diagnose(problem, big_solutions[0] if big_solutions else None)
+    timing["total"] = time.perf_counter() - t0
+    return {
+        "config": str(path), "year": p["year"], "month": p["month"],
+        "status": "OK" if plans else "INFEASIBLE",
+        "plans": plans, "timing": {k: round(v, 3) for k, v in timing.items()},
+        "infeasibility": diagnosis, "diagnostics": trace.to_dict(),
+    }
+
+def find_configs(config_dir):
+    return sorted(p for p in Path(config_dir).rglob("*.json") if p.is_file())
+
+def output_name(config_dir, path):
+    rel = path.relative_to(config_dir).with_suffix("")
+    return "__".join(rel.parts) + ".roster.json"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m roster.cli", description="批次求解 roster_config.json 設定檔 (多科別 / 多月份)")
+    parser.add_argument("config_dir", help="存放 roster_config.json 的目錄 (含子目錄)")
+    parser.add_argument("-o", "--output", default="roster_output", help="輸出目錄 (預設: roster_output)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="同時求解的設定檔數 (行程數)")
+    parser.add_argument("-n", "--num-solutions", type=int, default=1, help="每個設定檔產生的方案數量")
+    parser.add_argument("--pool", action="store_true", help="多方案以平行方案池一次求解 (取代逐一重解)")
+    parser.add_argument("--min-distance", type=int, default=3, help="方案之間最少相異天數 (預設 3)")
+    parser.add_argument("--cache-dir", default=None, help="求解快取目錄 (不指定則不使用快取)")
+    parser.add_argument("--time-limit", type=float, default=None, help="每階段運算時間上限 (秒)")
+    parser.add_argument("--relative-gap", type=float, default=None, help="可接受的最佳差距 (0.01 = 1%%)")
+    parser.add_argument("--solver-workers", type=int, default=None, help="每個求解的 CP-SAT 執行緒數 (預設 CPU 數 / -j)")
+    parser.add_argument("--lexicographic", action="store_true", help="分層最佳化：依上限 > 支援 > No-Go > 公平性 / 點數 > 想值班逐層求解")
+    parser.add_argument("--tier-limit", action="append", default=[], metavar="TIER=SECONDS",
+                        help=f"分層最佳化某一層的時間上限 (可重複；層級：{', '.join(TIERS)})")
+    args = parser.parse_args(argv)
+    tier_limits = {}
+    for item in args.tier_limit:
+        tier, _, seconds = item.partition("=")
+        try: tier_limits[tier] = float(seconds)
+        except ValueError: parser.error(f"--tier-limit 格式為 TIER=SECONDS：{item}")
+        if tier not in TIERS: parser.error(f"--tier-limit 的層級需為 {', '.join(TIERS)} 之一：{item}")
+    options = {
+        "num_workers": args.solver_workers or max(1, (os.cpu_count() or 1) // max(1, args.jobs)),
+        "time_limit": args.time_limit, "relative_gap": args.relative_gap,
+    }
+    if args.lexicographic: options.update(lexicographic=True, tier_limits=tier_limits or None)
+
+    configs = find_configs(args.config_dir)
+    if not configs:
+        parser.error(f"{args.config_dir} 內找不到任何 .json 設定檔")
+    out_dir = Path(args.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    summary = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(solve_config_file, str(path), args.num_solutions, args.pool, args.min_distance, args.cache_dir, options): path for path in configs}
+        for fut in as_completed(futures):
+            path = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = {"config": str(path), "status": "ERROR", "error": str(e), "plans": [], "timing": {}}
+            out_path = out_dir / output_name(args.config_dir, path)
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            summary.append({"config": str(path), "output": str(out_path), "status": result["status"], "plans": len(result["plans"]), "timing": result["timing"]})
+            print(f"[{result['status']}] {path} -> {out_path} ({result['timing'].get('total', '-')}s)")
+
+    summary.sort(key=lambda x: x["config"])
+    with open(out_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump({"wall_time": round(time.perf_counter() - t0, 3), "results": summary}, f, ensure_ascii=False, indent=2)
+    failed = [s for s in summary if s["status"] != "OK"]
+    print(f"完成 {len(summary) - len(failed)}/{len(summary)} 份設定檔，總耗時 {time.perf_counter() - t0:.1f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+import calendar
+import json
+
+# ==========================================
+# 設定檔 (roster_config.json，與側邊欄「下載設定」格式相同)
+# ==========================================
+DEFAULT_CONFIG = {
+    "year": 2025,
+    "month": 12,
+    "vs_list": "張醫師(VS), 王醫師(VS)", 
+    "r_list": "洋洋(R3), 蹦蹦(R2)",
+    "pgy_list": "小明(PGY), 小華(PGY), 小強(PGY)",
+    "int_list": "菜鳥A(Int), 菜鳥B(Int)",
+    "vs_leaves": {}, "r_leaves": {}, "pgy_leaves": {}, "int_leaves": {},
+    "vs_wishes": {},  "vs_nogo": {},
+    "r_wishes": {},   "r_nogo": {},
+    "pgy_wishes": {}, "pgy_nogo": {},
+    "int_wishes": {}, "int_nogo": {},
+    "holidays": [],
+    # 連續排多個月時第 2 個月起的設定 (依序)：[{"holidays": [...], "vs_leaves": {...}, ...}]，key 同上方的偏好設定
+    "next_months": []
+}
+
+# 偏好設定 key -> 對應的人員名單 key
+PREF_STAFF = {
+    "vs_leaves": "vs_list", "vs_wishes": "vs_list", "vs_nogo": "vs_list",
+    "r_leaves": "r_list", "r_wishes": "r_list", "r_nogo": "r_list",
+    "pgy_leaves": "pgy_list", "pgy_wishes": "pgy_list", "pgy_nogo": "pgy_list",
+    "int_leaves": "int_list", "int_wishes": "int_list", "int_nogo": "int_list",
+}
+
+def parse_staff(text):
+    return [x.strip() for x in text.split(",") if x.strip()]
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    config = dict(DEFAULT_CONFIG)
+    for key in DEFAULT_CONFIG.keys():
+        if key in data: config[key] = data[key]
+    return config
+
+# 把設定檔整理成 solve_big_shift / solve_small_shift 的輸入 (名單拆開、日期限制在當月)
+def build_problem(config):
+    year, month = int(config["year"]), int(config["month"])
+    days_in_month = calendar.monthrange(year, month)[1]
+    dates = [d for d in range(1, days_in_month + 1)]
+    problem = {"year": year, "month": month, "dates": dates}
+    for key in ["vs_list", "r_list", "pgy_list", "int_list"]:
+        problem[key.replace("_list", "_staff")] = parse_staff(config[key])
+    for key, staff_key in PREF_STAFF.items():
+        staff = problem[staff_key.replace("_list", "_staff")]
+        prefs = config.get(key) or {}
+        problem[key] = {doc: [int(d) for d in prefs.get(doc, []) if 1 <= int(d) <= days_in_month] for doc in staff if doc in prefs}
+    problem["holidays"] = [int(d) for d in config.get("holidays", []) if 1 <= int(d) <= days_in_month]
+    return problem
+
+def big_shift_args(problem):
+    p = problem
+    return dict(
+        year=p["year"], month=p["month"], vs_staff=p["vs_staff"], r_staff=p["r_staff"], days=p["dates"],
+        vs_leaves=p["vs_leaves"], r_leaves=p["r_leaves"], vs_wishes=p["vs_wishes"], vs_nogo=p["vs_nogo"],
+        r_nogo=p["r_nogo"], r_wishes=p["r_wishes"], custom_holidays=p["holidays"],
+        boundary=p.get("boundary", {}).get("big", []), balances=p.get("balances", {}),
+    )
+
+def small_shift_args(problem, r_schedule_map):
+    p = problem
+    # 上月最後幾天的 R 大班 (d <= 0) 一樣要避開前後 2 天
+    carried = p.get("boundary", {}).get("big", [])
+    if carried:
+        r_schedule_map = {doc: sorted({d for x, d in carried if x == doc} | set(days)) for doc, days in r_schedule_map.items()}
+    return dict(
+        year=p["year"], month=p["month"], pgy_staff=p["pgy_staff"], int_staff=p["int_staff"], r_staff=p["r_staff"], days=p["dates"],
+        pgy_leaves=p["pgy_leaves"], int_leaves=p["int_leaves"], pgy_nogo=p["pgy_nogo"], pgy_wishes=p["pgy_wishes"],
+        int_nogo=p["int_nogo"], int_wishes=p["int_wishes"], r_nogo=p["r_nogo"], r_schedule_map=r_schedule_map, custom_holidays=p["holidays"],
+        boundary=p.get("boundary", {}).get("small", []), balances=p.get("balances", {}),
+    )
@@ -0,0 +1,67 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from ortools.sat.python import cp_model
+
+# ==========================================
+# 效能診斷：各階段計時 (span) + CP-SAT 求解統計，可匯出 JSON 供離線分析
+# ==========================================
+SOLVE_FIELDS = ["status", "objective", "bound", "wall_time", "conflicts", "branches", "build_time", "search_time", "cached"]
+
+def objective_gap(objective, bound):
+    # 目前解與上界的相對差距 (0 = 已證明最佳)
+    if objective is None or bound is None: return None
+    return abs(bound - objective) / max(1, abs(objective))
+
+class Trace:
+    def __init__(self, **meta):
+        self.meta = meta
+        self.created = datetime.now().isoformat(timespec="seconds")
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.solves = []
+
+    @contextmanager
+    def span(self, name, **meta):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append(dict(name=name, start=round(start - self.t0, 4), duration=round(time.perf_counter() - start, 4), **meta))
+
+    def add_span(self, name, duration, **meta):
+        # 在其他地方量測好的時間 (例如求解內部的建模 / 搜尋)
+        self.spans.append(dict(name=name, start=None, duration=round(duration, 4), **meta))
+
+    def add_solve(self, stage, plan, result):
+        row = {"stage": stage, "plan": plan}
+        row.update({k: result.get(k) for k in SOLVE_FIELDS})
+        if row["status"] is not None: row["status"] = cp_model.CpSolverStatus(row["status"]).name
+        row["cached"] = bool(row["cached"])
+        row["gap"] = objective_gap(row["objective"], row["bound"])
+        self.solves.append(row)
+        # 分層最佳化：每一層一列 (stage 為 "big.fairness" 等)
+        for tier in result.get("stages") or []:
+            self.solves.append({"stage": f"{stage}.{tier['tier']}", "plan": plan, "status": cp_model.CpSolverStatus(tier["status"]).name,
+                                "objective": tier["objective"], "bound": tier["bound"], "wall_time": tier["time"], "cached": row["cached"],
+                                "gap": objective_gap(tier["objective"], tier["bound"])})
+
+    def totals(self):
+        # 同名 span 合計 (例如每個方案各算一次 calculate_stats)
+        totals = {}
+        for s in self.spans:
+            t = totals.setdefault(s["name"], {"name": s["name"], "count": 0, "total": 0.0})
+            t["count"] += 1; t["total"] = round(t["total"] + s["duration"], 4)
+        return sorted(totals.values(), key=lambda t: -t["total"])
+
+    def to_dict(self):
+        return {"created": self.created, "meta": self.meta, "totals": self.totals(), "spans": self.spans, "solves": self.solves}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+def span(trace, name, **meta):
+    # trace 為 None 時不計時
+    return trace.span(name, **meta) if trace is not None else nullcontext()
@@ -0,0 +1,99 @@
+from ortools.sat.python import cp_model
+
+from .config import big_shift_args, small_shift_args
+from .solver import build_big_model, build_small_model, day_masks, new_solver, r_schedule_from_pattern
+
+# ==========================================
+# 不可行診斷：建模前的快速預檢 + 假設文字 (assumption literal) 找出最小衝突集合
+# ==========================================
+# 預檢只找「一定排不出來」的情況 (每天恰好一人、不可連值)，找到的問題都是真的衝突；
+# 預檢通過但求解仍不可行時，再以 conflict_set() 一次求解取得互相衝突的請假 / 指定值班。
+DIAGNOSIS_TIME_LIMIT = 10.0
+
+def _issue(stage, d, label, message):
+    return {"stage": stage, "day": d, "message": f"[{'大班' if stage == 'big' else '小班'}] {label[d]} {message}"}
+
+def _check_days(stage, days, label, available, forced):
+    # available：{d: 可值班的人}；forced：{d: {doc: 原因}} 一定要值班的人 (指定值班或當天唯一人選)
+    issues = []
+    for d in days:
+        if not available[d]: issues.append(_issue(stage, d, label, "沒有任何人可以值班 (全部請假或不可支援)"))
+        elif len(available[d]) == 1: forced.setdefault(d, {}).setdefault(available[d][0], "當天唯一可值班的人")
+    for d in days:
+        docs = forced.get(d, {})
+        if len(docs) > 1: issues.append(_issue(stage, d, label, "同時需要 " + "、".join(f"{doc} ({why})" for doc, why in docs.items()) + "，但每天只能一人值班"))
+        if d + 1 not in forced: continue
+        for doc in set(docs) & set(forced[d + 1]):
+            issues.append(_issue(stage, d, label, f"與隔天都必須由 {doc} 值班 ({docs[doc]} / {forced[d + 1][doc]})，違反不可連續值班"))
+    return issues
+
+def precheck_big(args):
+    # args：big_shift_args(problem)
+    days = args["days"]
+    label = day_masks(args["year"], args["month"], days, args["custom_holidays"])["label"]
+    staff = args["vs_staff"] + args["r_staff"]
+    vs_set = set(args["vs_staff"])
+    off = {(doc, d) for leaves in (args["vs_leaves"], args["r_leaves"]) for doc, ds in leaves.items() for d in ds}
+    off |= {(doc, b + 1) for doc, b in args.get("boundary") or []}
+    available = {d: [doc for doc in staff if (doc, d) not in off] for d in days}
+    forced, issues = {}, []
+    for doc, ds in args["vs_wishes"].items():
+        if doc not in vs_set: continue
+        for d in ds:
+            if (doc, d) in off: issues.append(_issue("big", d, label, f"{doc} 指定值班，但當天請假或上月月底剛值班"))
+            else: forced.setdefault(d, {})[doc] = "指定值班"
+    return issues + _check_days("big", days, label, available, forced)
+
+def precheck_small(args):
+    # args：small_shift_args(problem, r_schedule_map)
+    days = args["days"]
+    label = day_masks(args["year"], args["month"], days, args["custom_holidays"])["label"]
+    off = {(doc, d) for leaves in (args["pgy_leaves"], args["int_leaves"]) for doc, ds in leaves.items() for d in ds}
+    off |= {(doc, b + 1) for doc, b in args.get("boundary") or []}
+    for doc in args["r_staff"]:
+        off |= {(doc, b + k) for b in args["r_schedule_map"].get(doc, []) for k in range(-2, 3)}
+        off |= {(doc, d) for d in args["r_nogo"].get(doc, [])}
+    staff = args["pgy_staff"] + args["int_staff"] + args["r_staff"]
+    available = {d: [doc for doc in staff if (doc, d) not in off] for d in days}
+    return _check_days("small", days, label, available, {})
+
+def precheck(problem, r_schedule_map=None):
+    # 建模前的預檢 (只用 Python)；r_schedule_map 為 None 時只檢查大班
+    issues = precheck_big(big_shift_args(problem))
+    if r_schedule_map is not None: issues += precheck_small(small_shift_args(problem, r_schedule_map))
+    return issues
+
+def _infeasible_core(model, literals, time_limit):
+    # 回傳不可行時 CP-SAT 回報的假設子集合 (literal index)；可行 (或逾時) 回傳 None
+    model.ClearAssumptions(); model.AddAssumptions(literals)
+    solver = new_solver(num_workers=1, time_limit=time_limit)
+    if solver.Solve(model) != cp_model.INFEASIBLE: return None
+    return set(solver.SufficientAssumptionsForInfeasibility())
+
+def conflict_set(stage, args, minimize=True, time_limit=DIAGNOSIS_TIME_LIMIT):
+    # 以假設文字控制請假 / 指定值班 / 不可支援，回傳互相衝突的原因 (可行時回傳 [])；
+    # minimize：逐一拿掉集合中的假設重解，剩下的每一條都是必要的 (最小衝突集合)
+    assumptions = {}
+    build = build_big_model if stage == "big" else build_small_model
+    # 拿掉部分假設後醫師不再可互換，對稱性破除會讓診斷出錯，所以不加
+    model = build(**args, assumptions=assumptions, symmetry_breaking=False)[0]
+    model.ClearObjective()
+    core = _infeasible_core(model, [lit for lit, _ in assumptions.values()], time_limit)
+    if core is None: return []
+    if minimize:
+        for index in sorted(core):
+            if index not in core: continue
+            smaller = _infeasible_core(model, [assumptions[i][0] for i in core if i != index], time_limit)
+            if smaller is not None: core = smaller
+    return [assumptions[i][1] for i in sorted(core)]
+
+def diagnose(problem, big=None):
+    # big：已排好的大班結果 (小班不可行時傳入)；回傳 {"stage", "issues" (預檢), "conflicts" (最小衝突集合)}
+    stage = "big" if big is None else "small"
+    if stage == "big":
+        args = big_shift_args(problem)
+        issues = precheck_big(args)
+    else:
+        args = small_shift_args(problem, r_schedule_from_pattern(big["pattern"], problem["r_staff"]))
+        issues = precheck_small(args)
+    return {"stage": stage, "issues": issues, "conflicts": [] if issues else conflict_set(stage, args)}
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+
+# ==========================================
+# 歷史班表：已公告班表存入本機 SQLite，可查詢長期的班數 / 點數與公平性餘額
+# ==========================================
+# 只用標準函式庫。班表以 (科別, 月份, 醫師, 班別) 為索引；month_index = year * 12 + month - 1
+DEFAULT_HISTORY_DB = os.environ.get("ROSTER_HISTORY_DB", "roster_history.sqlite")
+ROLE_KEYS = {"vs": "vs_staff", "r": "r_staff", "pgy": "pgy_staff", "int": "int_staff"}
+# 公平性分組 (與 horizon.month_balances 相同)：大班比 R、小班比 PGY + Int
+FAIRNESS_GROUPS = {"big": ("r",), "small": ("pgy", "int")}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rosters (
+    id INTEGER PRIMARY KEY,
+    department TEXT NOT NULL,
+    month_index INTEGER NOT NULL,
+    published_at TEXT NOT NULL,
+    record TEXT NOT NULL,
+    UNIQUE (department, month_index)
+);
+CREATE TABLE IF NOT EXISTS shifts (
+    roster_id INTEGER NOT NULL REFERENCES rosters(id) ON DELETE CASCADE,
+    department TEXT NOT NULL,
+    month_index INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    doctor TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    role TEXT NOT NULL,
+    holiday INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS members (
+    roster_id INTEGER NOT NULL REFERENCES rosters(id) ON DELETE CASCADE,
+    department TEXT NOT NULL,
+    month_index INTEGER NOT NULL,
+    doctor TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_shifts_month ON shifts (department, month_index, shift, role, doctor, holiday);
+CREATE INDEX IF NOT EXISTS idx_shifts_doctor ON shifts (department, doctor, month_index);
+CREATE INDEX IF NOT EXISTS idx_shifts_roster ON shifts (roster_id);
+CREATE INDEX IF NOT EXISTS idx_members_month ON members (department, month_index, role, doctor);
+CREATE INDEX IF NOT EXISTS idx_members_roster ON members (roster_id);
+"""
+
+def month_index(year, month):
+    return year * 12 + month - 1
+
+def month_of(index):
+    return index // 12, index % 12 + 1
+
+# 同一個 HistoryStore 由所有 Streamlit session 的執行緒共用 (st.cache_resource)，連線只有一條，
+# 每個方法都在 lock 內執行，交易與查詢不會互相穿插
+class HistoryStore:
+    def __init__(self, path=DEFAULT_HISTORY_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:": self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        with self.lock: self.conn.close()
+
+    def publish(self, department, record):
+        # record：horizon.publish_record() 的輸出；同科別同月份重新公告時覆蓋
+        year, month = record["year"], record["month"]
+        index = month_index(year, month)
+        holidays = set(record.get("holidays", []))
+        holiday = {d: int(date(year, month, d).weekday() >= 5 or d in holidays) for d in record["dates"]}
+        role = {doc: r for r, key in ROLE_KEYS.items() for doc in record.get(key, [])}
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM rosters WHERE department = ? AND month_index = ?", (department, index))
+            roster_id = self.conn.execute("INSERT INTO rosters (department, month_index, published_at, record) VALUES (?, ?, ?, ?)",
+                                          (department, index, datetime.now().isoformat(timespec="seconds"), json.dumps(record, ensure_ascii=False))).lastrowid
+            rows = [(roster_id, department, index, d, doc, shift, role.get(doc, ""), holiday.get(d, 0)) for shift in ("big", "small") for doc, d in record[shift]]
+            self.conn.executemany("INSERT INTO shifts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany("INSERT INTO members VALUES (?, ?, ?, ?, ?)", [(roster_id, department, index, doc, r) for doc, r in role.items()])
+        return roster_id
+
+    def departments(self):
+        with self.lock: return [row[0] for row in self.conn.execute("SELECT DISTINCT department FROM rosters ORDER BY department")]
+
+    def months(self, department):
+        with self.lock: return [month_of(row[0]) for row in self.conn.execute("SELECT month_index FROM rosters WHERE department = ? ORDER BY month_index", (department,))]
+
+    def record(self, department, year, month):
+        with self.lock: row = self.conn.execute("SELECT record FROM rosters WHERE department = ? AND month_index = ?", (department, month_index(year, month))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def doctor_totals(self, department, start=None, end=None, shift=None, role=None):
+        # 期間內 (含起訖月份，(year, month)) 各醫師各班別的平日 / 假日班數與點數 (平日 1 點、假日 2 點)
+        sql = ["SELECT doctor, shift, role, SUM(1 - holiday), SUM(holiday), SUM(1 + holiday), COUNT(DISTINCT month_index) FROM shifts WHERE department = ?"]
+        args = [department]
+        if start: sql.append("AND month_index >= ?"); args.append(month_index(*start))
+        if end: sql.append("AND month_index <= ?"); args.append(month_index(*end))
+        if shift: sql.append("AND shift = ?"); args.append(shift)
+        if role: sql.append("AND role = ?"); args.append(role)
+        sql.append("GROUP BY doctor, shift, role ORDER BY shift, role, doctor")
+        keys = ["doctor", "shift", "role", "wd", "we", "pts", "months"]
+        with self.lock: return [dict(zip(keys, row)) for row in self.conn.execute(" ".join(sql), args)]
+
+    def balances(self, department, year, month, months=12):
+        # (year, month) 之前 months 個月的累計公平性餘額 {doc: {"wd", "we", "pts"}}：
+        # 每月各人班數與同組平均的差 (高於平均為正)，可直接作為 add_fairness_objective /
+        # add_point_system_constraint 的 balances 偏移
+        end = month_index(year, month) - 1
+        start = end - months + 1
+        balances = {}
+        for shift, roles in FAIRNESS_GROUPS.items():
+            marks = ", ".join("?" * len(roles))
+            with self.lock: rows = self.conn.execute(f"""
+                WITH counts AS (
+                    SELECT m.month_index, m.doctor,
+                           COUNT(s.doctor) - COALESCE(SUM(s.holiday), 0) AS wd, COALESCE(SUM(s.holiday), 0) AS we
+                    FROM members m
+                    LEFT JOIN shifts s ON s.department = m.department AND s.month_index = m.month_index AND s.shift = ? AND s.doctor = m.doctor
+                    WHERE m.department = ? AND m.month_index BETWEEN ? AND ? AND m.role IN ({marks})
+                    GROUP BY m.month_index, m.doctor
+                ), means AS (
+                    SELECT month_index, AVG(wd) AS avg_wd, AVG(we) AS avg_we FROM counts GROUP BY month_index
+                )
+                SELECT doctor, SUM(wd - avg_wd), SUM(we - avg_we) FROM counts JOIN means USING (month_index) GROUP BY doctor
+            """, (shift, department, start, end, *roles)).fetchall()
+            for doc, wd, we in rows:
+                b = balances.setdefault(doc, {"wd": 0.0, "we": 0.0, "pts": 0.0})
+                b["wd"] = round(b["wd"] + wd, 2)
+                b["we"] = round(b["we"] + we, 2)
+                b["pts"] = round(b["pts"] + wd + 2 * we, 2)
+        return balances
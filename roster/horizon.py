@@ -0,0 +1,98 @@
+import time
+
+from .config import PREF_STAFF, build_problem
+from .pipeline import cached_big_shift, cached_small_shift
+from .solver import day_masks, is_solved, r_schedule_from_pattern
+
+# ==========================================
+# 跨月接續 / 滾動式多月排班
+# ==========================================
+# 已公告班表 (record)：{"year", "month", "dates", "holidays", "*_staff", "big", "small", "balances"}
+# 本月的第 d 天 (d <= 0) = 上月的第 len(上月) + d 天；只有上月最後 BOUNDARY_DAYS 天會影響本月
+# (不連值、Q2 間隔、R 大班前後 2 天、跨月第一週的單週上限)
+BOUNDARY_DAYS = 7
+STAFF_KEYS = ["vs_staff", "r_staff", "pgy_staff", "int_staff"]
+
+def month_index(year, month):
+    return year * 12 + month - 1
+
+def next_month(year, month):
+    return (year + month // 12, month % 12 + 1)
+
+def boundary_from_record(record):
+    n = len(record["dates"])
+    return {stage: [(doc, d - n) for doc, d in record[stage] if d > n - BOUNDARY_DAYS] for stage in ("big", "small")}
+
+def apply_carry_over(problem, record):
+    # 以上月已公告班表作為邊界狀態，並帶入累計的公平性 / 點數餘額
+    if month_index(record["year"], record["month"]) != month_index(problem["year"], problem["month"]) - 1:
+        raise ValueError(f"已公告班表為 {record['year']}/{record['month']}，不是 {problem['year']}/{problem['month']} 的上一個月")
+    return dict(problem, boundary=boundary_from_record(record), balances=record.get("balances", {}))
+
+def month_balances(pattern, staff, days, year, month, holidays, balances):
+    # 本月平日 / 假日 / 點數與同組平均的差，累加到 balances (高於平均為正)
+    if not staff: return
+    holiday = day_masks(year, month, days, holidays)["holiday"]
+    day_set = set(days)
+    counts = {doc: [0, 0] for doc in staff}
+    for doc, d in pattern:
+        if doc in counts and d in day_set: counts[doc][d in holiday] += 1
+    avg_wd = sum(c[0] for c in counts.values()) / len(staff)
+    avg_we = sum(c[1] for c in counts.values()) / len(staff)
+    for doc, (wd, we) in counts.items():
+        b = balances.setdefault(doc, {"wd": 0.0, "we": 0.0, "pts": 0.0})
+        b["wd"] = round(b["wd"] + wd - avg_wd, 2)
+        b["we"] = round(b["we"] + we - avg_we, 2)
+        b["pts"] = round(b["pts"] + wd + 2 * we - avg_wd - 2 * avg_we, 2)
+
+def publish_record(problem, big, small):
+    # 本月公告後的紀錄，可作為下個月的 apply_carry_over 輸入 (JSON 可序列化)
+    p = problem
+    balances = {doc: dict(b) for doc, b in p.get("balances", {}).items()}
+    month_balances(big["pattern"], p["r_staff"], p["dates"], p["year"], p["month"], p["holidays"], balances)
+    month_balances(small["pattern"], p["pgy_staff"] + p["int_staff"], p["dates"], p["year"], p["month"], p["holidays"], balances)
+    record = {k: p[k] for k in ["year", "month", "dates", "holidays"] + STAFF_KEYS}
+    record.update(big=[list(x) for x in big["pattern"]], small=[list(x) for x in small["pattern"]], balances=balances)
+    return record
+
+def month_problems(config, months):
+    # 以同一份設定連續排 months 個月：名單沿用；第 2 個月起的請假 / 意願 / No-Go / 國定假日取自 config["next_months"]，
+    # 沒有設定的月份標記 prefs_missing (求解不會避開任何請假，結果只能參考，見 missing_prefs)
+    problems = [build_problem(config)]
+    year, month = problems[0]["year"], problems[0]["month"]
+    later = config.get("next_months") or []
+    for i in range(1, months):
+        year, month = next_month(year, month)
+        prefs = later[i - 1] if i - 1 < len(later) else None
+        problem = build_problem(dict(config, year=year, month=month, holidays=(prefs or {}).get("holidays", []), **{k: (prefs or {}).get(k, {}) for k in PREF_STAFF}))
+        if prefs is None: problem["prefs_missing"] = True
+        problems.append(problem)
+    return problems
+
+def missing_prefs(problems):
+    # 沒有請假 / 意願 / 假日設定的月份 [(year, month)]
+    return [(p["year"], p["month"]) for p in problems if p.get("prefs_missing")]
+
+# 滾動式排班：逐月求解，本月結果即為下個月的邊界狀態與累計餘額。
+# 每月的上限 (點數、平日 / 假日班數) 與公平性平均都以「月」為單位，所以不把整季放進同一個模型；
+# 各月模型大小固定，90 天就是 3 個約 30 天的模型。
+# on_solution(stage, i, info)：同 pipeline.solve_plans，i 為第幾個月
+def solve_rolling(problems, record=None, options=None, cache=None, on_progress=None, on_solution=None, trace=None):
+    results = []
+    for i, problem in enumerate(problems):
+        if on_progress: on_progress(i, len(problems))
+        t0 = time.perf_counter()
+        if record is not None: problem = apply_carry_over(problem, record)
+        timing = {}
+        big = cached_big_shift(cache, problem, stats=timing, options=options, on_solution=on_solution and (lambda info: on_solution("big", i, info)))
+        small = cached_small_shift(cache, problem, r_schedule_from_pattern(big["pattern"], problem["r_staff"]), stats=timing, options=options,
+                                   on_solution=on_solution and (lambda info: on_solution("small", i, info))) if is_solved(big) else None
+        if trace is not None:
+            label = f"{problem['year']}/{problem['month']}"
+            trace.add_solve("big", label, big)
+            if small is not None: trace.add_solve("small", label, small)
+        result = {"problem": problem, "big": big, "small": small, "time": time.perf_counter() - t0, "timing": timing}
+        results.append(result)
+        if small is None or not is_solved(small): break
+        record = result["record"] = publish_record(problem, big, small)
+    return results
@@ -0,0 +1,173 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+
+from .cache import SolveCache
+from .diagnostics import Trace
+from .feasibility import diagnose
+from .horizon import solve_rolling
+from .pipeline import solve_plans
+from .solver import is_solved
+
+# ==========================================
+# 背景排班工作：獨立行程執行求解，提供工作 ID、狀態查詢、進度、取消與時間上限
+# ==========================================
+# spec：{"kind": "plans" | "rolling", "options", "cache_dir", "trace",
+#        plans: "problem", "num_solutions", "pool", "min_distance"；rolling: "problems", "record"}
+# 子行程以 report(kind, value) 回報："progress" (進度文字)、"solution" (更好的解)；
+# accept：multiprocessing.Event，設定後目前的求解立即採用目前解，之後各階段採用第一個找到的解
+def run_solve_job(spec, report, accept=None):
+    trace = spec.get("trace") or Trace()
+    cache = SolveCache(spec["cache_dir"]) if spec.get("cache_dir") else None
+    options = spec.get("options")
+    output = {"kind": spec["kind"], "diagnosis": None}
+    def on_solution(key, stage, i, info):
+        report("solution", dict(info, stage=stage, **{key: i}))
+        return accept is not None and accept.is_set()
+    if spec["kind"] == "rolling":
+        with trace.span("solve_rolling"):
+            months = solve_rolling(spec["problems"], spec.get("record"), options=options, cache=cache,
+                                   on_progress=lambda i, n: report("progress", f"運算中... ({i+1}/{n} 個月)"),
+                                   on_solution=lambda stage, i, info: on_solution("month", stage, i, info), trace=trace)
+        output["months"] = months
+        failed = months[-1]
+        if "record" not in failed:
+            with trace.span("diagnose"): output["diagnosis"] = diagnose(failed["problem"], failed["big"] if is_solved(failed["big"]) else None)
+    else:
+        problem = spec["problem"]
+        with trace.span("solve_plans"):
+            big_solutions, small_solutions, timing = solve_plans(
+                problem, spec.get("num_solutions", 1),
+                on_progress=lambda i, n: report("progress", f"運算中... ({i+1}/{n})"),
+                pool=spec.get("pool", False), min_distance=spec.get("min_distance", 3), cache=cache, options=options,
+                on_solution=lambda stage, i, info: on_solution("plan", stage, i, info), trace=trace)
+        # 建模 / 搜尋時間在求解內部量測 (快取命中不計)
+        for name in ("build", "search"):
+            if timing.get(name): trace.add_span(f"solve_plans.{name}", timing[name])
+        output.update(big=big_solutions, small=small_solutions, timing=timing)
+        if not big_solutions or not small_solutions:
+            with trace.span("diagnose"): output["diagnosis"] = diagnose(problem, big_solutions[0] if big_solutions else None)
+    output["trace"] = trace
+    return output
+
+def _job_main(spec, messages, accept):
+    try:
+        messages.put(("done", run_solve_job(spec, lambda kind, value: messages.put((kind, value)), accept)))
+    except BaseException:
+        messages.put(("error", traceback.format_exc()))
+
+def _context():
+    # forkserver：由乾淨的伺服器行程 fork (不繼承 Streamlit 的執行緒)，並預先載入求解模組，啟動快
+    try:
+        ctx = mp.get_context("forkserver")
+    except ValueError:
+        return mp.get_context("spawn")
+    ctx.set_forkserver_preload(["roster.jobs"])
+    return ctx
+
+ACTIVE_STATES = ("queued", "running")
+
+class JobQueue:
+    # max_workers：同時執行的求解行程數 (其餘排隊)；abandon_after：超過此秒數沒人查詢狀態
+    # (例如分頁已關閉) 即取消；keep_for：結束的工作保留多久供取回結果
+    def __init__(self, max_workers=2, abandon_after=30.0, keep_for=600.0, poll_interval=0.2):
+        self.max_workers = max_workers
+        self.abandon_after = abandon_after
+        self.keep_for = keep_for
+        self.poll_interval = poll_interval
+        self.ctx = _context()
+        self.jobs = {}
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.monitor = threading.Thread(target=self._monitor, name="roster-jobs", daemon=True)
+        self.monitor.start()
+
+    def submit(self, spec, timeout=None):
+        # timeout：整個工作的時間上限 (秒)，超過即終止行程
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self.lock:
+            self.jobs[job_id] = {"id": job_id, "state": "queued", "spec": spec, "timeout": timeout, "submitted": now, "seen": now,
+                                 "started": None, "finished": None, "progress": "排隊中...", "live": None, "result": None, "error": None,
+                                 "accept": self.ctx.Event(), "accepted": False}
+            self.pending.append(job_id)
+            self._start_pending()
+        return job_id
+
+    def status(self, job_id):
+        # 查詢同時視為「仍有人在等」；回傳不含 spec 的狀態副本，找不到回傳 None
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None: return None
+            job["seen"] = time.time()
+            status = {k: v for k, v in job.items() if k not in ("spec", "process", "messages", "accept")}
+            status["position"] = list(self.pending).index(job_id) if job_id in self.pending else None
+            status["elapsed"] = (job["finished"] or time.time()) - (job["started"] or job["submitted"])
+            return status
+
+    def cancel(self, job_id, state="cancelled"):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] not in ACTIVE_STATES: return False
+            self._finish(job, state)
+            self._start_pending()
+        return True
+
+    def accept(self, job_id):
+        # 「採用目前解」：求解行程看到旗標後停止搜尋並以目前解完成其餘步驟 (結果不寫入快取)
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["state"] not in ACTIVE_STATES: return False
+            job["accept"].set(); job["accepted"] = True
+        return True
+
+    def running(self):
+        with self.lock:
+            return sum(job["state"] == "running" for job in self.jobs.values())
+
+    def _start_pending(self):
+        while self.pending and sum(job["state"] == "running" for job in self.jobs.values()) < self.max_workers:
+            job = self.jobs[self.pending.popleft()]
+            job["messages"] = self.ctx.Queue()
+            job["process"] = self.ctx.Process(target=_job_main, args=(job.pop("spec"), job["messages"], job["accept"]), daemon=True)
+            job["process"].start()
+            job["state"], job["started"], job["progress"] = "running", time.time(), "運算中..."
+
+    def _finish(self, job, state, error=None):
+        if job["id"] in self.pending: self.pending.remove(job["id"])
+        process = job.get("process")
+        if process is not None and process.is_alive():
+            process.terminate(); process.join(1)
+            if process.is_alive(): process.kill(); process.join(1)
+        job["state"], job["finished"], job["error"] = state, time.time(), error
+        job.pop("spec", None); job.pop("process", None); job.pop("messages", None); job.pop("accept", None)
+
+    def _drain(self, job):
+        while True:
+            try: kind, value = job["messages"].get_nowait()
+            except queue.Empty: return
+            if kind == "progress": job["progress"] = value
+            elif kind == "solution": job["live"] = value
+            elif kind == "done": job["result"] = value; self._finish(job, "done"); return
+            elif kind == "error": self._finish(job, "failed", value); return
+
+    def _check(self, now):
+        for job in list(self.jobs.values()):
+            if job["state"] == "running":
+                alive = job["process"].is_alive()
+                self._drain(job)
+                if job["state"] != "running": continue
+                if not alive: self._finish(job, "failed", f"求解行程異常結束 (exit code {job['process'].exitcode})")
+                elif job["timeout"] and now - job["started"] > job["timeout"]: self._finish(job, "timeout")
+            if job["state"] in ACTIVE_STATES and now - job["seen"] > self.abandon_after: self._finish(job, "cancelled")
+            elif job["state"] not in ACTIVE_STATES and now - job["finished"] > self.keep_for: del self.jobs[job["id"]]
+        self._start_pending()
+
+    def _monitor(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock: self._check(time.time())
@@ -0,0 +1,102 @@
+import base64
+import calendar
+import json
+import struct
+import zlib
+from datetime import date, timedelta
+
+# ==========================================
+# 魔術連結 payload 與 ICS：只用標準函式庫 (醫師端開啟連結時載入很輕)
+# ==========================================
+def generate_ics_content(schedule_data, year, month):
+    start = date(year, month, 1)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//CTH//Roster//TW", "CALSCALE:GREGORIAN"]
+    for item in schedule_data:
+        day = item['d']
+        shift_type = item['t']
+        start_date = start + timedelta(days=day - 1)
+        end_date = start_date + timedelta(days=1)
+        lines += ["BEGIN:VEVENT", f"SUMMARY:值班: {shift_type}", f"DTSTART;VALUE=DATE:{start_date:%Y%m%d}", f"DTEND;VALUE=DATE:{end_date:%Y%m%d}", f"DESCRIPTION:耕莘醫院 {shift_type}值班", "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "\n".join(lines)
+
+# ==========================================
+# 版本化的精簡二進位 payload
+# ==========================================
+# v2 版面 (big-endian)：
+#   [版本 1B][年 2B][月 1B][姓名長度 1B][姓名 UTF-8]
+#   [班別數 1B] 每個班別：[代碼 1B (0xFF = 自訂，後接 長度 1B + 名稱)][遮罩長度 1B][日期 bitmask，第 d 天 = bit d-1]
+# 版本 byte 最高位元為 1 表示其後內容經 raw deflate 壓縮 (只在變短時使用)。
+# 編碼為 URL-safe base64 且去掉 '='；舊版 (v1) 為標準 base64 的 JSON，開頭固定為 "ey" ('{"')
+LINK_VERSION = 2
+COMPRESSED = 0x80
+SHIFT_TYPES = ["大班", "小班"]
+CUSTOM_TYPE = 0xFF
+
+def _short_str(text):
+    raw = text.encode("utf-8")[:255]
+    return bytes([len(raw)]) + raw
+
+def encode_payload(doctor_name, year, month, shift_data):
+    # shift_data: [{'d': day, 't': 班別}]，與 v1 相同的輸入
+    days_by_type = {}
+    for item in shift_data: days_by_type.setdefault(item['t'], []).append(item['d'])
+    body = bytearray(struct.pack(">HB", year, month) + _short_str(doctor_name) + bytes([len(days_by_type)]))
+    for shift_type, days in days_by_type.items():
+        if shift_type in SHIFT_TYPES: body.append(SHIFT_TYPES.index(shift_type))
+        else: body += bytes([CUSTOM_TYPE]) + _short_str(shift_type)
+        mask = sum(1 << (d - 1) for d in set(days))
+        mask_bytes = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+        body += bytes([len(mask_bytes)]) + mask_bytes
+    version = LINK_VERSION
+    packed = zlib.compress(bytes(body), 9, wbits=-15)
+    if len(packed) < len(body): version |= COMPRESSED; body = packed
+    return base64.urlsafe_b64encode(bytes([version]) + bytes(body)).decode("ascii").rstrip("=")
+
+def _take(raw, pos, n):
+    # 長度不足 = 連結被截斷或竄改 (切片本身不會報錯，會悄悄少讀)
+    if pos + n > len(raw): raise ValueError("truncated link payload")
+    return raw[pos:pos + n], pos + n
+
+def _read_short_str(raw, pos):
+    (n,), pos = _take(raw, pos, 1)
+    text, pos = _take(raw, pos, n)
+    return text.decode("utf-8"), pos
+
+def _decode_v2(raw):
+    header, pos = _take(raw, 0, 3)
+    year, month = struct.unpack(">HB", header)
+    if not 1 <= month <= 12: raise ValueError(f"invalid month {month}")
+    days_in_month = calendar.monthrange(year, month)[1]
+    name, pos = _read_short_str(raw, pos)
+    (n_types,), pos = _take(raw, pos, 1)
+    shifts = []
+    for _ in range(n_types):
+        (code,), pos = _take(raw, pos, 1)
+        if code == CUSTOM_TYPE: shift_type, pos = _read_short_str(raw, pos)
+        elif code < len(SHIFT_TYPES): shift_type = SHIFT_TYPES[code]
+        else: raise ValueError(f"unknown shift type {code}")
+        (n,), pos = _take(raw, pos, 1)
+        mask_bytes, pos = _take(raw, pos, n)
+        mask = int.from_bytes(mask_bytes, "little")
+        if mask.bit_length() > days_in_month: raise ValueError(f"day {mask.bit_length()} out of range")
+        shifts += [{'d': i + 1, 't': shift_type} for i in range(mask.bit_length()) if mask >> i & 1]
+    if pos != len(raw): raise ValueError("trailing bytes in link payload")
+    shifts.sort(key=lambda x: x['d'])
+    return name, year, month, shifts
+
+def decode_payload(payload):
+    # 回傳 (姓名, 年, 月, [{'d', 't'}])；格式錯誤、截斷或竄改時拋出 ValueError
+    try:
+        if payload.startswith("ey"):
+            # v1：查詢字串中的 '+' 可能被還原成空白
+            data = json.loads(base64.b64decode(payload.replace(" ", "+")).decode("utf-8"))
+            return data['n'], data['y'], data['m'], sorted(data['s'], key=lambda x: x['d'])
+        raw = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        if not raw: raise ValueError("empty link payload")
+        version, body = raw[0], raw[1:]
+        if version & COMPRESSED: body = zlib.decompress(body, wbits=-15)
+        if version & ~COMPRESSED != LINK_VERSION: raise ValueError(f"unknown link version {version}")
+        return _decode_v2(body)
+    except (KeyError, TypeError, zlib.error) as e:
+        raise ValueError(f"invalid link payload: {e}") from e
@@ -0,0 +1,44 @@
+import numpy as np
+
+from .solver import day_masks
+
+# ==========================================
+# 班表矩陣：醫師 x 日期 的 bool 陣列 + 預先計算的假日 / 週末遮罩
+# 統計、日曆、CSV、魔術連結都由同一份矩陣以向量運算產生
+# ==========================================
+# name：班別名稱 ("大班" / "小班")，用於表格與魔術連結
+def roster_matrix(pattern, staff, days, year, month, custom_holidays, name=""):
+    masks = day_masks(year, month, days, custom_holidays)
+    staff, days = list(staff), list(days)
+    row = {doc: i for i, doc in enumerate(staff)}
+    col = {d: j for j, d in enumerate(days)}
+    grid = np.zeros((len(staff), len(days)), dtype=bool)
+    cells = [(row[doc], col[d]) for doc, d in pattern if doc in row and d in col]
+    if cells: grid[tuple(np.array(cells).T)] = True
+    dates = [masks["dates"][d] for d in days]
+    return {
+        "name": name, "year": year, "month": month, "staff": staff, "days": np.array(days), "grid": grid,
+        "holiday": np.array([d in masks["holiday"] for d in days], dtype=bool),
+        "weekend": np.array([x.weekday() >= 5 for x in dates], dtype=bool),
+        "custom": np.array([d in custom_holidays for d in days], dtype=bool),
+        "label": [masks["label"][d] for d in days],
+        "weekday": [x.strftime("%a") for x in dates],
+    }
+
+def assignees(m):
+    # 每天的值班醫師 (沒人值班為 "")
+    names = np.array(m["staff"] + [""], dtype=object)
+    who = np.where(m["grid"].any(axis=0), m["grid"].argmax(axis=0), -1)
+    return names[who]
+
+def day_map(m):
+    return {int(d): doc for d, doc in zip(m["days"], assignees(m)) if doc}
+
+def doctor_days(m, doc):
+    if doc not in m["staff"]: return []
+    return [int(d) for d in m["days"][m["grid"][m["staff"].index(doc)]]]
+
+def shift_counts(m):
+    # (平日班數, 假日班數)，每位醫師一個值
+    holiday = m["grid"][:, m["holiday"]].sum(axis=1)
+    return m["grid"].sum(axis=1) - holiday, holiday
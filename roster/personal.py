@@ -0,0 +1,35 @@
+import streamlit as st
+
+from .links import decode_payload, generate_ics_content
+
+# ==========================================
+# 醫師個人班表 (魔術連結)：流量最大的路徑，只載入解碼、表格與 ICS 所需的模組
+# 不可在此匯入 ortools / pandas / numpy 或 roster.solver、roster.views
+# ==========================================
+def render_doctor_view(payload):
+    try:
+        doc_name, year, month, shifts = decode_payload(payload) # shifts: list of {'d': day, 't': type}
+
+        st.title(f"👋 您好，{doc_name}")
+        st.info(f"這是您 {year} 年 {month} 月的專屬值班表")
+
+        if shifts:
+            # st.table 會載入 pandas / pyarrow，這裡直接輸出 Markdown 表格
+            rows = [f"| {month}/{x['d']} | {x['t']} |" for x in shifts]
+            st.markdown("\n".join(["| 日期 | 班別 |", "| --- | --- |"] + rows))
+
+            ics_content = generate_ics_content(shifts, year, month)
+            st.download_button(
+                label="📅 加入手機行事曆 (下載 .ics)",
+                data=ics_content,
+                file_name=f"{doc_name}_{year}_{month}_roster.ics",
+                mime="text/calendar",
+                type="primary",
+                use_container_width=True
+            )
+            st.success("💡 說明：下載後請直接開啟檔案，即可將班表匯入手機行事曆。")
+        else:
+            st.success("🎉 這個月沒有值班！")
+
+    except Exception as e:
+        st.error("連結無效或已過期。")
@@ -0,0 +1,99 @@
+import time
+
+from .cache import cached
+from .config import big_shift_args, small_shift_args
+from .solver import solve_big_shift, solve_small_shift, summarize, is_solved, r_schedule_from_pattern
+
+# ==========================================
+# 大班 -> 小班 雙軌序列求解 (多方案)
+# ==========================================
+# options: 求解參數 {"num_workers", "time_limit" (秒), "relative_gap", "lexicographic", "tier_limits", "symmetry_breaking"}；
+# 時間上限與可接受差距會影響結果品質，因此一併納入快取 key
+def quality_options(options):
+    options = options or {}
+    quality = {k: options.get(k) for k in ("time_limit", "relative_gap")}
+    # 分層最佳化的最佳解與加權總和不同；對稱性破除在逾時 / 可接受差距下可能得到不同的班表 (未開啟時不加入，既有快取仍可用)
+    if options.get("lexicographic"): quality.update(lexicographic=True, tier_limits=options.get("tier_limits"))
+    if options.get("symmetry_breaking"): quality["symmetry_breaking"] = True
+    return quality
+
+def solve_result(solver, status, sacrifices, pattern, timings, accepted=False):
+    result = dict(summarize(solver, status, sacrifices, pattern), build_time=timings["build"], search_time=timings["search"])
+    if "stages" in timings: result["stages"] = timings["stages"]
+    if accepted: result["accepted"] = True
+    return result
+
+# on_solution(info) 回傳 True = 使用者提前採用目前解；回傳 (包裝後的 on_solution, 是否已採用的紀錄)，
+# 提前採用的結果標記 accepted，不寫入快取
+def watch_accept(on_solution):
+    accepted = []
+    def stream(info):
+        if not on_solution(info): return False
+        accepted.append(True)
+        return True
+    return (stream if on_solution else None), accepted
+
+def add_phase_times(stats, result):
+    # 建模與搜尋時間分開累計 (快取命中的結果不計)
+    if stats is None or result.get("cached"): return
+    stats["build"] = stats.get("build", 0.0) + result.get("build_time", 0.0)
+    stats["search"] = stats.get("search", 0.0) + result.get("search_time", 0.0)
+
+def cached_big_shift(cache, problem, forbidden_patterns=None, min_distance=3, stats=None, options=None, on_solution=None):
+    inputs = dict(big_shift_args(problem), forbidden_patterns=forbidden_patterns or [], min_distance=min_distance)
+    def compute():
+        timings = {}
+        stream, accepted = watch_accept(on_solution)
+        b_sol, b_stat, _, b_sac, b_pat, _ = solve_big_shift(**inputs, **(options or {}), on_solution=stream, timings=timings)
+        return solve_result(b_sol, b_stat, b_sac, b_pat, timings, bool(accepted))
+    result = cached(cache, "big", dict(inputs, **quality_options(options)), compute, stats)
+    add_phase_times(stats, result)
+    return result
+
+def cached_small_shift(cache, problem, r_schedule_map, forbidden_patterns=None, min_distance=3, stats=None, options=None, on_solution=None):
+    inputs = dict(small_shift_args(problem, r_schedule_map), forbidden_patterns=forbidden_patterns or [], min_distance=min_distance)
+    def compute():
+        timings = {}
+        stream, accepted = watch_accept(on_solution)
+        s_sol, s_stat, _, s_sac, s_pat = solve_small_shift(**inputs, **(options or {}), on_solution=stream, timings=timings)
+        return solve_result(s_sol, s_stat, s_sac, s_pat, timings, bool(accepted))
+    result = cached(cache, "small", dict(inputs, **quality_options(options)), compute, stats)
+    add_phase_times(stats, result)
+    return result
+
+# on_solution(stage, i, info)：逐步回報每個階段找到的更好解；回傳 True 則提前採用目前解
+# trace：diagnostics.Trace，記錄每次求解的 CP-SAT 統計
+def solve_plans(problem, num_solutions=1, on_progress=None, pool=False, min_distance=3, cache=None, options=None, on_solution=None, trace=None):
+    if pool:
+        from .pool import solve_plan_pool
+        return solve_plan_pool(problem, num_solutions, min_distance=min_distance, on_progress=on_progress, cache=cache, options=options, on_solution=on_solution, trace=trace)
+
+    big_solutions = []
+    small_solutions = []
+    forbidden_big = []
+    forbidden_small = []
+    timing = {"big": 0.0, "small": 0.0}
+
+    for i in range(num_solutions):
+        if on_progress: on_progress(i, num_solutions)
+
+        t0 = time.perf_counter()
+        big = cached_big_shift(cache, problem, forbidden_big, min_distance, timing, options,
+                               on_solution and (lambda info: on_solution("big", i, info)))
+        t1 = time.perf_counter()
+        r_schedule_map = r_schedule_from_pattern(big["pattern"], problem["r_staff"])
+        small = cached_small_shift(cache, problem, r_schedule_map, forbidden_small, min_distance, timing, options,
+                                   on_solution and (lambda info: on_solution("small", i, info)))
+        t2 = time.perf_counter()
+        timing["big"] += t1 - t0; timing["small"] += t2 - t1
+        if trace is not None: trace.add_solve("big", i + 1, big); trace.add_solve("small", i + 1, small)
+
+        if is_solved(big):
+            big_solutions.append(big)
+            forbidden_big.append(big["pattern"])
+
+        if is_solved(small):
+            small_solutions.append(small)
+            forbidden_small.append(small["pattern"])
+
+    return big_solutions, small_solutions, timing
@@ -0,0 +1,166 @@
+from ortools.sat.python import cp_model
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+from .cache import cached
+from .config import big_shift_args
+from .pipeline import cached_big_shift, cached_small_shift, quality_options
+from .solver import build_big_model, new_solver, r_schedule_from_pattern, get_report, is_solved, solver_params
+
+# ==========================================
+# 方案池：平行 seed 搜尋 + 最小差異天數去重
+# ==========================================
+# 所有 seed 同時以真實目標求解 (seed > 0 隨機化搜尋順序)，收集每個 worker 途中找到的解；
+# 與最佳解相差不超過 POOL_TOLERANCE 的解都可入選 (約 2 次 Q2 間隔或 10 次想值班，不會犧牲公平性 / 點數 / No-Go)
+POOL_TOLERANCE = 100
+# 方案池的大班只支援加權目標；options 的 lexicographic 只作用在各方案的小班 (退回逐一求解時也一樣)
+BIG_ONLY_OPTIONS = ("lexicographic", "tier_limits")
+
+class SolutionSnapshot:
+    # 與 CpSolver 相容的 Value()，只保留班表與犧牲變數的值 (不必留住整個 solver)
+    def __init__(self, values, objective):
+        self.values = values
+        self.objective = objective
+
+    def Value(self, var):
+        return self.values[var.Index()]
+
+    def ObjectiveValue(self):
+        return self.objective
+
+# on_solution(info)：同 solver.SolutionStream；回傳 True 則停止搜尋
+class _PoolCollector(cp_model.CpSolverSolutionCallback):
+    def __init__(self, shifts, watch_vars, true_objective, sacrifices=None, on_solution=None):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.shifts = shifts
+        self.watch_vars = watch_vars
+        self.true_objective = true_objective
+        self.sacrifices = sacrifices
+        self.on_solution = on_solution
+        self.solutions = []
+        self.error = None
+
+    def on_solution_callback(self):
+        pattern = frozenset(k for k, v in self.shifts.items() if self.BooleanValue(v))
+        values = {v.Index(): self.Value(v) for v in self.watch_vars}
+        objective = self.Value(self.true_objective)
+        self.solutions.append((objective, pattern, values))
+        if self.on_solution is None or self.error is not None: return
+        try:
+            info = {"objective": objective, "bound": self.BestObjectiveBound(), "wall_time": self.WallTime(), "report": get_report(self, self.sacrifices)}
+            if self.on_solution(info): self.StopSearch()
+        except BaseException as e:
+            # 例外不可拋進 C++ 搜尋，先停止搜尋，Solve 結束後再拋出
+            self.error = e
+            self.StopSearch()
+
+def hamming_distance(pattern_a, pattern_b):
+    # 每天恰好一人值班，差集大小 = 值班人不同的天數
+    return len(set(pattern_a) - set(pattern_b))
+
+# 回傳的 bound 為真實目標的上界 (求解失敗時為 None)
+def _big_pool_worker(problem, seed, options, on_solution=None):
+    model, shifts, obj_terms, sacrifices = build_big_model(**big_shift_args(problem))
+    watch_vars = list(shifts.values()) + list({var.Index(): var for var, _ in sacrifices}.values())
+    collector = _PoolCollector(shifts, watch_vars, sum(obj_terms), sacrifices, on_solution)
+    solver = new_solver(seed, **solver_params(options))
+    # seed 0 求到最佳 (方案 1 與逐一求解相同)，其餘 worker 只需達到容許差距
+    if seed: solver.parameters.absolute_gap_limit = POOL_TOLERANCE; solver.parameters.randomize_search = True
+    status = solver.Solve(model, collector)
+    if collector.error is not None: raise collector.error
+    stats = {"wall_time": solver.WallTime(), "conflicts": solver.NumConflicts(), "branches": solver.NumBranches()}
+    bound = solver.BestObjectiveBound() if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else None
+    return shifts, sacrifices, collector.solutions, stats, bound
+
+def select_diverse(candidates, num_solutions, min_distance):
+    # 依真實目標值由高到低挑選，與已選方案至少相差 min_distance 天
+    chosen = []
+    for objective, pattern, values in sorted(candidates, key=lambda c: -c[0]):
+        if all(hamming_distance(pattern, c[1]) >= min_distance for c in chosen):
+            chosen.append((objective, pattern, values))
+            if len(chosen) == num_solutions: break
+    return chosen
+
+def worker_options(options, n_threads):
+    # 平行執行 n_threads 個求解時，平分 CPU 核心數
+    options = dict(options or {})
+    if not options.get("num_workers"): options["num_workers"] = max(1, (os.cpu_count() or 1) // max(1, n_threads))
+    return options
+
+# on_solution(i, info)：逐步回報方案 i 的大班 (seed i 的 worker) 找到的解；回傳 True 則提前採用目前解
+# (其餘 worker 在下一個解也會停止，補齊的求解採用第一個找到的解)
+def solve_big_pool(problem, num_solutions, min_distance=3, options=None, on_solution=None):
+    accepted = []
+    def stream(i):
+        if on_solution is None: return None
+        def report(info):
+            if not on_solution(i, info): return False
+            accepted.append(i)
+            return True
+        return report
+    per_worker = worker_options(options, num_solutions)
+    with ThreadPoolExecutor(max_workers=num_solutions) as ex:
+        runs = list(ex.map(lambda seed: _big_pool_worker(problem, seed, per_worker, stream(seed)), range(num_solutions)))
+    sacrifices = runs[0][1]
+    # 各方案共用同一次搜尋，統計為所有 worker 的合計 (時間為最長的 worker)
+    stats = {"wall_time": max(r[3]["wall_time"] for r in runs), "conflicts": sum(r[3]["conflicts"] for r in runs), "branches": sum(r[3]["branches"] for r in runs)}
+    # 每個 worker 的上界都是真實目標的上界，取最緊的；達到上界的方案即為最佳解
+    bounds = [r[4] for r in runs if r[4] is not None]
+    bound = min(bounds) if bounds else None
+    # 各 worker 的模型變數 index 相同 (同樣的建構順序)，可直接共用 sacrifices
+    candidates = [c for r in runs for c in r[2]]
+    floor = max([c[0] for c in candidates] or [0]) - POOL_TOLERANCE
+    candidates = [c for c in candidates if c[0] >= floor]
+    chosen = select_diverse(candidates, num_solutions, min_distance)
+    plans = []
+    order = [(doc, d) for doc in problem["vs_staff"] + problem["r_staff"] for d in problem["dates"]]
+    for objective, pattern, values in chosen:
+        plans.append({
+            "status": int(cp_model.OPTIMAL if bound is not None and objective >= bound else cp_model.FEASIBLE), "objective": objective, "bound": bound,
+            "pattern": [k for k in order if k in pattern],
+            "report": get_report(SolutionSnapshot(values, objective), sacrifices), **stats,
+        })
+        # 提前採用的結果不寫入快取 (見 cache.cached)
+        if accepted: plans[-1]["accepted"] = True
+    # 平行搜尋找不到足夠的不同方案時，退回以 forbidden_patterns 逐一補齊
+    fallback = {k: v for k, v in (options or {}).items() if k not in BIG_ONLY_OPTIONS}
+    while len(plans) < num_solutions:
+        big = cached_big_shift(None, problem, [p["pattern"] for p in plans], min_distance, options=fallback, on_solution=stream(len(plans)))
+        if not is_solved(big): break
+        plans.append(big)
+    return plans
+
+# on_solution(stage, i, info)：同 pipeline.solve_plans
+def solve_plan_pool(problem, num_solutions, min_distance=3, options=None, on_progress=None, cache=None, on_solution=None, trace=None):
+    timing = {"big": 0.0, "small": 0.0}
+    if on_progress: on_progress(0, num_solutions)
+    t0 = time.perf_counter()
+    pool_inputs = dict(big_shift_args(problem), num_solutions=num_solutions, min_distance=min_distance, tolerance=POOL_TOLERANCE, **quality_options(options))
+    big_plans = cached(cache, "big_pool", pool_inputs, lambda: solve_big_pool(problem, num_solutions, min_distance, options, on_solution and (lambda i, info: on_solution("big", i, info))), timing)
+    t1 = time.perf_counter()
+    if on_progress: on_progress(num_solutions - 1, num_solutions)
+
+    per_worker = worker_options(options, len(big_plans))
+    def solve_small(i, big):
+        r_schedule_map = r_schedule_from_pattern(big["pattern"], problem["r_staff"])
+        return cached_small_shift(cache, problem, r_schedule_map, stats=timing, options=per_worker,
+                                  on_solution=on_solution and (lambda info: on_solution("small", i, info)))
+    with ThreadPoolExecutor(max_workers=max(1, len(big_plans))) as ex:
+        small_runs = list(ex.map(solve_small, range(len(big_plans)), big_plans))
+    t2 = time.perf_counter()
+    timing["big"] = t1 - t0; timing["small"] = t2 - t1
+
+    # 大班方案彼此已相差 min_distance 天，配對後的完整方案也必然不同；
+    # 小班排不出來的大班方案接在最後 (與小班不成對)，全部小班都不可行時，診斷才能以大班結果檢查小班
+    big_solutions = []
+    small_solutions = []
+    unpaired = []
+    for i, (big, small) in enumerate(zip(big_plans, small_runs)):
+        if trace is not None: trace.add_solve("big", i + 1, big); trace.add_solve("small", i + 1, small)
+        if is_solved(small):
+            big_solutions.append(big)
+            small_solutions.append(small)
+        else:
+            unpaired.append(big)
+    return big_solutions + unpaired, small_solutions, timing
@@ -0,0 +1,95 @@
+from ortools.sat.python import cp_model
+
+from .config import PREF_STAFF, big_shift_args, small_shift_args
+from .solver import build_big_model, build_small_model, run_solver, summarize, is_solved, r_schedule_from_pattern, extract_pattern, solver_params
+
+# ==========================================
+# 局部修補：以已公告班表為 hint，只重排受影響的日期 / 醫師
+# ==========================================
+# 偏離公告班表的代價：低於 No-Go (5000)，高於公平性與點數，
+# 因此修補時寧可少動班，也不會為了不動班而把人排進 No-Go
+W_DEVIATION = 3000
+BIG_KEYS = ["vs_leaves", "r_leaves", "vs_wishes", "vs_nogo", "r_nogo", "r_wishes"]
+SMALL_KEYS = ["pgy_leaves", "int_leaves", "pgy_nogo", "pgy_wishes", "int_nogo", "int_wishes", "r_nogo"]
+
+def changed_cells(old_problem, new_problem, keys):
+    # 回傳 (有變動的日期, 有變動的醫師)；名單或年月變動時回傳 None (需整月重排)
+    if (old_problem["year"], old_problem["month"]) != (new_problem["year"], new_problem["month"]): return None
+    for key in {PREF_STAFF[k].replace("_list", "_staff") for k in keys}:
+        if old_problem[key] != new_problem[key]: return None
+    days, doctors = set(), set()
+    for key in keys:
+        old, new = old_problem[key], new_problem[key]
+        for doc in set(old) | set(new):
+            diff = set(old.get(doc, [])) ^ set(new.get(doc, []))
+            if diff: days |= diff; doctors.add(doc)
+    days |= set(old_problem["holidays"]) ^ set(new_problem["holidays"])
+    return days, doctors
+
+def neighbourhood(days, all_days, radius):
+    return {d for d in all_days if any(abs(d - c) <= radius for c in days)}
+
+def repair_model(model, shifts, obj_terms, published, free_days, free_doctors):
+    # 範圍外固定為公告值；範圍內以公告值為 hint 並對每個變動扣分
+    published = set(published)
+    for (doc, d), var in shifts.items():
+        val = 1 if (doc, d) in published else 0
+        model.AddHint(var, val)
+        if d not in free_days or (free_doctors is not None and doc not in free_doctors and not val):
+            model.Add(var == val)
+        elif val:
+            obj_terms.append((1 - var) * -W_DEVIATION)
+        else:
+            obj_terms.append(var * -W_DEVIATION)
+    model.Maximize(sum(obj_terms))
+
+def _repair_stage(build, args, published, days, doctors, radius, options):
+    # 依序放寬範圍：(鄰近日期, 相關醫師) -> (鄰近日期, 全部醫師) -> 範圍加倍 ... -> 整月
+    all_days = args["days"]
+    involved = {doc for doc, d in published if d in neighbourhood(days, all_days, radius)} | doctors
+    attempts = [(radius, involved)]
+    r = radius
+    while True:
+        attempts.append((r, None))
+        if len(neighbourhood(days, all_days, r)) == len(all_days) or not days: break
+        r *= 2
+    for r, free_doctors in attempts:
+        free_days = neighbourhood(days, all_days, r) if days else set(all_days)
+        # 公告班表的固定值不對稱，不能再加對稱性破除 (可能排除掉唯一可行的修補)
+        model, shifts, obj_terms, sacrifices = build(**args, symmetry_breaking=False)
+        schedule = cp_model.LinearExpr.Sum(list(obj_terms))
+        repair_model(model, shifts, obj_terms, published, free_days, free_doctors)
+        solver, status = run_solver(model, sacrifices, 0, **solver_params(options))
+        pattern = extract_pattern(solver, shifts) if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else []
+        result = summarize(solver, status, sacrifices, pattern)
+        if is_solved(result):
+            # objective 為班表本身的目標值 (不含偏離扣分，可與整月重排比較)，異動班數見 changes；
+            # 含偏離扣分的修補目標與上界另存 repair_objective / repair_bound
+            result.update(repair_objective=result["objective"], repair_bound=result["bound"], objective=solver.Value(schedule), bound=None)
+            result["window"] = sorted(free_days)
+            result["changes"] = diff_patterns(published, pattern)
+            return result
+    return result
+
+def diff_patterns(old_pattern, new_pattern):
+    # [(day, 原值班醫師, 新值班醫師)]
+    old_map = {d: doc for doc, d in old_pattern}
+    new_map = {d: doc for doc, d in new_pattern}
+    return [(d, old_map.get(d), new_map.get(d)) for d in sorted(set(old_map) | set(new_map)) if old_map.get(d) != new_map.get(d)]
+
+def repair_plan(old_problem, new_problem, big, small, radius=2, options=None):
+    # big / small 為已公告的精簡結果 (pattern)；回傳修補後的 (big, small)
+    cells = changed_cells(old_problem, new_problem, BIG_KEYS)
+    days, doctors = cells if cells is not None else (set(new_problem["dates"]), set())
+    new_big = _repair_stage(build_big_model, big_shift_args(new_problem), big["pattern"], days, doctors, radius, options)
+    if not is_solved(new_big): return new_big, None
+
+    # 小班：小班偏好變動的日期，加上 R 大班異動日前後 (避開大班 ±2 天)
+    cells = changed_cells(old_problem, new_problem, SMALL_KEYS)
+    days, doctors = cells if cells is not None else (set(new_problem["dates"]), set())
+    for d, old_doc, new_doc in new_big["changes"]:
+        if old_doc in new_problem["r_staff"] or new_doc in new_problem["r_staff"]:
+            days |= neighbourhood({d}, new_problem["dates"], 3); doctors |= {old_doc, new_doc} & set(new_problem["r_staff"])
+    r_schedule_map = r_schedule_from_pattern(new_big["pattern"], new_problem["r_staff"])
+    new_small = _repair_stage(build_small_model, small_shift_args(new_problem, r_schedule_map), small["pattern"], days, doctors, radius, options)
+    return new_big, new_small
@@ -0,0 +1,491 @@
+from ortools.sat.python import cp_model
+from datetime import date, timedelta
+from functools import lru_cache
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 日期遮罩 (預先計算，建模時不再逐日建立 date 物件)
+# ==========================================
+# 第 d 天 = year/month/1 起算的第 d 天，可超過當月 (跨月排班)
+@lru_cache(maxsize=256)
+def _day_masks(year, month, days, custom_holidays):
+    start = date(year, month, 1)
+    dates = {d: start + timedelta(days=d - 1) for d in days}
+    holiday = frozenset(d for d in days if dates[d].weekday() >= 5 or d in custom_holidays)
+    weeks = {}
+    for d in days: weeks.setdefault(dates[d] - timedelta(days=dates[d].weekday()), []).append(d)
+    return {
+        "dates": dates,
+        "holiday": holiday,
+        "weekend_days": [d for d in days if d in holiday],
+        "weekday_days": [d for d in days if d not in holiday],
+        "weeks": [weeks[k] for k in sorted(weeks)],
+        "label": {d: f"{dates[d].month}/{dates[d].day}" for d in days},
+    }
+
+def day_masks(year, month, days, custom_holidays):
+    return _day_masks(year, month, tuple(days), frozenset(custom_holidays))
+
+@lru_cache(maxsize=64)
+def _weekend_days(year, month):
+    start = date(year, month, 1)
+    return frozenset(d for d in range(1, 367) if (start + timedelta(days=d - 1)).weekday() >= 5)
+
+def is_holiday(year, month, d, custom_holidays):
+    return (d in _weekend_days(year, month)) or (d in custom_holidays)
+
+def consecutive_pairs(days):
+    day_set = set(days)
+    return [(d, d + 1) for d in days if d + 1 in day_set]
+
+# ==========================================
+# CP-SAT 模型 (大班 / 小班)
+# ==========================================
+# balances：跨月累計的 {doc: {"wd", "we", "pts"}} (高於平均為正)，當作本月計數的起始偏移
+def balance_offset(balances, doc, key):
+    return int(round((balances or {}).get(doc, {}).get(key, 0)))
+
+def max_shifts(days):
+    # 不可連續值班：任何 n 天內最多 (n + 1) // 2 班 (變數上界)
+    return (len(days) + 1) // 2
+
+# fixed_off：已知必為 0 的 (doc, d)，用來收緊班數 / 偏差變數的上界
+def add_fairness_objective(model, shifts, staff_list, days, year, month, custom_holidays, obj_terms, weight=500, balances=None, fixed_off=frozenset()):
+    if not staff_list: return
+    masks = day_masks(year, month, days, custom_holidays)
+    weekend_days, weekday_days = masks["weekend_days"], masks["weekday_days"]
+    avg_wd = len(weekday_days) // len(staff_list)
+    avg_we = len(weekend_days) // len(staff_list)
+    cap = max_shifts(days)
+    for doc in staff_list:
+        off_wd, off_we = balance_offset(balances, doc, "wd"), balance_offset(balances, doc, "we")
+        ub_wd = min(cap, sum((doc, d) not in fixed_off for d in weekday_days))
+        wd_count = model.NewIntVar(0, ub_wd, f"wd_cnt_{doc}")
+        model.Add(wd_count == cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in weekday_days]))
+        dev_wd = model.NewIntVar(0, max(abs(off_wd - avg_wd), abs(ub_wd + off_wd - avg_wd)), f"dev_wd_{doc}")
+        model.Add(dev_wd >= wd_count + off_wd - avg_wd); model.Add(dev_wd >= avg_wd - wd_count - off_wd)
+        obj_terms.append(dev_wd * -weight)
+        ub_we = min(cap, sum((doc, d) not in fixed_off for d in weekend_days))
+        we_count = model.NewIntVar(0, ub_we, f"we_cnt_{doc}")
+        model.Add(we_count == cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in weekend_days]))
+        dev_we = model.NewIntVar(0, max(abs(off_we - avg_we), abs(ub_we + off_we - avg_we)), f"dev_we_{doc}")
+        model.Add(dev_we >= we_count + off_we - avg_we); model.Add(dev_we >= avg_we - we_count - off_we)
+        obj_terms.append(dev_we * -weight)
+
+def add_point_system_constraint(model, shifts, staff_list, days, year, month, custom_holidays, obj_terms, sacrifices, limit=8, weight=1000, balances=None, fixed_off=frozenset()):
+    masks = day_masks(year, month, days, custom_holidays)
+    holiday = masks["holiday"]
+    coeffs = [2 if d in holiday else 1 for d in days]
+    cap = 2 * max_shifts(days)
+    for doc in staff_list:
+        off = balance_offset(balances, doc, "pts")
+        max_points = min(cap, sum(c for d, c in zip(days, coeffs) if (doc, d) not in fixed_off))
+        total_points = model.NewIntVar(0, max_points, f"pts_{doc}")
+        model.Add(total_points == cp_model.LinearExpr.WeightedSum([shifts[(doc, d)] for d in days], coeffs))
+        slack = model.NewIntVar(0, max(0, max_points + off - limit), f"slack_pts_{doc}")
+        model.Add(total_points + off <= limit + slack)
+        obj_terms.append(slack * -weight)
+        sacrifices.append((slack, f"{doc} 點數超標 (>{limit}點)"))
+
+# fixed_off：已知必為 0 的 (doc, d) (請假、大班前後)，這些日子不需要建立違規變數
+# boundary：上月已公告的 (doc, d)，d <= 0；上月最後兩天的班與本月前兩天同樣計入 Q2 間隔
+# 需搭配「每天恰好一人」：第 d 天只有一人值班，所以每天最多一件 Q2 違規，一天一個違規變數即可 (不必每人每天一個)
+def add_spacing_preference(model, shifts, staff_list, days, obj_terms, weight=100, fixed_off=frozenset(), boundary=()):
+    day_set = set(days)
+    staff_set = set(staff_list)
+    for doc, b in boundary:
+        if doc in staff_set and b + 2 in day_set and (doc, b + 2) not in fixed_off: obj_terms.append(shifts[(doc, b + 2)] * -weight)
+    for d in days:
+        if d + 2 not in day_set: continue
+        pairs = [(shifts[(doc, d)], shifts[(doc, d + 2)]) for doc in staff_list if (doc, d) not in fixed_off and (doc, d + 2) not in fixed_off]
+        if not pairs: continue
+        q2_violation = model.NewBoolVar(f"q2_{d}")
+        for first, second in pairs: model.AddBoolOr([first.Not(), second.Not(), q2_violation])
+        obj_terms.append(q2_violation * -weight)
+
+# ==========================================
+# 對稱性破除：限制與目標完全相同的醫師可以互換
+# ==========================================
+def prefs_signature(doc, *prefs):
+    # 各項偏好 / 邊界 / 餘額中與 doc 有關的部分 (可雜湊)
+    return tuple(frozenset(p.get(doc, {}).items()) if isinstance(p.get(doc), dict) else frozenset(p.get(doc, [])) for p in prefs)
+
+def boundary_by_doc(boundary):
+    prev = {}
+    for doc, b in boundary: prev.setdefault(doc, []).append(b)
+    return prev
+
+def interchangeable_classes(staff, signature):
+    # signature(doc) 相同的醫師互換後仍是同樣好的班表；回傳 2 人以上的類別 (依名單順序)
+    classes = {}
+    for doc in staff: classes.setdefault(signature(doc), []).append(doc)
+    return [docs for docs in classes.values() if len(docs) > 1]
+
+def add_symmetry_breaking(model, shifts, classes, days):
+    # 同類別的醫師依「第一次值班的日期」排序 (value precedence)：前一位值過班之前，後一位不可值班。
+    # 任何班表都能把同類別的醫師依首次值班日重新命名，所以不會排除更好的目標值 (有 forbidden_patterns 時例外，不加入)。
+    # 預設不開啟 (symmetry_breaking=False)：CP-SAT presolve 本身會偵測對稱性，實測 (benchmarks/bench_solver.py
+    # --symmetry-breaking) 多出的鏈狀變數在多執行緒時反而較慢；留給大型、無偏好的科別自行比較
+    for docs in classes:
+        for a, b in zip(docs, docs[1:]):
+            started = None  # a 在第 d 天之前是否值過班
+            for d in days:
+                if started is None: model.Add(shifts[(b, d)] == 0)
+                else: model.AddImplication(shifts[(b, d)], started)
+                seen = model.NewBoolVar(f"sym_{a}_{d}")
+                model.AddMaxEquality(seen, [shifts[(a, d)]] + ([started] if started is not None else []))
+                started = seen
+
+def get_report(solver, sacrifices):
+    report = []
+    seen = set()
+    for var, msg in sacrifices:
+        if solver.Value(var) > 0:
+            if msg not in seen:
+                report.append(msg)
+                seen.add(msg)
+    return report
+
+def summarize(solver, status, sacrifices, pattern):
+    # 只保留可序列化的精簡結果，不留住 CpSolver / 變數
+    ok = status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+    return {
+        "status": int(status),
+        "objective": solver.ObjectiveValue() if ok else None,
+        "bound": solver.BestObjectiveBound() if ok else None,
+        "wall_time": solver.WallTime(),
+        "conflicts": solver.NumConflicts(),
+        "branches": solver.NumBranches(),
+        "pattern": list(pattern),
+        "report": get_report(solver, sacrifices) if ok else [],
+    }
+
+def is_solved(result):
+    return result["status"] in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+
+def is_optimal(result):
+    return result["status"] == cp_model.OPTIMAL
+
+# assumptions：若傳入 dict，請假 / 指定值班等硬限制改由假設文字 (assumption literal) 控制，
+# 記錄 {literal index: (literal, 原因)}，不可行時 CP-SAT 可回報互相衝突的假設 (見 roster.feasibility)；
+# 回傳是否無條件固定：假設拿掉後變數仍可能為 1，這種 (doc, d) 不可放進 fixed_off 收緊上界 (否則最小衝突集合會算錯)
+def add_fixed(model, var, value, assumptions=None, reason=""):
+    ct = model.Add(var == value)
+    if assumptions is None: return True
+    lit = model.NewBoolVar(f"asm_{len(assumptions)}")
+    ct.OnlyEnforceIf(lit); assumptions[lit.Index()] = (lit, reason)
+    return False
+
+def add_boundary_rest(model, shifts, boundary, days, fixed_off, assumptions=None, label=None):
+    # 上月最後一天值班者，本月第 1 天不可再值 (不連值)
+    day_set = set(days)
+    for doc, b in boundary:
+        if b + 1 in day_set and (doc, b + 1) in shifts:
+            if add_fixed(model, shifts[(doc, b + 1)], 0, assumptions, f"{doc} 上月最後一天值班，{label[b + 1] if label else b + 1} 不可連值"): fixed_off.add((doc, b + 1))
+
+# tiers：若傳入 dict，目標項另依優先層級記錄 {層級: [項目]} (見 run_lexicographic)；回傳新的起點
+def add_tier(tiers, name, obj_terms, start):
+    if tiers is not None and len(obj_terms) > start: tiers.setdefault(name, []).extend(obj_terms[start:])
+    return len(obj_terms)
+
+def add_forbidden_patterns(model, shifts, forbidden_patterns, min_distance):
+    for pattern in forbidden_patterns or []:
+        relevant = [shifts[k] for k in pattern if k in shifts]
+        if relevant: model.Add(cp_model.LinearExpr.Sum(relevant) <= len(relevant) - min_distance)
+
+# boundary：上月已公告的大班 [(doc, d)]，d <= 0 (0 = 上月最後一天)；balances：跨月累計的公平性 / 點數偏移
+def build_big_model(year, month, vs_staff, r_staff, days, vs_leaves, r_leaves, vs_wishes, vs_nogo, r_nogo, r_wishes, custom_holidays, forbidden_patterns=None, min_distance=3, boundary=None, balances=None, assumptions=None, symmetry_breaking=False, tiers=None):
+    model = cp_model.CpModel()
+    all_staff = vs_staff + r_staff
+    masks = day_masks(year, month, days, custom_holidays)
+    label = masks["label"]
+    vs_set, r_set = set(vs_staff), set(r_staff)
+    shifts = {}
+    obj_terms = []
+    sacrifices = []
+    for doc in all_staff:
+        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_big_{doc}_{d}")
+    for d in days: model.AddExactlyOne([shifts[(doc, d)] for doc in all_staff])
+    pairs = consecutive_pairs(days)
+    for doc in all_staff:
+        for d1, d2 in pairs: model.AddAtMostOne([shifts[(doc, d1)], shifts[(doc, d2)]])
+    fixed_off = set()
+    for leaves, staff_set in [(vs_leaves, vs_set), (r_leaves, r_set)]:
+        for doc, dates_off in leaves.items():
+            if doc in staff_set:
+                for d in dates_off:
+                    if add_fixed(model, shifts[(doc, d)], 0, assumptions, f"{doc} 絕對請假 ({label[d]})"): fixed_off.add((doc, d))
+    boundary = [tuple(x) for x in boundary or []]
+    add_boundary_rest(model, shifts, boundary, days, fixed_off, assumptions, label)
+    add_forbidden_patterns(model, shifts, forbidden_patterns, min_distance)
+    for doc, dates_on in vs_wishes.items():
+        if doc in vs_set:
+            for d in dates_on: add_fixed(model, shifts[(doc, d)], 1, assumptions, f"{doc} (VS) 指定值班 ({label[d]})")
+    # 排除既有方案時不可再依首次值班日排序：與既有方案等價的其他命名可能正是唯一合格的解
+    if symmetry_breaking and not forbidden_patterns:
+        prev = boundary_by_doc(boundary)
+        classes = interchangeable_classes(vs_staff, lambda doc: prefs_signature(doc, vs_leaves, vs_wishes, vs_nogo, prev, balances or {}))
+        classes += interchangeable_classes(r_staff, lambda doc: prefs_signature(doc, r_leaves, r_wishes, r_nogo, prev, balances or {}))
+        add_symmetry_breaking(model, shifts, classes, days)
+    n = len(obj_terms)
+    add_fairness_objective(model, shifts, r_staff, days, year, month, custom_holidays, obj_terms, weight=2000, balances=balances, fixed_off=fixed_off)
+    add_point_system_constraint(model, shifts, r_staff, days, year, month, custom_holidays, obj_terms, sacrifices, limit=8, weight=200, balances=balances, fixed_off=fixed_off)
+    add_spacing_preference(model, shifts, r_staff, days, obj_terms, weight=50, fixed_off=fixed_off, boundary=boundary)
+    n = add_tier(tiers, "fairness", obj_terms, n)
+    for doc, dates_off in r_nogo.items():
+        if doc in r_set:
+            for d in dates_off: obj_terms.append(shifts[(doc, d)] * -5000); sacrifices.append((shifts[(doc, d)], f"{doc} (R) 排入 No-Go ({label[d]})"))
+    for doc, dates_off in vs_nogo.items():
+        if doc in vs_set:
+            for d in dates_off: obj_terms.append(shifts[(doc, d)] * -5000); sacrifices.append((shifts[(doc, d)], f"{doc} (VS) 排入 No-Go ({label[d]})"))
+    n = add_tier(tiers, "nogo", obj_terms, n)
+    for doc in vs_staff:
+        wished_days = set(vs_wishes.get(doc, []))
+        support = [d for d in days if d not in wished_days]
+        obj_terms.append(cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in support]) * -5000)
+        for d in support: sacrifices.append((shifts[(doc, d)], f"{doc} (VS) 支援 ({label[d]})"))
+    n = add_tier(tiers, "support", obj_terms, n)
+    for doc, dates_on in r_wishes.items():
+        if doc in r_set:
+            for d in dates_on: obj_terms.append(shifts[(doc, d)] * 10)
+    add_tier(tiers, "wishes", obj_terms, n)
+    model.Maximize(cp_model.LinearExpr.Sum(obj_terms))
+    return model, shifts, obj_terms, sacrifices
+
+# options 中直接對應 CP-SAT 參數的項目 (其餘如 lexicographic 只有 solve_big_shift / solve_small_shift 認得)
+SOLVER_PARAMS = ("num_workers", "time_limit", "relative_gap")
+
+def solver_params(options):
+    return {k: v for k, v in (options or {}).items() if k in SOLVER_PARAMS}
+
+def new_solver(seed=0, num_workers=None, time_limit=None, relative_gap=None):
+    solver = cp_model.CpSolver()
+    solver.parameters.random_seed = seed
+    if num_workers: solver.parameters.num_workers = num_workers
+    if time_limit: solver.parameters.max_time_in_seconds = time_limit
+    if relative_gap: solver.parameters.relative_gap_limit = relative_gap
+    return solver
+
+class SolutionStream(cp_model.CpSolverSolutionCallback):
+    # 每找到更好的解就回報 (目標值、上界、犧牲報告)；on_solution 回傳 True 則提前採用目前解
+    def __init__(self, sacrifices, on_solution):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.sacrifices = sacrifices
+        self.on_solution = on_solution
+        self.error = None
+
+    def on_solution_callback(self):
+        if self.error is not None: return
+        try:
+            info = {"objective": self.ObjectiveValue(), "bound": self.BestObjectiveBound(), "wall_time": self.WallTime(), "report": get_report(self, self.sacrifices)}
+            if self.on_solution(info): self.StopSearch()
+        except BaseException as e:
+            # 例外不可拋進 C++ 搜尋，先停止搜尋，Solve 結束後再拋出
+            self.error = e
+            self.StopSearch()
+
+def run_solver(model, sacrifices, seed=0, num_workers=None, time_limit=None, relative_gap=None, on_solution=None):
+    solver = new_solver(seed, num_workers, time_limit, relative_gap)
+    if on_solution is None:
+        return solver, solver.Solve(model)
+    stream = SolutionStream(sacrifices, on_solution)
+    status = solver.Solve(model, stream)
+    if stream.error is not None: raise stream.error
+    return solver, status
+
+# ==========================================
+# 分層 (lexicographic) 最佳化：依優先順序逐層求解，取代權重跨 10 到 1000000 的單一加權目標
+# ==========================================
+# 每層以自己的目標求解，得到的最佳值 (逾時則為目前最佳) 固定為下界，下一層以上一層的解為 hint。
+# 層內保留原本的相對權重 (例如公平性 2000 : 點數 200 : 間隔 50)
+TIERS = ("limits", "support", "nogo", "fairness", "wishes")
+TIER_LABELS = {"limits": "單週 / 平日 / 假日上限", "support": "支援班", "nogo": "No-Go", "fairness": "公平性 / 點數", "wishes": "想值班"}
+# 沒有指定各層時間時，time_limit 依比例分給各層；前面的層沒用完的時間留給後面
+TIER_BUDGET = {"limits": 0.2, "support": 0.2, "nogo": 0.2, "fairness": 0.3, "wishes": 0.1}
+
+def tier_time_limit(name, remaining_tiers, remaining, tier_limits):
+    limit = (tier_limits or {}).get(name)
+    if remaining is None: return limit
+    share = remaining * TIER_BUDGET[name] / sum(TIER_BUDGET[t] for t in remaining_tiers)
+    return max(0.01, min(limit, remaining) if limit else share)
+
+def run_lexicographic(model, shifts, obj_terms, tiers, sacrifices, seed=0, num_workers=None, time_limit=None, relative_gap=None, on_solution=None, tier_limits=None, stages=None):
+    # 回傳 (solver, status)：solver 是以原本的加權目標為最後的解評分 (目標值與一次求解可比較)；
+    # 每一層都證明最佳才回報 OPTIMAL。stages：若傳入 list，填入各層的狀態、目標值與耗時
+    order = [name for name in TIERS if tiers.get(name)]
+    if not order: return run_solver(model, sacrifices, seed, num_workers, time_limit, relative_gap, on_solution)
+    variables = pd.Series(list(shifts.values()))
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    hint, proven = None, True
+    for i, name in enumerate(order):
+        objective = cp_model.LinearExpr.Sum(tiers[name])
+        model.Maximize(objective)
+        if hint is not None:
+            model.ClearHints()
+            for var, value in zip(variables, hint): model.AddHint(var, value)
+        remaining = max(0.0, deadline - time.perf_counter()) if deadline else None
+        limit = tier_time_limit(name, order[i:], remaining, tier_limits)
+        t0 = time.perf_counter()
+        solver, status = run_solver(model, sacrifices, seed, num_workers, limit, relative_gap, on_solution and (lambda info, name=name: on_solution(dict(info, tier=name))))
+        ok = status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+        if stages is not None:
+            stages.append({"tier": name, "status": int(status), "objective": solver.ObjectiveValue() if ok else None,
+                           "bound": solver.BestObjectiveBound() if ok else None, "time": time.perf_counter() - t0})
+        if not ok:
+            # 第一層就找不到解 = 不可行 (或逾時)；後面的層逾時則沿用上一層的解
+            if hint is None: return solver, status
+            proven = False; break
+        proven = proven and status == cp_model.OPTIMAL
+        model.Add(objective >= round(solver.ObjectiveValue()))
+        hint = solver.BooleanValues(variables).tolist()
+    # 固定班表為最後的解，以原本的加權目標評分 (犧牲報告、目標值與一般模式一致)
+    model.Maximize(cp_model.LinearExpr.Sum(obj_terms))
+    model.ClearHints()
+    for var, value in zip(variables, hint): model.AddHint(var, value)
+    solver = new_solver(seed, num_workers)
+    solver.parameters.fix_variables_to_their_hinted_value = True
+    status = solver.Solve(model)
+    if status == cp_model.OPTIMAL and not proven: status = cp_model.FEASIBLE
+    return solver, status
+
+def extract_pattern(solver, shifts):
+    # 一次取出所有班表變數的值 (取代逐格 solver.Value)，順序同 shifts
+    keys = list(shifts)
+    values = solver.BooleanValues(pd.Series(list(shifts.values()))).to_numpy()
+    return [keys[i] for i in np.flatnonzero(values)]
+
+def r_schedule_from_pattern(pattern, r_staff):
+    r_schedule_map = {r: [] for r in r_staff}
+    for doc, d in pattern:
+        if doc in r_schedule_map: r_schedule_map[doc].append(d)
+    return r_schedule_map
+
+# timings：若傳入 dict，填入建模時間 "build" 與搜尋時間 "search" (秒)；分層最佳化另填各層結果 "stages"
+# lexicographic：依 TIERS 的順序逐層最佳化；tier_limits：{層級: 秒數}，未指定則依 TIER_BUDGET 分配 time_limit
+def solve_big_shift(year, month, vs_staff, r_staff, days, vs_leaves, r_leaves, vs_wishes, vs_nogo, r_nogo, r_wishes, custom_holidays, forbidden_patterns=None, min_distance=3, boundary=None, balances=None, num_workers=None, time_limit=None, relative_gap=None, on_solution=None, timings=None, symmetry_breaking=False, lexicographic=False, tier_limits=None):
+    t0 = time.perf_counter()
+    tiers = {} if lexicographic else None
+    model, shifts, obj_terms, sacrifices = build_big_model(year, month, vs_staff, r_staff, days, vs_leaves, r_leaves, vs_wishes, vs_nogo, r_nogo, r_wishes, custom_holidays, forbidden_patterns, min_distance, boundary, balances, symmetry_breaking=symmetry_breaking, tiers=tiers)
+    seed = len(forbidden_patterns) if forbidden_patterns else 0
+    t1 = time.perf_counter()
+    if lexicographic:
+        stages = []
+        solver, status = run_lexicographic(model, shifts, obj_terms, tiers, sacrifices, seed, num_workers, time_limit, relative_gap, on_solution, tier_limits, stages)
+        if timings is not None: timings["stages"] = stages
+    else:
+        solver, status = run_solver(model, sacrifices, seed, num_workers, time_limit, relative_gap, on_solution)
+    if timings is not None: timings["build"] = t1 - t0; timings["search"] = time.perf_counter() - t1
+    result_pattern = extract_pattern(solver, shifts) if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else []
+    r_schedule_map = r_schedule_from_pattern(result_pattern, r_staff)
+    return solver, status, shifts, sacrifices, result_pattern, r_schedule_map
+
+# r_schedule_map 可含 d <= 0 的上月大班 (R 大班前後 2 天不支援小班)；boundary：上月已公告的小班
+def build_small_model(year, month, pgy_staff, int_staff, r_staff, days, pgy_leaves, int_leaves, pgy_nogo, pgy_wishes, int_nogo, int_wishes, r_nogo, r_schedule_map, custom_holidays, forbidden_patterns=None, min_distance=3, boundary=None, balances=None, assumptions=None, symmetry_breaking=False, tiers=None):
+    model = cp_model.CpModel()
+    masks = day_masks(year, month, days, custom_holidays)
+    label = masks["label"]
+    day_set = set(days)
+    junior_staff = pgy_staff + int_staff
+    pgy_set, int_set = set(pgy_staff), set(int_staff)
+    shifts = {}
+    obj_terms = []
+    sacrifices = []
+    for doc in junior_staff:
+        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_sml_{doc}_{d}")
+    for doc in r_staff:
+        for d in days: shifts[(doc, d)] = model.NewBoolVar(f"s_sml_Rsupport_{doc}_{d}")
+    all_small_candidates = junior_staff + r_staff
+    for d in days: model.AddExactlyOne([shifts[(doc, d)] for doc in all_small_candidates])
+    pairs = consecutive_pairs(days)
+    for doc in all_small_candidates:
+        for d1, d2 in pairs: model.AddAtMostOne([shifts[(doc, d1)], shifts[(doc, d2)]])
+    fixed_off = set()
+    for doc in r_staff:
+        # 大班當天與前後 2 天、No-Go 日不可支援小班
+        near_big = {b + k for b in r_schedule_map.get(doc, []) for k in range(-2, 3)}
+        nogo = set(r_nogo.get(doc, []))
+        for d in sorted((near_big | nogo) & day_set):
+            reason = f"{doc} (R) {'大班前後 2 天' if d in near_big else 'No-Go'}不支援小班 ({label[d]})"
+            if add_fixed(model, shifts[(doc, d)], 0, assumptions, reason): fixed_off.add((doc, d))
+    for leaves, staff_set in [(pgy_leaves, pgy_set), (int_leaves, int_set)]:
+        for doc, dates_off in leaves.items():
+            if doc in staff_set:
+                for d in dates_off:
+                    if add_fixed(model, shifts[(doc, d)], 0, assumptions, f"{doc} 絕對請假 ({label[d]})"): fixed_off.add((doc, d))
+    boundary = [tuple(x) for x in boundary or []]
+    add_boundary_rest(model, shifts, boundary, days, fixed_off, assumptions, label)
+    add_forbidden_patterns(model, shifts, forbidden_patterns, min_distance)
+    weekend_days, weekday_days = masks["weekend_days"], masks["weekday_days"]
+    # 跨月的第一週：上月同一週已值的小班一併計入單週上限
+    first_week = masks["weeks"][0] if masks["weeks"] else []
+    monday = masks["dates"][first_week[0]] - timedelta(days=masks["dates"][first_week[0]].weekday()) if first_week else None
+    start = date(year, month, 1)
+    carried_week = {}
+    for doc, b in boundary:
+        if monday is not None and start + timedelta(days=b - 1) >= monday: carried_week[doc] = carried_week.get(doc, 0) + 1
+    W_LIMIT_BREAK = 1000000; W_FAIRNESS = 500; W_NOGO = 5000; W_WISH = 10
+    if symmetry_breaking and not forbidden_patterns:
+        # PGY 與 Int 在小班模型中的限制、權重完全相同，偏好一樣時也可互換
+        prev = boundary_by_doc(boundary)
+        junior_prefs = lambda doc: (pgy_leaves, pgy_nogo, pgy_wishes) if doc in pgy_set else (int_leaves, int_nogo, int_wishes)
+        classes = interchangeable_classes(junior_staff, lambda doc: prefs_signature(doc, *junior_prefs(doc), prev, balances or {}))
+        classes += interchangeable_classes(r_staff, lambda doc: prefs_signature(doc, r_nogo, r_schedule_map, prev))
+        add_symmetry_breaking(model, shifts, classes, days)
+
+    # 單週 / 平日 / 假日的超額變數上界：不可連值下最多能排到的班數減去上限
+    cap = max_shifts(days)
+    n = len(obj_terms)
+    for doc in junior_staff:
+        limit_weight = W_LIMIT_BREAK
+        for week in masks["weeks"]:
+            count = cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in week])
+            carried = carried_week.get(doc, 0) if week is first_week else 0
+            slack = model.NewIntVar(0, max(0, max_shifts(week) + carried - 2), f"slk_wk_{doc}_{week[0]}")
+            model.Add(count + carried <= 2 + slack)
+            obj_terms.append(slack * -limit_weight); sacrifices.append((slack, f"{doc} 單週超過 2 班"))
+        wd_cnt = cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in weekday_days])
+        slack_wd = model.NewIntVar(0, max(0, min(cap, len(weekday_days)) - 6), f"slk_wd_{doc}")
+        model.Add(wd_cnt <= 6 + slack_wd)
+        obj_terms.append(slack_wd * -limit_weight); sacrifices.append((slack_wd, f"{doc} 平日超過 6 班"))
+        we_cnt = cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in weekend_days])
+        slack_we = model.NewIntVar(0, max(0, min(cap, len(weekend_days)) - 2), f"slk_we_{doc}")
+        model.Add(we_cnt <= 2 + slack_we)
+        obj_terms.append(slack_we * -limit_weight); sacrifices.append((slack_we, f"{doc} 假日超過 2 班"))
+    n = add_tier(tiers, "limits", obj_terms, n)
+    add_point_system_constraint(model, shifts, junior_staff, days, year, month, custom_holidays, obj_terms, sacrifices, limit=10, weight=1000, balances=balances, fixed_off=fixed_off)
+    n = add_tier(tiers, "fairness", obj_terms, n)
+    for doc in r_staff:
+        free = [d for d in days if (doc, d) not in fixed_off]
+        obj_terms.append(cp_model.LinearExpr.Sum([shifts[(doc, d)] for d in free]) * -50000)
+        for d in free: sacrifices.append((shifts[(doc, d)], f"{doc} (R) 支援小班 ({label[d]})"))
+    n = add_tier(tiers, "support", obj_terms, n)
+    add_fairness_objective(model, shifts, junior_staff, days, year, month, custom_holidays, obj_terms, weight=W_FAIRNESS, balances=balances, fixed_off=fixed_off)
+    add_tier(tiers, "fairness", obj_terms, n)
+    for doc in junior_staff:
+        nogo_days = set(pgy_nogo.get(doc, []) if doc in pgy_set else int_nogo.get(doc, [])) & day_set
+        wish_days = set(pgy_wishes.get(doc, []) if doc in pgy_set else int_wishes.get(doc, [])) & day_set
+        for d in sorted(nogo_days): obj_terms.append(shifts[(doc, d)] * -W_NOGO); sacrifices.append((shifts[(doc, d)], f"{doc} 排入不想值的班 ({label[d]})"))
+        add_tier(tiers, "nogo", obj_terms, len(obj_terms) - len(nogo_days))
+        for d in sorted(wish_days): obj_terms.append(shifts[(doc, d)] * W_WISH)
+        add_tier(tiers, "wishes", obj_terms, len(obj_terms) - len(wish_days))
+    model.Maximize(cp_model.LinearExpr.Sum(obj_terms))
+    return model, shifts, obj_terms, sacrifices
+
+def solve_small_shift(year, month, pgy_staff, int_staff, r_staff, days, pgy_leaves, int_leaves, pgy_nogo, pgy_wishes, int_nogo, int_wishes, r_nogo, r_schedule_map, custom_holidays, forbidden_patterns=None, min_distance=3, boundary=None, balances=None, num_workers=None, time_limit=None, relative_gap=None, on_solution=None, timings=None, symmetry_breaking=False, lexicographic=False, tier_limits=None):
+    t0 = time.perf_counter()
+    tiers = {} if lexicographic else None
+    model, shifts, obj_terms, sacrifices = build_small_model(year, month, pgy_staff, int_staff, r_staff, days, pgy_leaves, int_leaves, pgy_nogo, pgy_wishes, int_nogo, int_wishes, r_nogo, r_schedule_map, custom_holidays, forbidden_patterns, min_distance, boundary, balances, symmetry_breaking=symmetry_breaking, tiers=tiers)
+    seed = len(forbidden_patterns) if forbidden_patterns else 0
+    t1 = time.perf_counter()
+    if lexicographic:
+        stages = []
+        solver, status = run_lexicographic(model, shifts, obj_terms, tiers, sacrifices, seed, num_workers, time_limit, relative_gap, on_solution, tier_limits, stages)
+        if timings is not None: timings["stages"] = stages
+    else:
+        solver, status = run_solver(model, sacrifices, seed, num_workers, time_limit, relative_gap, on_solution)
+    if timings is not None: timings["build"] = t1 - t0; timings["search"] = time.perf_counter() - t1
+    result_pattern = extract_pattern(solver, shifts) if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else []
+    return solver, status, shifts, sacrifices, result_pattern
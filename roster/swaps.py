@@ -0,0 +1,184 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from .matrix import assignees
+from .views import stats_frame
+
+# ==========================================
+# 手動換班檢查：不呼叫求解器，以與模型相同的規則檢查班表；每次換班只重算受影響的日期與醫師 (O(1))
+# ==========================================
+# 硬規則 (模型中的限制)：不可連值 (含上月最後一天)、請假、VS 指定值班、R 大班前後 2 天 / No-Go 不支援小班。
+# 犧牲項目 (模型中的扣分)：訊息與求解的犧牲報告 (get_report) 相同。上限與 build_big_model / build_small_model 一致
+WEEK_LIMIT, WEEKDAY_LIMIT, WEEKEND_LIMIT = 2, 6, 2
+POINT_LIMITS = {"big": 8, "small": 10}
+R_GAP = 2
+STAGE_NAMES = {"big": "大班", "small": "小班"}
+# 犧牲報告的順序 (同模型中加入犧牲項目的順序)
+REPORT_ORDER = {"big": ["points", "r_nogo", "vs_nogo", "vs_support"], "small": ["limits", "points", "r_support", "nogo"]}
+LIMIT_RANK = {"week": 0, "weekday": 1, "weekend": 2}
+
+class SwapValidator:
+    # problem：排班問題；m_big / m_small：roster_matrix() 的結果 (不會被修改，換班改在內部的副本上)
+    def __init__(self, problem, m_big, m_small):
+        p = problem
+        self.m = {stage: dict(m, grid=m["grid"].copy()) for stage, m in (("big", m_big), ("small", m_small))}
+        self.staff = {stage: list(m["staff"]) for stage, m in self.m.items()}
+        self.row = {stage: {doc: i for i, doc in enumerate(staff)} for stage, staff in self.staff.items()}
+        self.days = [int(d) for d in m_big["days"]]
+        self.col = {d: j for j, d in enumerate(self.days)}
+        self.label = dict(zip(self.days, m_big["label"]))
+        self.holiday = dict(zip(self.days, m_big["holiday"].tolist()))
+        start = date(p["year"], p["month"], 1)
+        monday = {d: start + timedelta(days=d - 1 - (start + timedelta(days=d - 1)).weekday()) for d in self.days}
+        weeks = sorted(set(monday.values()))
+        self.week = {d: weeks.index(monday[d]) for d in self.days}
+        self.week_days = [[d for d in self.days if self.week[d] == w] for w in range(len(weeks))]
+        boundary = p.get("boundary", {})
+        # 上月最後幾天 (d <= 0) 的值班者；小班第一週另計上月同週已值的班
+        self.prev = {stage: {b: doc for doc, b in boundary.get(stage, [])} for stage in ("big", "small")}
+        self.carried_week = {}
+        for doc, b in boundary.get("small", []):
+            if weeks and start + timedelta(days=b - 1) >= weeks[0]: self.carried_week[doc] = self.carried_week.get(doc, 0) + 1
+        self.vs, self.r = set(p["vs_staff"]), set(p["r_staff"])
+        self.junior = set(p["pgy_staff"]) | set(p["int_staff"])
+        pairs = lambda prefs, members: {(doc, d) for doc, ds in prefs.items() if doc in members for d in ds}
+        self.leaves = {"big": pairs(p["vs_leaves"], self.vs) | pairs(p["r_leaves"], self.r),
+                       "small": pairs(p["pgy_leaves"], set(p["pgy_staff"])) | pairs(p["int_leaves"], set(p["int_staff"]))}
+        self.vs_wishes = pairs(p["vs_wishes"], self.vs)
+        self.wishers = {}
+        for doc, d in self.vs_wishes: self.wishers.setdefault(d, []).append(doc)
+        self.r_nogo = pairs(p["r_nogo"], self.r)
+        self.vs_nogo = pairs(p["vs_nogo"], self.vs)
+        self.junior_nogo = pairs(p["pgy_nogo"], set(p["pgy_staff"])) | pairs(p["int_nogo"], set(p["int_staff"]))
+        self.pts_off = {doc: int(round(v.get("pts", 0))) for doc, v in (p.get("balances") or {}).items()}
+        # 目前狀態：每天的值班者、每人的平日 / 假日班數、每人每週班數、違規 {key: 違規}
+        self.who = {stage: dict(zip(self.days, assignees(m).tolist())) for stage, m in self.m.items()}
+        self.wd = {stage: np.zeros(len(staff), dtype=int) for stage, staff in self.staff.items()}
+        self.we = {stage: np.zeros(len(staff), dtype=int) for stage, staff in self.staff.items()}
+        self.week_count = {"big": {}, "small": {}}
+        self.issues = {}
+        self.delta = None
+        for stage in ("big", "small"):
+            for d, doc in self.who[stage].items():
+                if doc: self._count(stage, doc, d, 1)
+            for d in self.days: self._check_day(stage, d)
+            for d in [0] + self.days: self._check_pair(stage, d)
+            for doc in self.staff[stage]: self._check_caps(stage, doc, None)
+
+    # --- 換班 ---
+    def assign(self, stage, d, doc):
+        # 第 d 天的 stage 班改由 doc 值班；回傳 {"added": [新違規], "removed": [已解除的違規]}
+        if doc not in self.row[stage]: raise ValueError(f"{doc} 不在{STAGE_NAMES[stage]}名單內")
+        if d not in self.col: raise ValueError(f"第 {d} 天不在排班日期內")
+        self.delta = {"added": [], "removed": []}
+        old = self.who[stage][d]
+        if old == doc: return self.delta
+        if old: self._count(stage, old, d, -1)
+        self.who[stage][d] = doc
+        self._count(stage, doc, d, 1)
+        self._check_day(stage, d)
+        self._check_pair(stage, d - 1); self._check_pair(stage, d)
+        for x in (old, doc):
+            if x: self._check_caps(stage, x, self.week[d])
+        # R 的大班異動：前後 2 天的小班是否可由該 R 支援跟著改變
+        if stage == "big" and ({old, doc} & self.r):
+            for x in range(d - R_GAP, d + R_GAP + 1):
+                if x in self.col: self._check_day("small", x)
+        delta, self.delta = self.delta, None
+        return delta
+
+    def swap(self, stage, d1, d2):
+        # 同一班別兩天的值班者互換；以互換前後的違規比較 (第一步暫時產生、第二步又解除的不算)
+        a, b = self.who[stage][d1], self.who[stage][d2]
+        before = dict(self.issues)
+        self.assign(stage, d1, b)
+        self.assign(stage, d2, a)
+        return {"added": [x for k, x in self.issues.items() if before.get(k) != x],
+                "removed": [x for k, x in before.items() if self.issues.get(k) != x]}
+
+    # --- 查詢 ---
+    def violations(self, hard=None):
+        # hard=True 只回傳硬規則違規；依班別、日期排序
+        rows = [v for v in self.issues.values() if hard is None or v["hard"] == hard]
+        return sorted(rows, key=lambda v: (v["stage"] != "big", v["day"] or 0, v["message"]))
+
+    def report(self, stage):
+        # 與求解的犧牲報告相同的訊息 (去除重複)
+        order = REPORT_ORDER[stage]
+        rows = sorted((v for v in self.issues.values() if v["stage"] == stage and not v["hard"]),
+                      key=lambda v: (order.index(v["group"]), self.row[stage].get(v["doctor"], 0), LIMIT_RANK.get(v["rule"], 0), v["day"] or 0))
+        return list(dict.fromkeys(v["message"] for v in rows))
+
+    def stats(self, stage):
+        # 與 calculate_stats(roster_matrix(...)) 相同的統計表
+        return stats_frame(self.staff[stage], self.wd[stage].copy(), self.we[stage].copy())
+
+    def matrix(self, stage):
+        # 換班後的班表矩陣 (可直接給 views 的日曆 / 統計 / 連結使用)
+        return self.m[stage]
+
+    def pattern(self, stage):
+        return [(doc, d) for d, doc in self.who[stage].items() if doc]
+
+    # --- 內部：計數與規則 ---
+    def _count(self, stage, doc, d, step):
+        i = self.row[stage][doc]
+        self.m[stage]["grid"][i, self.col[d]] = step > 0
+        (self.we if self.holiday[d] else self.wd)[stage][i] += step
+        key = (doc, self.week[d])
+        self.week_count[stage][key] = self.week_count[stage].get(key, 0) + step
+
+    def _set(self, key, on, stage, rule, doc, d, message, hard, group=None):
+        # 同一個 key 換了值班者 (訊息不同) 視為解除舊的、加入新的違規
+        old = self.issues.get(key)
+        if on and old is not None and old["message"] == message: return
+        if old is not None:
+            del self.issues[key]
+            if self.delta is not None: self.delta["removed"].append(old)
+        if on:
+            self.issues[key] = {"stage": stage, "rule": rule, "doctor": doc, "day": d, "hard": hard, "group": group, "message": message}
+            if self.delta is not None: self.delta["added"].append(self.issues[key])
+
+    def _check_day(self, stage, d):
+        # 單日規則 (與值班者有關的 key 都以日期為主，換人時自動覆蓋)
+        doc, label = self.who[stage][d], self.label[d]
+        name = STAGE_NAMES[stage]
+        self._set((stage, "leave", d), doc and (doc, d) in self.leaves[stage], stage, "leave", doc, d, f"{doc} 請假日排入{name} ({label})", True)
+        if stage == "big":
+            for vs in self.wishers.get(d, []):
+                self._set((stage, "wish", d, vs), doc != vs, stage, "wish", vs, d, f"{vs} (VS) 指定值班日未排入 ({label})", True)
+            self._set((stage, "r_nogo", d), (doc, d) in self.r_nogo, stage, "r_nogo", doc, d, f"{doc} (R) 排入 No-Go ({label})", False, "r_nogo")
+            self._set((stage, "vs_nogo", d), (doc, d) in self.vs_nogo, stage, "vs_nogo", doc, d, f"{doc} (VS) 排入 No-Go ({label})", False, "vs_nogo")
+            self._set((stage, "vs_support", d), doc in self.vs and (doc, d) not in self.vs_wishes, stage, "vs_support", doc, d, f"{doc} (VS) 支援 ({label})", False, "vs_support")
+            return
+        is_r = doc in self.r
+        near = is_r and any(self.who["big"].get(x, self.prev["big"].get(x)) == doc for x in range(d - R_GAP, d + R_GAP + 1))
+        nogo = is_r and (doc, d) in self.r_nogo
+        self._set((stage, "r_near_big", d), near, stage, "r_near_big", doc, d, f"{doc} (R) 大班前後 {R_GAP} 天支援小班 ({label})", True)
+        self._set((stage, "r_nogo", d), nogo and not near, stage, "r_nogo", doc, d, f"{doc} (R) No-Go 日支援小班 ({label})", True)
+        self._set((stage, "r_support", d), is_r and not near and not nogo, stage, "r_support", doc, d, f"{doc} (R) 支援小班 ({label})", False, "r_support")
+        self._set((stage, "nogo", d), (doc, d) in self.junior_nogo, stage, "nogo", doc, d, f"{doc} 排入不想值的班 ({label})", False, "nogo")
+
+    def _check_pair(self, stage, d):
+        # 第 d 天與第 d + 1 天不可同一人 (d = 0 為上月最後一天)
+        if d + 1 not in self.col: return
+        first = self.who[stage][d] if d in self.col else self.prev[stage].get(d)
+        doc = self.who[stage][d + 1]
+        label = self.label.get(d, "上月最後一天")
+        self._set((stage, "consecutive", d), bool(doc) and first == doc, stage, "consecutive", doc, d + 1,
+                  f"{doc} 連續值{STAGE_NAMES[stage]} ({label}、{self.label[d + 1]})", True)
+
+    def _check_caps(self, stage, doc, week):
+        # week：只重算這一週的單週上限 (None = 全部)
+        i = self.row[stage][doc]
+        wd, we = int(self.wd[stage][i]), int(self.we[stage][i])
+        if (stage == "big" and doc in self.r) or (stage == "small" and doc in self.junior):
+            limit = POINT_LIMITS[stage]
+            self._set((stage, "points", doc), wd + 2 * we + self.pts_off.get(doc, 0) > limit, stage, "points", doc, None, f"{doc} 點數超標 (>{limit}點)", False, "points")
+        if stage != "small" or doc not in self.junior: return
+        for w in (range(len(self.week_days)) if week is None else [week]):
+            count = self.week_count[stage].get((doc, w), 0) + (self.carried_week.get(doc, 0) if w == 0 else 0)
+            self._set((stage, "week", doc, w), count > WEEK_LIMIT, stage, "week", doc, self.week_days[w][0], f"{doc} 單週超過 {WEEK_LIMIT} 班", False, "limits")
+        self._set((stage, "weekday", doc), wd > WEEKDAY_LIMIT, stage, "weekday", doc, None, f"{doc} 平日超過 {WEEKDAY_LIMIT} 班", False, "limits")
+        self._set((stage, "weekend", doc), we > WEEKEND_LIMIT, stage, "weekend", doc, None, f"{doc} 假日超過 {WEEKEND_LIMIT} 班", False, "limits")
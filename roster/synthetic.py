@@ -0,0 +1,37 @@
+import random
+
+# ==========================================
+# 合成排班問題 (基準測試 / 壓力測試用)
+# ==========================================
+def _names(prefix, n):
+    return [f"{prefix}{i + 1}" for i in range(n)]
+
+def _spread(rng, staff, days, density):
+    # 每位醫師約 density * 天數 個日期
+    k = int(round(density * len(days)))
+    return {doc: sorted(rng.sample(days, min(k, len(days)))) for doc in staff} if k else {}
+
+def synthetic_problem(n_vs=2, n_r=4, n_pgy=6, n_int=4, days=31, leave_density=0.05, nogo_density=0.05, wish_density=0.03, n_holidays=1, year=2025, month=1, seed=0):
+    # 回傳與 config.build_problem 相同格式的 problem；days 可超過當月天數 (跨月)
+    rng = random.Random(seed)
+    dates = list(range(1, days + 1))
+    vs_staff, r_staff = _names("VS", n_vs), _names("R", n_r)
+    pgy_staff, int_staff = _names("PGY", n_pgy), _names("Int", n_int)
+    problem = {
+        "year": year, "month": month, "dates": dates,
+        "vs_staff": vs_staff, "r_staff": r_staff, "pgy_staff": pgy_staff, "int_staff": int_staff,
+        "holidays": sorted(rng.sample(dates, min(n_holidays, days))),
+    }
+    for group, staff in [("vs", vs_staff), ("r", r_staff), ("pgy", pgy_staff), ("int", int_staff)]:
+        problem[f"{group}_leaves"] = _spread(rng, staff, dates, leave_density)
+        problem[f"{group}_nogo"] = _spread(rng, staff, dates, nogo_density)
+        problem[f"{group}_wishes"] = _spread(rng, staff, dates, wish_density)
+    # VS 指定值班是硬限制：每位 VS 最多一天，彼此不同天、且不落在自己的請假日
+    taken = set()
+    vs_wishes = {}
+    for doc in vs_staff:
+        options = [d for d in dates if d not in taken and d not in problem["vs_leaves"].get(doc, [])]
+        if options and rng.random() < min(1.0, wish_density * len(dates)):
+            d = rng.choice(options); vs_wishes[doc] = [d]; taken |= {d - 1, d, d + 1}
+    problem["vs_wishes"] = vs_wishes
+    return problem
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import calendar
+import hashlib
+import io
+import zipfile
+
+from .links import encode_payload, generate_ics_content
+from .matrix import assignees, day_map, doctor_days, shift_counts
+
+# ==========================================
+# 班表輸出：統計、日曆、魔術連結、ICS
+# ==========================================
+def get_doctor_color(name):
+    palette = ["#FFB3BA", "#FFDFBA", "#FFFFBA", "#BAFFC9", "#BAE1FF", "#E6B3FF", "#FFB3E6", "#C9C9FF", "#FFD1DC", "#E0F7FA", "#F0F4C3", "#D7CCC8", "#F8BBD0", "#C5CAE9", "#B2DFDB"]
+    idx = int(hashlib.md5(name.encode()).hexdigest(), 16) % len(palette)
+    return palette[idx]
+
+def stats_frame(staff, weekday, holiday):
+    # weekday / holiday：每位醫師的平日 / 假日班數 (與 staff 同順序)
+    stats = pd.DataFrame({"總班數": weekday + holiday, "總點數": weekday + 2 * holiday, "平日": weekday, "假日": holiday}, index=pd.Index(staff, name="醫師"))
+    return stats[stats["總班數"] > 0].sort_values(by="總點數", ascending=False, kind="stable")
+
+def calculate_stats(m):
+    return stats_frame(m["staff"], *shift_counts(m))
+
+def get_html_calendar(m_big, m_small):
+    year, month = m_big["year"], m_big["month"]
+    cal = calendar.monthcalendar(year, month)
+    map_big = day_map(m_big)
+    map_small = day_map(m_small)
+    cls_map = {int(d): ("holiday" if c else "weekend") for d, h, c in zip(m_big["days"], m_big["holiday"], m_big["custom"]) if h}
+    html = """<style>.cal-table {width:100%; border-collapse:collapse; table-layout:fixed;}.cal-table td {height:120px; border:1px solid #ddd; vertical-align:top; padding:4px; background:#fff;}.cal-table th {background:#f0f2f6; border:1px solid #ddd; padding:5px;}.day-num {font-size:12px; color:#666; text-align:right; margin-bottom:5px;}.badge {padding:4px 6px; border-radius:6px; font-size:13px; margin-bottom:4px; display:block; font-weight:bold; color: #333; text-shadow: 0 0 2px #fff; border: 1px solid rgba(0,0,0,0.1);}.weekend {background-color:#fafafa !important;}.holiday {background-color:#ffebee !important;}.shift-label {font-size: 10px; color: #666; margin-right: 3px;}</style><table class="cal-table"><thead><tr><th>Mon</th><th>Tue</th><th>Wed</th><th>Thu</th><th>Fri</th><th style="color:red">Sat</th><th style="color:red">Sun</th></tr></thead><tbody>"""
+    for week in cal:
+        html += "<tr>"
+        for i, day in enumerate(week):
+            if day == 0: html += f'<td class="empty"></td>'
+            else:
+                b_doc = map_big.get(day, ""); s_doc = map_small.get(day, "")
+                html += f'<td class="{cls_map.get(day, "")}"><div class="day-num">{day}</div>'
+                if b_doc: html += f'<div class="badge" style="background-color:{get_doctor_color(b_doc)};"><span class="shift-label">產:</span>{b_doc}</div>'
+                if s_doc: html += f'<div class="badge" style="background-color:{get_doctor_color(s_doc)};"><span class="shift-label">小:</span>{s_doc}</div>'
+                html += "</td>"
+        html += "</tr>"
+    html += "</tbody></table>"
+    return html
+
+def generate_df(m):
+    who = assignees(m)
+    on = who != ""
+    return pd.DataFrame({
+        "日期": np.array(m["label"], dtype=object)[on], "星期": np.array(m["weekday"], dtype=object)[on],
+        "班別": m["name"], "醫師": who[on],
+    })
+
+def generate_excel_calendar_df(m_big, m_small):
+    year, month = m_big["year"], m_big["month"]
+    map_big = day_map(m_big)
+    map_small = day_map(m_small)
+    cal = calendar.monthcalendar(year, month)
+    csv_rows = []
+    headers = ['週一', '週二', '週三', '週四', '週五', '週六', '週日']
+    csv_rows.append(headers)
+    for week in cal:
+        row_date = []; row_big = []; row_small = []
+        for day in week:
+            if day == 0:
+                row_date.append(""); row_big.append(""); row_small.append("")
+            else:
+                row_date.append(f"{month}/{day}")
+                row_big.append(f"[產] {map_big.get(day, '')}")
+                row_small.append(f"[小] {map_small.get(day, '')}")
+        csv_rows.append(row_date); csv_rows.append(row_big); csv_rows.append(row_small)
+        csv_rows.append([""] * 7)
+    return pd.DataFrame(csv_rows)
+
+def doctor_shifts(m_big, m_small):
+    # 一次走訪兩份矩陣，依醫師分組：{doc: [{'d': day, 't': 班別}, ...]} (大班在前，日期遞增)
+    shifts = {}
+    for m in (m_big, m_small):
+        rows, cols = np.nonzero(m["grid"])
+        for r, c in zip(rows.tolist(), cols.tolist()):
+            shifts.setdefault(m["staff"][r], []).append({'d': int(m["days"][c]), 't': m["name"]})
+    return shifts
+
+def magic_link(base_url, doctor_name, year, month, shift_data):
+    if base_url.endswith('/'): base_url = base_url[:-1]
+    return f"{base_url}/?payload={encode_payload(doctor_name, year, month, shift_data)}"
+
+def generate_magic_link(base_url, doctor_name, m_big, m_small):
+    shift_data = [{'d': d, 't': m["name"]} for m in (m_big, m_small) for d in doctor_days(m, doctor_name)]
+    return magic_link(base_url, doctor_name, m_big["year"], m_big["month"], shift_data)
+
+def generate_magic_links(base_url, m_big, m_small):
+    year, month = m_big["year"], m_big["month"]
+    return {doc: magic_link(base_url, doc, year, month, data) for doc, data in doctor_shifts(m_big, m_small).items()}
+
+def _safe_name(name):
+    return "".join("_" if c in '\\/:*?"<>|' else c for c in name)
+
+# plans：[(方案名稱, m_big, m_small)]；每個方案一個資料夾放各醫師的 .ics，
+# 根目錄 links.csv 為所有方案的連結清單；整包在記憶體中產生，不落地
+def generate_distribution_zip(base_url, plans):
+    buffer = io.BytesIO()
+    manifest = []
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for label, m_big, m_small in plans:
+            year, month = m_big["year"], m_big["month"]
+            for doc, data in doctor_shifts(m_big, m_small).items():
+                path = f"{_safe_name(label)}/{_safe_name(doc)}_{year}_{month}_roster.ics"
+                zf.writestr(path, generate_ics_content(data, year, month))
+                manifest.append({
+                    "方案": label, "醫師": doc,
+                    "大班": sum(x['t'] == m_big["name"] for x in data), "小班": sum(x['t'] == m_small["name"] for x in data),
+                    "ICS": path, "連結": magic_link(base_url, doc, year, month, data),
+                })
+        zf.writestr("links.csv", pd.DataFrame(manifest, columns=["方案", "醫師", "大班", "小班", "ICS", "連結"]).to_csv(index=False).encode("utf-8-sig"))
+    return buffer.getvalue()
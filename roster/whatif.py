@@ -0,0 +1,139 @@
+import time
+
+from ortools.sat.python import cp_model
+
+from .config import big_shift_args, small_shift_args
+from .repair import diff_patterns, repair_model
+from .solver import build_big_model, build_small_model, extract_pattern, new_solver, r_schedule_from_pattern
+
+# ==========================================
+# 請假試算 (what-if)：已公告的班表還能不能再准某人某天的假、要動哪些班、目標值差多少
+# ==========================================
+# 每個班別只建一次模型 (StageOracle)：候選請假以假設文字 (assumption literal) 開關，公告班表為 hint，
+# 偏離公告班表的每一班扣 W_DEVIATION (同局部修補)，所以回傳的是「改動最少」的可行班表。
+# 請假當天本來就沒有值班的醫師不必求解 (公告班表仍可行，目標值不變)；同一組請假的結果快取在物件中
+ORACLE_TIME_LIMIT = 1.0
+
+def leave_pairs(request):
+    # request：(doc, d)、(doc, [d, ...]) 或其 list (多人 / 多天一起准假) -> frozenset{(doc, d)}
+    if isinstance(request, tuple): request = [request]
+    pairs = set()
+    for doc, days in request:
+        for d in ([days] if isinstance(days, int) else days): pairs.add((doc, int(d)))
+    return frozenset(pairs)
+
+class StageOracle:
+    # 單一班別的常駐模型；frozen_days：已值完 (不可再調整) 的日期，固定為公告值
+    def __init__(self, build, args, published, frozen_days=(), time_limit=ORACLE_TIME_LIMIT, num_workers=None):
+        self.model, self.shifts, obj_terms, self.sacrifices = build(**args)
+        # 原本的加權目標 (不含偏離扣分)，用來計算准假前後的差
+        self.objective = cp_model.LinearExpr.Sum(list(obj_terms))
+        self.published = [tuple(x) for x in published]
+        repair_model(self.model, self.shifts, obj_terms, self.published, set(args["days"]) - set(frozen_days), None)
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.leaves = {}
+        self.baseline = self.published_objective()
+
+    def published_objective(self):
+        # 班表固定為公告值 (hint) 時的目標值；公告班表在此模型下不可行時回傳 None
+        solver = new_solver(num_workers=self.num_workers)
+        solver.parameters.fix_variables_to_their_hinted_value = True
+        self.model.ClearAssumptions()
+        status = solver.Solve(self.model)
+        return solver.Value(self.objective) if status in [cp_model.OPTIMAL, cp_model.FEASIBLE] else None
+
+    def leave_literal(self, doc, d):
+        if (doc, d) not in self.leaves:
+            lit = self.model.NewBoolVar(f"leave_{doc}_{d}")
+            self.model.Add(self.shifts[(doc, d)] == 0).OnlyEnforceIf(lit)
+            self.leaves[(doc, d)] = lit
+        return self.leaves[(doc, d)]
+
+    def check(self, pairs):
+        self.model.ClearAssumptions()
+        self.model.AddAssumptions([self.leave_literal(doc, d) for doc, d in sorted(pairs)])
+        solver = new_solver(num_workers=self.num_workers, time_limit=self.time_limit)
+        status = solver.Solve(self.model)
+        ok = status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+        pattern = extract_pattern(solver, self.shifts) if ok else None
+        return {"status": status, "objective": solver.Value(self.objective) if ok else None,
+                "pattern": pattern, "changes": diff_patterns(self.published, pattern) if ok else None}
+
+class LeaveOracle:
+    # problem：公告時的排班問題；big / small：公告的精簡結果 (含 pattern)；
+    # from_day：可調整的第一天 (之前的班已值完，固定不動；None = 整月都可調整)
+    def __init__(self, problem, big, small, from_day=None, time_limit=ORACLE_TIME_LIMIT, num_workers=None):
+        self.problem = problem
+        self.big_pattern = [tuple(x) for x in big["pattern"]]
+        self.small_pattern = [tuple(x) for x in small["pattern"]]
+        self.frozen = [d for d in problem["dates"] if from_day is not None and d < from_day]
+        self.big_staff = set(problem["vs_staff"] + problem["r_staff"])
+        self.small_staff = set(problem["pgy_staff"] + problem["int_staff"])
+        self.time_limit = time_limit
+        self.num_workers = num_workers
+        self.stages = {}
+        self.cache = {}
+
+    def stage(self, name):
+        # 模型在第一次需要時才建立
+        if name not in self.stages:
+            if name == "big":
+                build, args, published = build_big_model, big_shift_args(self.problem), self.big_pattern
+            else:
+                args = small_shift_args(self.problem, r_schedule_from_pattern(self.big_pattern, self.problem["r_staff"]))
+                build, published = build_small_model, self.small_pattern
+            self.stages[name] = StageOracle(build, args, published, self.frozen, self.time_limit, self.num_workers)
+        return self.stages[name]
+
+    def check(self, requests):
+        # 逐一試算 (每個 request 各自獨立)；回傳與 requests 同順序的結果
+        return [self.check_one(request) for request in requests]
+
+    def check_one(self, request):
+        # 回傳 {"request", "feasible" (True / False / None = 時間內無法判斷), "status", "delta" (各班別目標值差，負 = 變差),
+        #       "changes" (各班別 [(day, 原醫師, 新醫師)]), "time", "cached"}
+        pairs = leave_pairs(request)
+        if pairs in self.cache: return dict(self.cache[pairs], cached=True)
+        t0 = time.perf_counter()
+        result = {"request": sorted(pairs), "feasible": True, "status": {}, "delta": {}, "changes": {}, "error": None}
+        unknown = sorted((doc, d) for doc, d in pairs if d not in self.problem["dates"] or doc not in self.big_staff | self.small_staff)
+        # 不必求解就能確定不行的：已值完的班、VS 自己指定要值的班 (需先取消指定)
+        worked = sorted(p for p in pairs if p[1] in self.frozen and p in set(self.big_pattern) | set(self.small_pattern))
+        wished = sorted((doc, d) for doc, d in pairs if d in self.problem["vs_wishes"].get(doc, []))
+        if unknown:
+            result.update(feasible=False, error="不在本月名單或日期內：" + "、".join(f"{doc} {d}" for doc, d in unknown))
+        elif worked:
+            result.update(feasible=False, error="班已值完，無法再准假：" + "、".join(f"{doc} {d}" for doc, d in worked))
+        elif wished:
+            result.update(feasible=False, error="VS 指定值班的日期，請先取消指定：" + "、".join(f"{doc} {d}" for doc, d in wished))
+        else:
+            new_big = self._check_stage(result, "big", {p for p in pairs if p[0] in self.big_staff}, self.big_pattern)
+            # R 的大班改了：R 可支援小班的日子 (大班前後 2 天) 跟著變，小班改用新的 R 大班另建模型
+            r_moved = {doc for _, old, new in result["changes"].get("big", []) for doc in (old, new)} & set(self.problem["r_staff"])
+            small_pairs = {p for p in pairs if p[0] in self.small_staff}
+            if result["feasible"] and r_moved:
+                args = small_shift_args(self.problem, r_schedule_from_pattern(new_big, self.problem["r_staff"]))
+                stage = StageOracle(build_small_model, args, self.small_pattern, self.frozen, self.time_limit, self.num_workers)
+                self._check_stage(result, "small", small_pairs, self.small_pattern, stage, baseline=self.stage("small").baseline)
+            elif result["feasible"]:
+                self._check_stage(result, "small", small_pairs, self.small_pattern)
+        result["time"] = time.perf_counter() - t0
+        self.cache[pairs] = result
+        return dict(result, cached=False)
+
+    def _check_stage(self, result, name, pairs, published, stage=None, baseline=None):
+        # 請假的人當天都沒有值這個班 (且不需另建模型) 時，公告班表不必改
+        if stage is None and not pairs & set(published):
+            result["status"][name] = "UNCHANGED"; result["delta"][name] = 0; result["changes"][name] = []
+            return published
+        stage = stage or self.stage(name)
+        check = stage.check(pairs)
+        result["status"][name] = cp_model.CpSolverStatus(check["status"]).name
+        if check["pattern"] is None:
+            result["feasible"] = False if check["status"] == cp_model.INFEASIBLE else None
+            return None
+        base = stage.baseline if baseline is None else baseline
+        result["delta"][name] = check["objective"] - base if base is not None else None
+        result["changes"][name] = check["changes"]
+        return check["pattern"]
@@ -0,0 +1,71 @@
+import random
+
+from ortools.sat.python import cp_model
+
+from roster.feasibility import conflict_set
+from roster.jobs import run_solve_job
+from roster.solver import build_big_model, build_small_model, day_masks
+from roster.synthetic import synthetic_problem
+
+# 回歸測試：回報的最小衝突集合本身 (只保留集合中的假設) 必須不可行
+def small_big_args(seed):
+    rnd = random.Random(seed)
+    days = list(range(1, rnd.choice([5, 6, 7]) + 1))
+    return dict(year=2025, month=3, vs_staff=["V0"], r_staff=["R0", "R1"], days=days,
+                vs_leaves={"V0": sorted(rnd.sample(days, rnd.randint(0, 2)))},
+                r_leaves={doc: sorted(rnd.sample(days, rnd.randint(1, 4))) for doc in ("R0", "R1")},
+                vs_wishes={}, vs_nogo={}, r_nogo={}, r_wishes={}, custom_holidays=[])
+
+def small_small_args(seed):
+    rnd = random.Random(seed)
+    days = list(range(1, rnd.choice([5, 6, 7]) + 1))
+    return dict(year=2025, month=3, pgy_staff=["P0", "P1"], int_staff=["I0"], r_staff=[], days=days,
+                pgy_leaves={doc: sorted(rnd.sample(days, rnd.randint(1, 4))) for doc in ("P0", "P1")}, int_leaves={"I0": sorted(rnd.sample(days, rnd.randint(1, 4)))},
+                pgy_nogo={}, pgy_wishes={}, int_nogo={}, int_wishes={}, r_nogo={}, r_schedule_map={}, custom_holidays=[])
+
+LEAVE_KEYS = {"big": ("vs_leaves", "r_leaves"), "small": ("pgy_leaves", "int_leaves")}
+
+def conflict_status(stage, args, conflict):
+    # 只保留衝突集合中的請假 (一般的硬限制，不用假設文字) 重新求解
+    label = day_masks(args["year"], args["month"], args["days"], args["custom_holidays"])["label"]
+    kept = {key: {doc: [d for d in ds if f"{doc} 絕對請假 ({label[d]})" in conflict] for doc, ds in args[key].items()} for key in LEAVE_KEYS[stage]}
+    model = (build_big_model if stage == "big" else build_small_model)(**dict(args, **kept))[0]
+    model.ClearObjective()
+    return cp_model.CpSolver().Solve(model)
+
+def check_conflicts(stage, make_args, seeds):
+    found = 0
+    for seed in seeds:
+        args = make_args(seed)
+        conflict = conflict_set(stage, args)
+        if not conflict: continue
+        found += 1
+        assert conflict_status(stage, args, conflict) == cp_model.INFEASIBLE, (seed, conflict)
+    assert found
+
+def test_big_conflict_set_is_infeasible():
+    # 例：V0 請 3/2，R0 請 3/1、3/4-3/6，R1 請 3/1-3/4 (曾回報本身可行的集合)
+    args = dict(small_big_args(0), days=list(range(1, 7)), vs_leaves={"V0": [2]}, r_leaves={"R0": [1, 4, 5, 6], "R1": [1, 2, 3, 4]})
+    conflict = conflict_set("big", args)
+    assert conflict and conflict_status("big", args, conflict) == cp_model.INFEASIBLE
+    check_conflicts("big", small_big_args, range(60))
+
+def test_small_conflict_set_is_infeasible():
+    check_conflicts("small", small_small_args, range(60))
+
+def small_infeasible_problem():
+    # 第 10 天所有 PGY / Int 請假、所有 R 都 No-Go：大班排得出來，小班當天沒有人可以值班
+    problem = synthetic_problem(seed=0)
+    for group in ("pgy", "int"):
+        problem[f"{group}_leaves"] = {doc: sorted(set(problem[f"{group}_leaves"].get(doc, [])) | {10}) for doc in problem[f"{group}_staff"]}
+    problem["r_nogo"] = {doc: sorted(set(problem["r_nogo"].get(doc, [])) | {10}) for doc in problem["r_staff"]}
+    return problem
+
+def test_pool_small_stage_infeasible_is_diagnosed():
+    problem = small_infeasible_problem()
+    for pool in (False, True):
+        output = run_solve_job({"kind": "plans", "problem": problem, "num_solutions": 2, "pool": pool, "options": {"num_workers": 1}}, lambda kind, value: None)
+        assert not output["small"]
+        diagnosis = output["diagnosis"]
+        assert diagnosis["stage"] == "small", pool
+        assert any("沒有任何人可以值班" in issue["message"] for issue in diagnosis["issues"]), diagnosis
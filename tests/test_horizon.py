@@ -0,0 +1,18 @@
+from roster.config import DEFAULT_CONFIG
+from roster.horizon import month_problems, missing_prefs
+
+def test_later_months_use_next_months_prefs():
+    config = dict(DEFAULT_CONFIG, year=2025, month=12, holidays=[25], vs_leaves={"張醫師(VS)": [3]},
+                  next_months=[{"holidays": [1, 31], "vs_leaves": {"王醫師(VS)": [2, 40]}, "pgy_wishes": {"小明(PGY)": [5]}}])
+    first, second = month_problems(config, 2)
+    assert (second["year"], second["month"]) == (2026, 1)
+    assert second["holidays"] == [1, 31] and second["vs_leaves"] == {"王醫師(VS)": [2]} and second["pgy_wishes"] == {"小明(PGY)": [5]}
+    # 第 1 個月的設定不會延續到下個月
+    assert first["vs_leaves"] == {"張醫師(VS)": [3]} and "張醫師(VS)" not in second["vs_leaves"]
+    assert missing_prefs([first, second]) == []
+
+def test_months_without_prefs_are_flagged():
+    config = dict(DEFAULT_CONFIG, year=2025, month=11, next_months=[{"holidays": [25]}])
+    problems = month_problems(config, 3)
+    assert missing_prefs(problems) == [(2026, 1)]
+    assert problems[2]["holidays"] == [] and not any(problems[2][k] for k in ("vs_leaves", "r_leaves", "pgy_leaves", "int_leaves"))
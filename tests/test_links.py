@@ -0,0 +1,63 @@
+import base64
+import json
+
+import pytest
+
+from roster.links import decode_payload, encode_payload
+
+SHIFTS = [{'d': 1, 't': "大班"}, {'d': 3, 't': "小班"}, {'d': 17, 't': "大班"}, {'d': 31, 't': "小班"}]
+
+def test_round_trip():
+    assert decode_payload(encode_payload("王醫師(VS)", 2025, 12, SHIFTS)) == ("王醫師(VS)", 2025, 12, SHIFTS)
+
+def test_round_trip_custom_type_and_no_shifts():
+    shifts = [{'d': 2, 't': "產房支援"}, {'d': 5, 't': "大班"}]
+    assert decode_payload(encode_payload("小明(PGY)", 2026, 1, shifts)) == ("小明(PGY)", 2026, 1, shifts)
+    assert decode_payload(encode_payload("小明(PGY)", 2026, 2, [])) == ("小明(PGY)", 2026, 2, [])
+
+def test_round_trip_compressed():
+    # 長的自訂班別名稱會壓縮 (版本 byte 最高位元)
+    shifts = [{'d': d, 't': "夜間急診支援班" * 3} for d in range(1, 31, 2)]
+    payload = encode_payload("菜鳥A(Int)", 2025, 11, shifts)
+    assert base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))[0] & 0x80
+    assert decode_payload(payload) == ("菜鳥A(Int)", 2025, 11, shifts)
+
+def test_legacy_v1_payload():
+    data = {"n": "張醫師(VS)", "y": 2025, "m": 12, "s": [{"d": 9, "t": "大班"}, {"d": 2, "t": "大班"}]}
+    payload = base64.b64encode(json.dumps(data, ensure_ascii=False).encode("utf-8")).decode("ascii")
+    expected = ("張醫師(VS)", 2025, 12, [{"d": 2, "t": "大班"}, {"d": 9, "t": "大班"}])
+    assert decode_payload(payload) == expected
+    # 查詢字串中的 '+' 被還原成空白
+    assert decode_payload(payload.replace("+", " ")) == expected
+
+def test_v2_is_shorter_than_v1():
+    data = {"n": "王醫師(VS)", "y": 2025, "m": 12, "s": SHIFTS}
+    v1 = base64.b64encode(json.dumps(data, ensure_ascii=False).encode("utf-8")).decode("ascii")
+    assert len(encode_payload("王醫師(VS)", 2025, 12, SHIFTS)) < len(v1)
+
+@pytest.mark.parametrize("payload", ["", "!!!!", "ey", "eyJuIjoi", "AA", "Aw", base64.urlsafe_b64encode(b"\x09" + b"x" * 10).decode("ascii")])
+def test_malformed_payload_raises(payload):
+    with pytest.raises(ValueError):
+        decode_payload(payload)
+
+def raw_payload(payload):
+    return bytearray(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+def encode_raw(raw):
+    return base64.urlsafe_b64encode(bytes(raw)).decode("ascii").rstrip("=")
+
+def test_truncated_payload_raises():
+    raw = raw_payload(encode_payload("王醫師(VS)", 2025, 12, SHIFTS))
+    assert not raw[0] & 0x80
+    for n in range(1, len(raw)):
+        with pytest.raises(ValueError):
+            decode_payload(encode_raw(raw[:n]))
+
+def test_tampered_payload_raises():
+    raw = raw_payload(encode_payload("王醫師(VS)", 2025, 12, SHIFTS))
+    for pos, value in [(3, 13), (3, 0), (4, 200), (-1, 0xFF)]:
+        tampered = bytearray(raw); tampered[pos] = value
+        with pytest.raises(ValueError):
+            decode_payload(encode_raw(tampered))
+    with pytest.raises(ValueError):
+        decode_payload(encode_raw(raw + b"\x00"))
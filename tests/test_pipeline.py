@@ -0,0 +1,31 @@
+from ortools.sat.python import cp_model
+
+from roster.cache import SolveCache, cached
+from roster.pipeline import solve_plans, quality_options
+from roster.synthetic import synthetic_problem
+
+def test_symmetry_breaking_keeps_later_plans_optimal():
+    # 沒有任何偏好時同組醫師完全可互換；排除既有方案後不可再依首次值班日排序，否則方案 2 起會變差
+    problem = synthetic_problem(n_vs=3, n_r=3, n_pgy=4, n_int=3, days=14, leave_density=0, nogo_density=0, wish_density=0, seed=2)
+    plain, _, _ = solve_plans(problem, 4, options={"num_workers": 1})
+    broken, _, _ = solve_plans(problem, 4, options={"num_workers": 1, "symmetry_breaking": True})
+    assert [x["objective"] for x in broken] == [x["objective"] for x in plain]
+
+def test_symmetry_breaking_is_part_of_cache_key():
+    assert quality_options({"symmetry_breaking": True}) != quality_options({})
+    assert quality_options({"symmetry_breaking": False}) == quality_options({})
+
+def test_cache_keeps_only_optimal_results(tmp_path):
+    cache = SolveCache(str(tmp_path))
+    calls = []
+    def compute(status):
+        def run():
+            calls.append(status)
+            return {"status": int(status), "objective": -100, "pattern": [("A", 1)], "report": []}
+        return run
+    # 時間上限內只找到可行解：不寫入，下次重新求解
+    assert cached(cache, "big", {"x": 1}, compute(cp_model.FEASIBLE))["status"] == cp_model.FEASIBLE
+    assert not cached(cache, "big", {"x": 1}, compute(cp_model.OPTIMAL)).get("cached")
+    hit = cached(cache, "big", {"x": 1}, compute(cp_model.OPTIMAL))
+    assert hit["cached"] and hit["pattern"] == [("A", 1)]
+    assert calls == [cp_model.FEASIBLE, cp_model.OPTIMAL]
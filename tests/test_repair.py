@@ -0,0 +1,18 @@
+import copy
+
+from roster.pipeline import solve_plans
+from roster.repair import W_DEVIATION, repair_plan
+from roster.synthetic import synthetic_problem
+
+def test_repair_reports_schedule_objective_without_deviation():
+    problem = synthetic_problem(seed=0)
+    big, small, _ = solve_plans(problem, 1, options={"num_workers": 1})
+    # 讓方案中某位 R 在已排的大班日請假，逼出異動
+    doc, d = next((doc, d) for doc, d in big[0]["pattern"] if doc in problem["r_staff"])
+    changed = copy.deepcopy(problem)
+    changed["r_leaves"].setdefault(doc, []).append(d)
+    new_big, new_small = repair_plan(problem, changed, big[0], small[0], options={"num_workers": 1})
+    assert new_big["changes"] and (doc, d) not in new_big["pattern"]
+    # 每個異動日一人下班、一人上班，各扣一次偏離分數；objective 不含這部分
+    assert new_big["objective"] - new_big["repair_objective"] == 2 * W_DEVIATION * len(new_big["changes"])
+    assert new_small["objective"] - new_small["repair_objective"] == 2 * W_DEVIATION * len(new_small["changes"])
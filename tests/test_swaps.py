@@ -0,0 +1,66 @@
+import random
+
+from roster.matrix import roster_matrix
+from roster.pipeline import solve_plans
+from roster.swaps import SwapValidator
+from roster.synthetic import synthetic_problem
+from roster.views import calculate_stats
+
+def solved(problem):
+    big, small, _ = solve_plans(problem, 1, options={"num_workers": 1})
+    p = problem
+    m_big = roster_matrix(big[0]["pattern"], p["vs_staff"] + p["r_staff"], p["dates"], p["year"], p["month"], p["holidays"], "大班")
+    m_small = roster_matrix(small[0]["pattern"], p["pgy_staff"] + p["int_staff"] + p["r_staff"], p["dates"], p["year"], p["month"], p["holidays"], "小班")
+    return big[0], small[0], m_big, m_small
+
+def messages(rows):
+    return sorted(x["message"] for x in rows)
+
+def test_matches_solver_report_and_stats():
+    problem = synthetic_problem(seed=0)
+    big, small, m_big, m_small = solved(problem)
+    v = SwapValidator(problem, m_big, m_small)
+    assert v.report("big") == big["report"] and v.report("small") == small["report"]
+    assert calculate_stats(m_big).equals(v.stats("big")) and calculate_stats(m_small).equals(v.stats("small"))
+    assert v.violations(hard=True) == []
+
+def test_swap_delta_is_net_change():
+    # 互換回報的新增 / 解除必須等於互換前後違規的差 (不可出現互換中途暫時產生又消失的違規)
+    problem = synthetic_problem(seed=0)
+    _, _, m_big, m_small = solved(problem)
+    v = SwapValidator(problem, m_big, m_small)
+    rng = random.Random(0)
+    for _ in range(300):
+        stage = rng.choice(["big", "small"])
+        d1, d2 = rng.sample(v.days, 2)
+        before = list(v.issues.values())
+        delta = v.swap(stage, d1, d2)
+        after = list(v.issues.values())
+        assert messages(delta["added"]) == messages(x for x in after if x not in before)
+        assert messages(delta["removed"]) == messages(x for x in before if x not in after)
+
+def test_swap_back_restores_state():
+    problem = synthetic_problem(seed=1)
+    _, _, m_big, m_small = solved(problem)
+    v = SwapValidator(problem, m_big, m_small)
+    original = {k: x["message"] for k, x in v.issues.items()}
+    for stage in ("big", "small"):
+        delta = v.swap(stage, 3, 4)
+        back = v.swap(stage, 3, 4)
+        assert messages(back["added"]) == messages(delta["removed"]) and messages(back["removed"]) == messages(delta["added"])
+    assert {k: x["message"] for k, x in v.issues.items()} == original
+
+def test_incremental_matches_fresh_check():
+    problem = synthetic_problem(seed=2, leave_density=0.2, nogo_density=0.2)
+    _, _, m_big, m_small = solved(problem)
+    v = SwapValidator(problem, m_big, m_small)
+    rng = random.Random(1)
+    for _ in range(500):
+        stage = rng.choice(["big", "small"])
+        if rng.random() < 0.5: v.swap(stage, rng.choice(v.days), rng.choice(v.days))
+        else: v.assign(stage, rng.choice(v.days), rng.choice(v.staff[stage]))
+    fresh = SwapValidator(problem, v.matrix("big"), v.matrix("small"))
+    assert {k: x["message"] for k, x in fresh.issues.items()} == {k: x["message"] for k, x in v.issues.items()}
+    for stage in ("big", "small"):
+        assert fresh.report(stage) == v.report(stage)
+        assert calculate_stats(v.matrix(stage)).equals(v.stats(stage))
@@ -0,0 +1,53 @@
+import copy
+
+from roster.pipeline import solve_plans
+from roster.synthetic import synthetic_problem
+from roster.whatif import LeaveOracle
+
+def published(problem):
+    big, small, _ = solve_plans(problem, 1, options={"num_workers": 1})
+    return big[0], small[0]
+
+def test_leave_on_a_free_day_needs_no_change():
+    problem = synthetic_problem(seed=0)
+    big, small = published(problem)
+    doc = problem["vs_staff"][0]
+    d = next(d for d in problem["dates"] if (doc, d) not in big["pattern"] and d not in problem["vs_leaves"].get(doc, []))
+    result = LeaveOracle(problem, big, small, num_workers=1).check_one((doc, d))
+    assert result["feasible"] is True and result["error"] is None
+    assert result["changes"] == {"big": [], "small": []} and result["delta"] == {"big": 0, "small": 0}
+
+def test_leave_on_a_duty_day_needs_a_change():
+    problem = synthetic_problem(seed=0)
+    big, small = published(problem)
+    doc, d = next((doc, d) for doc, d in big["pattern"] if doc in problem["r_staff"])
+    oracle = LeaveOracle(problem, big, small, num_workers=1)
+    result = oracle.check_one((doc, d))
+    assert result["feasible"] is True
+    assert result["changes"]["big"] and all(new != doc for day, _, new in result["changes"]["big"] if day == d)
+    assert any(day == d and old == doc for day, old, _ in result["changes"]["big"])
+    # 改動公告班表不會讓目標值變好 (公告班表已是最佳)
+    assert result["delta"]["big"] <= 0
+    assert oracle.check_one((doc, d))["cached"]
+
+def test_leave_that_cannot_be_approved():
+    # 某天其他大班醫師都請假：只有公告時值班的那位能值，再准他的假就排不出來
+    problem = synthetic_problem(seed=0)
+    big, small = published(problem)
+    doc, d = next((doc, d) for doc, d in big["pattern"] if doc in problem["r_staff"])
+    tight = copy.deepcopy(problem)
+    for other in problem["vs_staff"] + problem["r_staff"]:
+        if other == doc: continue
+        key = "vs_leaves" if other in problem["vs_staff"] else "r_leaves"
+        tight[key].setdefault(other, []).append(d)
+    big, small = published(tight)
+    assert (doc, d) in big["pattern"]
+    result = LeaveOracle(tight, big, small, num_workers=1).check_one((doc, d))
+    assert result["feasible"] is False and result["status"]["big"] == "INFEASIBLE"
+
+def test_leave_on_a_worked_day_is_refused_without_solving():
+    problem = synthetic_problem(seed=0)
+    big, small = published(problem)
+    doc, d = next((doc, d) for doc, d in big["pattern"] if d < 10)
+    result = LeaveOracle(problem, big, small, from_day=10, num_workers=1).check_one((doc, d))
+    assert result["feasible"] is False and "已值完" in result["error"] and result["status"] == {}